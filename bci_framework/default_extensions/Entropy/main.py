@@ -1,12 +1,10 @@
 from bci_framework.extensions.visualizations import EEGStream, Widgets
-from bci_framework.extensions.data_analysis import loop_consumer
+from bci_framework.extensions.data_analysis import loop_consumer, StreamingWelch
 from bci_framework.extensions import properties as prop
 
 import numpy as np
 import logging
 
-from scipy.fftpack import rfft, rfftfreq
-
 from cycler import cycler
 import matplotlib 
 
@@ -47,10 +45,22 @@ class Stream(EEGStream, Widgets):
         self.axisFP2.legend(loc='lower center', ncol=2)
 
         self.create_buffer(30)
+
+        # Last 15 seconds, in segments of 4 seconds each second
+        self.welch = StreamingWelch(2, prop.SAMPLE_RATE,
+                                    nperseg=4 * prop.SAMPLE_RATE,
+                                    noverlap=3 * prop.SAMPLE_RATE,
+                                    segments=12)
+        W = self.welch.freqs
+        self.band_SE = slice(abs(W-0.8).argmin(), abs(W-32).argmin())  # [.8 Hz, 32 Hz]
+        self.band_RE = slice(abs(W-0.8).argmin(), abs(W-47).argmin())  # [.8 Hz, 47 Hz]
         # self.create_buffer(60*5)
         self.dataSE = np.empty((2, 30*(prop.SAMPLE_RATE//prop.STREAMING_PACKAGE_SIZE)))
         self.dataSE.fill(0)
         self.dataRE = self.dataSE.copy()
+        # Called at the rate that the viewer can draw
+        self.set_frame_rate()
+
         self.stream()
         
     
@@ -66,18 +76,17 @@ class Stream(EEGStream, Widgets):
         self.axisFP2.set_xlim(-window_time, 0)
         self.axisFP2.set_ylim(0, 15)
         
-        eeg = self.buffer_eeg[:2,-15000:]
-        # eeg = eeg[eeg!=np.nan]
-        
-        # logging.warning(f'{self.buffer_eeg.shape}, {eeg.shape}')
+        # Only the new samples are transformed
+        self.welch.update(self.buffer_eeg[:2, -data.shape[1]:])
+        if not self.welch.count:
+            return
         
         # SE      
-        EEG_ = np.abs(rfft(eeg, axis=1))  
-        W = rfftfreq(EEG_.shape[1], 1/prop.SAMPLE_RATE)
-        EEG = EEG_[:,abs(W-0.8).argmin():abs(W-32).argmin()]  # [.8 Hz, 32 Hz]
+        EEG_ = np.sqrt(self.welch.psd)
+        EEG = EEG_[:, self.band_SE]
         p = EEG / EEG.sum(axis=1)[:,None]
         E = np.sum(p * np.log(1/p), axis=1)
-        N = len(EEG[:,abs(W-0.8).argmin():abs(W-47).argmin()])
+        N = len(EEG_[:, self.band_RE])
 
         # logging.warning(f'{E}')
         
@@ -85,9 +94,7 @@ class Stream(EEGStream, Widgets):
         
         
         # RE
-        # EEG = np.abs(rfft(eeg, axis=1))
-        W = rfftfreq(EEG_.shape[1], 1/prop.SAMPLE_RATE)
-        EEG = EEG_[:,abs(W-0.8).argmin():abs(W-47).argmin()]  # [.8 Hz, 47 Hz]
+        EEG = EEG_[:, self.band_RE]
         p = EEG / EEG.sum(axis=1)[:,None]
         E = np.sum(p * np.log(1/p), axis=1)
         # N = len(EEG[abs(W2-0.8).argmin():abs(W2-47).argmin()])
@@ -95,10 +102,12 @@ class Stream(EEGStream, Widgets):
         
         # logging.warning(f'{SE}, {RE}')
 
-        self.dataSE = np.roll(self.dataSE, -1, axis=1)
-        self.dataSE[:,-1] = SE
-        self.dataRE = np.roll(self.dataRE, -1, axis=1)
-        self.dataRE[:,-1] = RE
+        # One value for each package received since the previous frame
+        n = max(data.shape[1] // prop.STREAMING_PACKAGE_SIZE, 1)
+        self.dataSE = np.roll(self.dataSE, -n, axis=1)
+        self.dataSE[:, -n:] = SE[:, None]
+        self.dataRE = np.roll(self.dataRE, -n, axis=1)
+        self.dataRE[:, -n:] = RE[:, None]
         
         time = np.linspace(-30, 0, self.dataSE.shape[1])
         
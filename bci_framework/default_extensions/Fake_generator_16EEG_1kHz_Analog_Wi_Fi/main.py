@@ -1,7 +1,7 @@
 from bci_framework.extensions.data_analysis import DataAnalysis, loop_consumer
 import logging
-import pickle
 from kafka import KafkaProducer
+from bci_framework.extensions.data_analysis.codec import serializer
 from bci_framework.extensions import properties as prop
 import time
 import numpy as np
@@ -37,8 +37,7 @@ class Analysis(DataAnalysis):
         
         self.kafka_producer = KafkaProducer(
                 bootstrap_servers=[f'{prop.HOST}:9092'],
-                compression_type='gzip',
-                value_serializer=pickle.dumps,
+                value_serializer=serializer(),
             )
         
         self.producer()
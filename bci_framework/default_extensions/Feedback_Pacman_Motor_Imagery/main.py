@@ -1,4 +1,5 @@
 from bci_framework.extensions.data_analysis import DataAnalysis, loop_consumer, fake_loop_consumer
+from bci_framework.extensions import properties as prop
 import logging
 
 import gym
@@ -27,15 +28,14 @@ class Analysis(DataAnalysis):
         self.env.reset(chosenLayout='originalClassic', no_ghosts=True)
         # self.env.reset(chosenLayout='openClassic', no_ghosts=True)
 
-        # Buffer
-        self.create_buffer(BUFFER, aux_shape=3, fill=0)
         self.stream()
 
     # ----------------------------------------------------------------------
-    @loop_consumer('eeg', package_size=SLIDING_DATA)
-    def stream(self, frame):
+    @loop_consumer('eeg', package_size=BUFFER * prop.SAMPLE_RATE,
+                  hop=SLIDING_DATA)
+    def stream(self, data):
         """"""
-        action = predict(self.buffer_eeg.reshape(1, 16, -1))
+        action = predict(data.reshape(1, 16, -1))
 
         # Move Pacman
         logging.warning(f'Action: {action}')
@@ -12,17 +12,41 @@ email: ide@utp.edu.co
 
 """
 # Import the necessary libraries 
+from functools import lru_cache
+from collections import OrderedDict
+
 import numpy as np
 import scipy.spatial as sp_spatial
-from scipy.linalg import fractional_matrix_power
+from numpy.lib.stride_tricks import sliding_window_view
 from scipy import signal
 from scipy import interpolate
-from joblib import Parallel,delayed
+from bci_framework.extensions.data_analysis.workers import share,submit
 
 # =============================================================================
 # Kernel-based Renyi transfer entropy 
 # =============================================================================
 
+def embedding(x,tau,dim):
+    """
+    Time-delay embbeding of the time series x, as a strided view (no copy)
+    
+    Parameters
+    ----------
+    x: ndarray of shape (samples,)
+        Time series 
+    tau: int
+        Embedding delay 
+    dim: int
+        Embedding dimension 
+
+    Returns
+    -------
+    x_emb: ndarray of shape (samples-(tau*(dim-1)),dim)
+        Time embedded time series, x_emb[i,j] = x[i+(dim-1-j)*tau]
+    """
+    x = np.asarray(x,dtype=float)
+    return sliding_window_view(x,(dim-1)*tau+1)[:,::-tau]
+
 def embeddingX(x,tau,dim,u):
     """
     Time-delay embbeding of the source time series x
@@ -43,14 +67,7 @@ def embeddingX(x,tau,dim,u):
     X_emb: ndarray of shape (samples-(tau*(dim-1))-u,dim)
         Time embedded source time series 
     """
-    T = np.size(x)
-    L = T -(dim-1)*tau
-    firstP = T - L
-    X_emb = np.zeros((L,dim))
-    for i in range(L):
-      for j in range(dim):
-        X_emb[i,j] = x[i+firstP-(j*tau)]
-    
+    X_emb = embedding(x,tau,dim)
     X_emb = X_emb[0:-u,:]
     return X_emb
 
@@ -76,21 +93,14 @@ def embeddingY(y,tau,dim,u):
     y_t: ndarray of shape (samples-(tau*(dim-1))-u,1)
         Time shifted target time series 
     """
-    T = np.size(y)
-    L = T -(dim-1)*tau
-    firstP = T - L
-    Y_emb = np.zeros((L,dim))
-    
-    for i in range(L):
-      for j in range(dim):
-        Y_emb[i,j] = y[i+firstP-(j*tau)]
-    
+    firstP = (dim-1)*tau
+    Y_emb = embedding(y,tau,dim)
     y_t = y[firstP+u::] 
     y_t = y_t.reshape(y_t.shape[0],1)
     Y_emb = Y_emb[u-1:-1,:]
     return Y_emb,y_t
 
-def GaussianKernel(X,sig_scale=1.0):
+def GaussianKernel(X,sig_scale=1.0,approx=None):
     """
     Compute Gaussian Kernel matrix    
    
@@ -100,18 +110,53 @@ def GaussianKernel(X,sig_scale=1.0):
         Input data 
     sig_scale: float
         Parameter to scale the kernel's bandwidth  
+    approx: int or None
+        If defined, the bandwidth is the median of approximately this number
+        of distances (evenly spaced) instead of the median of all of them
         
     Returns
     -------
     K: ndarray of shape (samples,samples)
         Gaussian kernel matrix
     """
-    utri_ind =  np.triu_indices(X.shape[0], 1)
-    dist = sp_spatial.distance.cdist(X,X,'euclidean')
-    sigma = sig_scale*np.median(dist[utri_ind])
-    K = np.exp(-1*(dist**2)/(2*sigma**2))
+    # Distances of the upper triangle only, the matrix is symmetric
+    dist = sp_spatial.distance.pdist(X,'euclidean')
+    if approx and dist.size > approx:
+        sigma = sig_scale*np.median(dist[::dist.size//approx])
+    else:
+        sigma = sig_scale*np.median(dist)
+    dist **= 2
+    dist *= -1/(2*sigma**2)
+    K = sp_spatial.distance.squareform(np.exp(dist,out=dist))
+    np.fill_diagonal(K,1)
     return K
 
+def traceMatrixPower(K,alpha):
+    """
+    Trace of K**alpha for a symmetric positive semidefinite matrix K
+    
+    Parameters
+    ----------
+    K: ndarray of shape (samples,samples)
+        Kernel matrix 
+    alpha: int or float
+        Power
+        
+    Returns
+    -------
+    tr: float
+        Trace of the matrix power 
+    """
+    if alpha == 1:
+        return np.trace(K)
+    if alpha == 2:
+        # tr(K@K) without the matrix product
+        return np.einsum('ij,ij->',K,K)
+    # One eigendecomposition, tr(K**alpha) = sum(lambda**alpha)
+    eigvals = np.linalg.eigvalsh(K)
+    eigvals = np.clip(eigvals,0,None)
+    return np.sum(eigvals**alpha)
+
 def kernelRenyiEntropy(K_lst,alpha):
     """
     Compute Renyi's entropy from kernel matrices 
@@ -128,20 +173,66 @@ def kernelRenyiEntropy(K_lst,alpha):
     h: float
         Kernel-based Renyi's transfer entropy, TE(x->y)
     """
-    if len(K_lst) == 1:
-      K = K_lst[0]
-    elif len(K_lst) == 2:
-      K = K_lst[0]*K_lst[1]
-    else:
-      K = K_lst[0]*K_lst[1]*K_lst[2]     
+    K = K_lst[0]
+    for K_aux in K_lst[1:]:
+        K = K*K_aux
     K = K/np.trace(K) 
-    if alpha%1==0:
-        h = np.real((1/(1-alpha))*np.log2(np.trace(np.linalg.matrix_power(K,alpha))))
-    else:
-        h = np.real((1/(1-alpha))*np.log2(np.trace(fractional_matrix_power(K,alpha))))
+    h = np.real((1/(1-alpha))*np.log2(traceMatrixPower(K,alpha)))
     return h
 
-def kernelTransferEntropy(x,y,dim,tau,u,alpha,sig_scale=1.0): 
+def kernelTransferEntropyTerms(K_X_emb,K_Y_emb,K_y_t,alpha,h34=None):
+    """
+    Kernel-based Renyi's transfer entropy from precomputed kernels, the
+    products of kernels are shared by the entropies h1 to h4
+    
+    Parameters
+    ----------
+    K_X_emb: ndarray of shape (samples,samples)
+        Kernel of the source time embedding 
+    K_Y_emb: ndarray of shape (samples,samples)
+        Kernel of the target time embedding 
+    K_y_t: ndarray of shape (samples,samples)
+        Kernel of the time shifted target 
+    alpha: int or float
+        Order of Renyi's entropy
+    h34: float or None
+        h3 - h4, that only depends on the target 
+
+    Returns
+    -------
+    TE: float
+        Kernel-based Renyi's transfer entropy, TE(x->y)
+    """
+    if h34 is None:
+        h34 = targetEntropy(K_Y_emb,K_y_t,alpha)
+    K_XY = K_X_emb*K_Y_emb
+    h1 = kernelRenyiEntropy([K_XY],alpha)
+    h2 = kernelRenyiEntropy([K_XY,K_y_t],alpha)
+    return h1 - h2 + h34
+
+def targetEntropy(K_Y_emb,K_y_t,alpha):
+    """
+    Entropies h3 - h4 of the transfer entropy, only from the target kernels
+    
+    Parameters
+    ----------
+    K_Y_emb: ndarray of shape (samples,samples)
+        Kernel of the target time embedding 
+    K_y_t: ndarray of shape (samples,samples)
+        Kernel of the time shifted target 
+    alpha: int or float
+        Order of Renyi's entropy
+
+    Returns
+    -------
+    h34: float
+        h3 - h4
+    """
+    h3 = kernelRenyiEntropy([K_Y_emb,K_y_t],alpha)
+    h4 = kernelRenyiEntropy([K_Y_emb],alpha)
+    return h3 - h4
+
+def kernelTransferEntropy(x,y,dim,tau,u,alpha,sig_scale=1.0,approx=None): 
     """
     Compute kernel-based Renyi's transfer entropy from channel x to channel y
     
@@ -161,6 +252,8 @@ def kernelTransferEntropy(x,y,dim,tau,u,alpha,sig_scale=1.0):
         Order of Renyi's entropy
     sig_scale: float
         Parameter to scale the kernel's bandwidth  
+    approx: int or None
+        Number of distances for an approximate median bandwidth 
 
     Returns
     -------
@@ -174,27 +267,27 @@ def kernelTransferEntropy(x,y,dim,tau,u,alpha,sig_scale=1.0):
     X_emb = embeddingX(x,tau,dim,u)
     Y_emb, y_t = embeddingY(y,tau,dim,u)
     
-    K_X_emb = GaussianKernel(X_emb,sig_scale)
-    K_Y_emb = GaussianKernel(Y_emb,sig_scale)
-    K_y_t = GaussianKernel(y_t,sig_scale)    
-    
-    h1 = kernelRenyiEntropy([K_X_emb,K_Y_emb],alpha)
-    h2 = kernelRenyiEntropy([K_X_emb,K_Y_emb,K_y_t],alpha)
-    h3 = kernelRenyiEntropy([K_Y_emb,K_y_t],alpha)
-    h4 = kernelRenyiEntropy([K_Y_emb],alpha)
+    K_X_emb = GaussianKernel(X_emb,sig_scale,approx)
+    K_Y_emb = GaussianKernel(Y_emb,sig_scale,approx)
+    K_y_t = GaussianKernel(y_t,sig_scale,approx)    
     
-    TE = h1 - h2 + h3 - h4
+    TE = kernelTransferEntropyTerms(K_X_emb,K_Y_emb,K_y_t,alpha)
     return TE
 
-def kernelTransferEntropy_PAC_Ch(X,ch_pair,Dim,Tau,U,alpha,freq_ph,freq_amp,time,sig_scale=1.0):
+def kernelTransferEntropy_PAC_Target(X,src_chs,trg_ch,Dim,Tau,U,alpha,freq_ph,freq_amp,time,sig_scale=1.0,approx=None):
     """
     Compute directed phase-amplitude interactions through kernel-based Renyi's phase transfer
-    entropy between a pair channels 
+    entropy from several source channels to a target channel. The target 
+    decomposition, kernels and entropies are calculated once for all the sources
     
     Parameters
     ----------
     X: ndarray of shape (channels,samples)
         Input time series (number of channels x number of samples)
+    src_chs: list 
+        Source channels
+    trg_ch: int 
+        Target channel
     Dim: ndarray of shape (channels,)
         Embedding dimension for each channel
     Tau: ndarray of shape (channels,)
@@ -211,78 +304,91 @@ def kernelTransferEntropy_PAC_Ch(X,ch_pair,Dim,Tau,U,alpha,freq_ph,freq_amp,time
         Time vector (must be sampled at the sampling frequency of X)
     sig_scale: float
         Parameter to scale the kernel's bandwidth  
+    approx: int or None
+        Number of distances for an approximate median bandwidth 
 
     Returns
     -------
-    TE_pac: ndarray of shape (frequencies_ph,frequencies_amp) 
+    TE_pac: ndarray of shape (sources,frequencies_ph,frequencies_amp) 
         Directed PAC estimated through kernel-based Renyi's phase transfer
-        entropy
+        entropy for each source channel
     """
-    
-    X = X[[ch_pair[0],ch_pair[1]],:]
-    tau = Tau[ch_pair[1]]
-    dim = Dim[ch_pair[1]]
-    u = U[ch_pair[1]]
+    tau = int(Tau[trg_ch])
+    dim = int(Dim[trg_ch])
+    u = int(U[trg_ch])
     
     num_freq_ph = np.size(freq_ph)
     num_freq_amp = np.size(freq_amp)
-    TE_pac = np.zeros((num_freq_ph,num_freq_amp))
+    TE_pac = np.zeros((len(src_chs),num_freq_ph,num_freq_amp))
     
-    src = X[0,:]
-    src = src.reshape((1,len(src)))
-    trg = X[1,:]
-    trg = trg.reshape((1,len(trg)))
+    trg = X[[trg_ch],:]
 
     # Wavelet decomposition 
-    src_ph = Wavelet_Trial_Dec(src,time,freq_ph,component='phase')[0,:,:]
-    src_ph = src_ph.T
+    src_ph = Wavelet_Trial_Dec(X[src_chs,:],time,freq_ph,component='phase')
+    src_ph = np.transpose(src_ph,(0,2,1))
     trg_amp = Wavelet_Trial_Dec(trg,time,freq_amp,component='amp')[0,:,:]
     trg_amp = trg_amp.T
     
-    trg_amp_ph_lst = []
-    for kk in range(num_freq_amp):
-        trg_amp_aux = trg_amp[kk,:].reshape((1,len(trg_amp[kk,:])))
-        if (trg.shape[1] % 2) == 0:
-            time = time.flatten()
-            trg_amp_ph_lst.append(np.transpose(Wavelet_Trial_Dec(trg_amp_aux,time[:-1],freq_ph,component='phase')[0,:,:]))
-        else:
-            trg_amp_ph_lst.append(np.transpose(Wavelet_Trial_Dec(trg_amp_aux,time,freq_ph,component='phase')[0,:,:]))
+    if (trg.shape[1] % 2) == 0:
+        time = time.flatten()[:-1]
+    trg_amp_ph = np.transpose(Wavelet_Trial_Dec(trg_amp,time,freq_ph,component='phase'),(0,2,1))
+    
+    # Kernels for the source time embeddings 
+    K_X_emb = [[GaussianKernel(embeddingX(src_ph[s,i,:],tau,dim,u),sig_scale,approx)
+                for i in range(num_freq_ph)] for s in range(len(src_chs))]
     
     for j in range(num_freq_amp):
-        # Embedding parameters 
-        tau = int(tau)
-        dim = int(dim)  
         for i in range(num_freq_ph):
-            # Delay time 
-            u = int(u)
-        
-            # Target channel  
-            y = trg_amp_ph_lst[j][i,:]
-            # Source channel 
-            x = src_ph[i,:]
-            
-            # Time embeddings for y 
+            # Target channel, shared by all the sources  
+            y = trg_amp_ph[j,i,:]
             Y_emb, y_t = embeddingY(y,tau,dim,u)
-            # Kernels for y's time embeddings 
-            K_Y_emb = GaussianKernel(Y_emb,sig_scale)
-            K_y_t = GaussianKernel(y_t,sig_scale)   
-            # Entropies 
-            h3 = kernelRenyiEntropy([K_Y_emb,K_y_t],alpha)
-            h4 = kernelRenyiEntropy([K_Y_emb],alpha)
-    
-            # Time embedding for x 
-            X_emb = embeddingX(x,tau,dim,u)
-            # Kernels for x's time embedding
-            K_X_emb = GaussianKernel(X_emb,sig_scale)
-            # Entropies 
-            h1 = kernelRenyiEntropy([K_X_emb,K_Y_emb],alpha)
-            h2 = kernelRenyiEntropy([K_X_emb,K_Y_emb,K_y_t],alpha)
-           
-            # Transfer entropy
-            TE_pac[i,j] =  h1 - h2 + h3 - h4
+            K_Y_emb = GaussianKernel(Y_emb,sig_scale,approx)
+            K_y_t = GaussianKernel(y_t,sig_scale,approx)   
+            h34 = targetEntropy(K_Y_emb,K_y_t,alpha)
+    
+            for s in range(len(src_chs)):
+                # Transfer entropy
+                TE_pac[s,i,j] = kernelTransferEntropyTerms(K_X_emb[s][i],K_Y_emb,K_y_t,alpha,h34)
             
     return TE_pac
 
+def kernelTransferEntropy_PAC_Ch(X,ch_pair,Dim,Tau,U,alpha,freq_ph,freq_amp,time,sig_scale=1.0,approx=None):
+    """
+    Compute directed phase-amplitude interactions through kernel-based Renyi's phase transfer
+    entropy between a pair channels 
+    
+    Parameters
+    ----------
+    X: ndarray of shape (channels,samples)
+        Input time series (number of channels x number of samples)
+    Dim: ndarray of shape (channels,)
+        Embedding dimension for each channel
+    Tau: ndarray of shape (channels,)
+        Embedding delay for each channel
+    U: ndarray of shape (channels,)
+        Interaction times for each channel pair and direction of interaction
+    alpha: int or float
+        Order of Renyi's entropy
+    freq_ph: ndarray of shape (frequencies_ph,)
+        Frequencies of interest for phase extraction, in Hz
+    freq_amp: ndarray of shape (frequencies_amp,)
+        Frequencies of interest for amplitude extraction, in Hz
+    time: ndarray of shape (samples,)
+        Time vector (must be sampled at the sampling frequency of X)
+    sig_scale: float
+        Parameter to scale the kernel's bandwidth  
+    approx: int or None
+        Number of distances for an approximate median bandwidth 
+
+    Returns
+    -------
+    TE_pac: ndarray of shape (frequencies_ph,frequencies_amp) 
+        Directed PAC estimated through kernel-based Renyi's phase transfer
+        entropy
+    """
+    return kernelTransferEntropy_PAC_Target(X,[ch_pair[0]],ch_pair[1],Dim,Tau,U,alpha,
+                                            freq_ph,freq_amp,time,sig_scale,approx)[0]
+
 # =============================================================================
 # Embedding functions 
 # =============================================================================
@@ -360,12 +466,7 @@ def cao_criterion(x,d_max,tau):
         T = np.size(x)
         L = T-(d*tau)
         if L>0:
-            FirstP = T-L
-            x_emb = np.zeros((L,d+1))
-            for ii in range(0,L):
-                for jj in range(0,d+1): 
-                    x_emb[ii,jj] = x[ii+FirstP-(jj*tau)]
-            x_emb_lst.append(x_emb)
+            x_emb_lst.append(embedding(x,tau,d+1))
     
     d_aux = len(x_emb_lst)
     E = np.zeros(d_aux-1)
@@ -524,87 +625,187 @@ def CFD_Ch(X,ch_pair,freq_ph,freq_amp,time,fs):
             
     return CFD_pac
 
+def CFD_Target(X,src_chs,trg_ch,freq_ph,freq_amp,time,fs):
+    """
+    Compute the cross-frequency directionality (CFD) from several source 
+    channels to a target channel, the target is decomposed only once 
+    
+    Parameters
+    ----------
+    X: ndarray of shape (channels,samples)
+        Input time series (number of channels x number of samples)
+    src_chs: list 
+        Source channels
+    trg_ch: int 
+        Target channel
+    freq_ph: ndarray of shape (frequencies_ph,)
+        Frequencies of interest for phase extraction, in Hz
+    freq_amp: ndarray of shape (frequencies_amp,)
+        Frequencies of interest for amplitude extraction, in Hz
+    time: ndarray of shape (samples,)
+        Time vector (must be sampled at the sampling frequency of X)
+    fs: float
+        Sampling frequency
+
+    Returns
+    -------
+    CFD_pac: ndarray of shape (sources,frequencies_ph,frequencies_amp) 
+        Cross frequency directionality for each source channel
+    """
+    return np.array([CFD_Ch(X,[src,trg_ch],freq_ph,freq_amp,time,fs) for src in src_chs])
+
 # =============================================================================
 # Wavelet transform
 # =============================================================================
 
-def Morlet_Wavelet(data,time,freq):
+@lru_cache(maxsize=32)
+def Morlet_Bank(fs,n_samples,freq,nConv):
     """
-    Morlet wavelet decomposition 
+    Frequency-domain Morlet wavelets, cached by sampling frequency, number of 
+    samples and frequencies 
     
     Parameters
     ----------
-    data: ndarray of shape (samples,)
-        Input signal 
-    time: ndarray of shape (samples,)
-        Time vector (must be sampled at the sampling frequency of data, 
-        best practice is to have time=0 at the center of the wavelet)
-    freq: ndarray of shape (frequencies,)
+    fs: float
+        Sampling frequency
+    n_samples: int
+        Number of samples of the wavelets (time=0 at the center)
+    freq: tuple of shape (frequencies,)
         Frequencies to evaluate in Hz
+    nConv: int
+        Length of the FFT (length of the linear convolution)
         
     Returns
     -------
-    dataW: dict of keys {'amp','filt','phase','f'}
-        Dictionary containing the Morlet wavelet decomposition of data
-        'amp': ndarray of shape (frequencies,num_samples) holding the amplitude envelopes at each freq
-        'filt': ndarray of shape (frequencies,num_samples) holding the filtered signals at each freq
-        'phase': ndarray of shape (frequencies,num_samples) holding the phase time series at each freq
-        'f': ndarray of shape (frequencies,) holding the evaluated frequencies in Hz
-        (If samples is odd, num_samples = samples, otherwise num_samples = samples-1)
+    cmwX: ndarray of shape (frequencies,nConv)
+        Amplitude-normalized FFT of each wavelet (read-only)
     """
-    # =============================================================================
-    # Create the Morlet wavelets
-    # =============================================================================
-    num_freq = len(freq); 
-    cmw = np.zeros([data.shape[0],num_freq],dtype = 'complex_')
+    time = np.arange(n_samples)/fs
+    time = time-(time[-1]/2)
     
     # Number of cycles in the wavelets 
     range_cycles = [3,10]
     max_freq = 60 
     freq_vec = np.arange(1,max_freq+1)
     nCycles_aux = np.logspace(np.log10(range_cycles[0]),np.log10(range_cycles[-1]),len(freq_vec))
-    nCycles = np.array([nCycles_aux[np.argmin(np.abs(freq_vec - freq[i]))] 
-                        for i in range(num_freq)])
-    
-    for ii in range(num_freq): 
-        # create complex sine wave
-        sine_wave = np.exp(1j*2*np.pi*freq[ii]*time)
-        
-        # create Gaussian window
-        s = nCycles[ii]/(2*np.pi*freq[ii]) #this is the standard deviation of the gaussian
-        gaus_win  = np.exp((-time**2)/(2*s**2))
-        
-        # now create Morlet wavelet
-        cmw[:,ii] = sine_wave*gaus_win
-        
-    # =============================================================================
-    # Convolution 
-    # =============================================================================
+    nCycles = np.array([nCycles_aux[np.argmin(np.abs(freq_vec - f))] for f in freq])
     
-    # Define convolution parameters 
-    nData = len(data)
-    nKern = cmw.shape[0]
-    nConv = nData + nKern - 1
-    half_wav = int(np.floor(cmw.shape[0]/2)+1)
-    
-    # FFTs
+    # Complex sine waves and Gaussian windows for all the frequencies
+    freq = np.array(freq,dtype=float).reshape(-1,1)
+    s = nCycles.reshape(-1,1)/(2*np.pi*freq) # standard deviation of the gaussian
+    cmw = np.exp(1j*2*np.pi*freq*time)*np.exp((-time**2)/(2*s**2))
     
     # FFT of wavelet, and amplitude-normalize in the frequency domain
-    cmwX = np.fft.fft(cmw,nConv,axis=0)
-    cmwX = cmwX/np.max(cmwX,axis=0)
+    cmwX = np.fft.fft(cmw,nConv,axis=-1)
+    cmwX = cmwX/np.max(cmwX,axis=-1,keepdims=True)
+    cmwX.flags.writeable = False
+    return cmwX
+
+def Morlet_Convolution(data,fs,freq):
+    """
+    Morlet wavelet convolution of several signals at once, one rFFT for all 
+    of them 
+    
+    Parameters
+    ----------
+    data: ndarray of shape (channels,samples)
+        Input signals 
+    fs: float
+        Sampling frequency
+    freq: tuple of shape (frequencies,)
+        Frequencies to evaluate in Hz
         
-    # FFT of data
-    dataX = np.fft.fft(data,nConv)
-    dataX = np.repeat(dataX.reshape([-1,1]),num_freq,axis=1)
+    Returns
+    -------
+    data_wav: ndarray of shape (channels,frequencies,num_samples)
+        Complex decomposition (If samples is odd, num_samples = samples, 
+        otherwise num_samples = samples-1)
+    """
+    nData = data.shape[-1]
+    nConv = 2*nData-1
+    half_wav = int(np.floor(nData/2)+1)
+    cmwX = Morlet_Bank(fs,nData,tuple(freq),nConv)
+    
+    # FFT of data, the negative frequencies from the real FFT
+    dataR = np.fft.rfft(data,nConv,axis=-1)
+    m = dataR.shape[-1]
+    dataX = np.empty(data.shape[:-1]+(nConv,),dtype=complex)
+    dataX[...,:m] = dataR
+    dataX[...,m:] = np.conj(dataR[...,1:nConv-m+1][...,::-1])
     
     # Convolution...
-    data_wav = np.fft.ifft(dataX*cmwX,axis=0)
+    data_wav = np.fft.ifft(dataX[...,np.newaxis,:]*cmwX,axis=-1)
     
     # Cut 1/2 of the length of the wavelet from the beginning and from the end
-    data_wav = data_wav[half_wav-2:-half_wav,:]
+    return data_wav[...,half_wav-2:-half_wav]
+
+_epoch_cache = OrderedDict()
+EPOCH_CACHE_SIZE = 64
+
+def Wavelet_Epoch_Dec(data,fs,freq):
+    """
+    Complex Morlet decomposition of each channel, memoized by channel data, 
+    so the channels shared by several channel pairs are decomposed once 
+    
+    Parameters
+    ----------
+    data: ndarray of shape (channels,samples)
+        Input signals (number of channels x number of samples)
+    fs: float
+        Sampling frequency
+    freq: tuple of shape (frequencies,)
+        Frequencies to evaluate in Hz
+
+    Returns
+    -------
+    data_wav: ndarray of shape (channels,frequencies,num_samples)
+        Complex decomposition of the detrended channels
+    """
+    keys = [(ch_data.tobytes(),fs,freq) for ch_data in data]
+    missing = [i for i,key in enumerate(keys) if key not in _epoch_cache]
+    
+    if missing:
+        # Data detrending and decomposition of the new channels
+        ch_data = data[missing,:]
+        ch_data = ch_data - np.mean(ch_data,axis=-1,keepdims=True)
+        for i,ch_wav in zip(missing,Morlet_Convolution(ch_data,fs,freq)):
+            _epoch_cache[keys[i]] = ch_wav
+            
+    for key in keys:
+        _epoch_cache.move_to_end(key)
+    data_wav = np.stack([_epoch_cache[key] for key in keys])
+    while len(_epoch_cache) > EPOCH_CACHE_SIZE:
+        _epoch_cache.popitem(last=False)
+    return data_wav
+
+def Morlet_Wavelet(data,time,freq):
+    """
+    Morlet wavelet decomposition 
+    
+    Parameters
+    ----------
+    data: ndarray of shape (samples,)
+        Input signal 
+    time: ndarray of shape (samples,)
+        Time vector in seconds (must be sampled at the sampling frequency of 
+        data, with time=0 at the center of the wavelet)
+    freq: ndarray of shape (frequencies,)
+        Frequencies to evaluate in Hz
+        
+    Returns
+    -------
+    dataW: dict of keys {'amp','filt','phase','f'}
+        Dictionary containing the Morlet wavelet decomposition of data
+        'amp': ndarray of shape (frequencies,num_samples) holding the amplitude envelopes at each freq
+        'filt': ndarray of shape (frequencies,num_samples) holding the filtered signals at each freq
+        'phase': ndarray of shape (frequencies,num_samples) holding the phase time series at each freq
+        'f': ndarray of shape (frequencies,) holding the evaluated frequencies in Hz
+        (If samples is odd, num_samples = samples, otherwise num_samples = samples-1)
+    """
+    fs = sampling_frequency(time)
+    data_wav = Morlet_Convolution(np.reshape(data,(1,-1)),fs,tuple(freq))[0]
     
     # Extract filtered data, amplitude and phase 
-    data_wav = data_wav.T
     dataW = {}
     dataW['filt'] = np.real(data_wav)
     dataW['amp'] = np.abs(data_wav)
@@ -613,6 +814,22 @@ def Morlet_Wavelet(data,time,freq):
     
     return dataW
 
+def sampling_frequency(time):
+    """
+    Sampling frequency of a time vector, rounded to be used as a cache key 
+    
+    Parameters
+    ----------
+    time: ndarray of shape (samples,)
+        Time vector in seconds 
+
+    Returns
+    -------
+    fs: float
+        Sampling frequency
+    """
+    return round(1/(time[1]-time[0]),6)
+
 def Wavelet_Trial_Dec(data,time,freq,component ='phase'):
     """
     Morlet wavelet decomposition for multiple channels 
@@ -639,28 +856,21 @@ def Wavelet_Trial_Dec(data,time,freq,component ='phase'):
     """
     if np.size(freq) == 1:
         freq = [freq]
-
-    # Time centering 
-    t = (time.flatten())/1000 # ms to s
-    t = t - t[0]
-    t = t-(t[-1]/2) # best practice is to have time=0 at the center of the wavelet
-
-    if (data.shape[1] % 2) == 0:
-        wav_dec = np.zeros([data.shape[0],data.shape[1]-1,len(freq)])
-    else:
-        wav_dec = np.zeros([data.shape[0],data.shape[1],len(freq)])
-
-    for ch in range(data.shape[0]):
-       
-        # Data detrending
-        ch_data = data[ch,:]
-        ch_data = ch_data - np.mean(ch_data)
-        
-        # Data decomposition 
-        dataW = Morlet_Wavelet(ch_data,t,freq)
-        wav_dec[ch,:,:] = dataW[component].T
+    freq = tuple(np.ravel(freq).tolist())
+    
+    # ms to s
+    fs = sampling_frequency(time.flatten()/1000)
+    data_wav = Wavelet_Epoch_Dec(np.asarray(data,dtype=float),fs,freq)
+    
+    match component:
+        case 'filt':
+            wav_dec = np.real(data_wav)
+        case 'amp':
+            wav_dec = np.abs(data_wav)
+        case 'phase':
+            wav_dec = np.angle(data_wav)
     
-    return wav_dec
+    return np.transpose(wav_dec,(0,2,1))
             
 # =============================================================================
 # Connectivity-based Neurofeedback Functions 
@@ -713,12 +923,16 @@ def neurofeedback_CFD(data,ch_labels,fs):
     ch_lst_aux = list(np.vstack((np.reshape(xv,-1),np.reshape(yv,-1))).T)
     ch_pair_lst = [[ch[0],ch[1]] for ch in ch_lst_aux if ch[0]!=ch[1]]
     
-    # Compute the CFD
-    CFD_cfi_aux = Parallel(n_jobs=-1,verbose=0)(delayed(CFD_Ch) 
-                                    (data,ch_pair,freq_ph,freq_amp,t_vec,fs) for ch_pair in ch_pair_lst)
+    # Compute the CFD, one task per target channel to share its decomposition
+    trg_lst = [([ch[0] for ch in ch_pair_lst if ch[1]==trg],trg) for trg in target_ch]
+    trg_lst = [(src_chs,trg) for src_chs,trg in trg_lst if src_chs]
+    with share(data) as data_sh:
+        tasks = [submit(CFD_Target,data_sh,src_chs,trg,freq_ph,freq_amp,t_vec,fs) for src_chs,trg in trg_lst]
+        CFD_cfi_aux = [task.result() for task in tasks]
     CFD_matrix = np.zeros((num_ch,num_ch,num_freq_ph*num_freq_amp))
-    for ii,ch_pair in enumerate(ch_pair_lst):
-        CFD_matrix[ch_pair[0],ch_pair[1],:] = CFD_cfi_aux[ii].flatten() 
+    for (src_chs,trg),CFD_trg in zip(trg_lst,CFD_cfi_aux):
+        for ii,src in enumerate(src_chs):
+            CFD_matrix[src,trg,:] = CFD_trg[ii].flatten() 
     CFD_mean = np.mean(CFD_matrix,axis=2)
     
     return CFD_mean
@@ -783,26 +997,31 @@ def neurofeedback_kTE_PAC(data,ch_labels,fs):
     
     # Embedding time (autocorrelation decay time)
     maxlag = (50//n)
-    Tau_aux = Parallel(n_jobs=-1,verbose=0)(delayed(autocorr_decay_time)
-                                            (data[ch,:],maxlag) for ch in target_ch)
+    tasks = [submit(autocorr_decay_time,data[ch,:],maxlag) for ch in target_ch]
+    Tau_aux = [task.result() for task in tasks]
     Tau = np.zeros(num_ch)
     Tau[target_ch] = Tau_aux
     # Tau = 20*np.ones(num_ch)
     
     # Embedding dimension (obtained using the cao criterion) 
     d_max = (10//n)
-    Dim_aux = Parallel(n_jobs=-1,verbose=0)(delayed(cao_criterion)
-                                            (data[ch,:],d_max,Tau[ch]) for ch in target_ch)
+    tasks = [submit(cao_criterion,data[ch,:],d_max,Tau[ch]) for ch in target_ch]
+    Dim_aux = [task.result() for task in tasks]
     Dim = np.zeros(num_ch)
     Dim[target_ch] = Dim_aux
     # Dim = 3*np.ones(num_ch)
     
-    # Compute PAC kTE  
-    kTE_cfi_aux = Parallel(n_jobs=-1,verbose=0)(delayed(kernelTransferEntropy_PAC_Ch) 
-                                (data,ch_pair,Dim,Tau,u_trial,alpha,freq_ph,freq_amp,t_vec) for ch_pair in ch_pair_lst)
+    # Compute PAC kTE, one task per target channel to share its kernels
+    trg_lst = [([ch[0] for ch in ch_pair_lst if ch[1]==trg],trg) for trg in target_ch]
+    trg_lst = [(src_chs,trg) for src_chs,trg in trg_lst if src_chs]
+    with share(data) as data_sh:
+        tasks = [submit(kernelTransferEntropy_PAC_Target,data_sh,src_chs,trg,Dim,Tau,u_trial,alpha,freq_ph,freq_amp,t_vec) 
+                 for src_chs,trg in trg_lst]
+        kTE_cfi_aux = [task.result() for task in tasks]
     kTE_matrix = np.zeros((num_ch,num_ch,num_freq_ph*num_freq_amp))
-    for ii,ch_pair in enumerate(ch_pair_lst):
-        kTE_matrix[ch_pair[0],ch_pair[1],:] = kTE_cfi_aux[ii].flatten() 
+    for (src_chs,trg),kTE_trg in zip(trg_lst,kTE_cfi_aux):
+        for ii,src in enumerate(src_chs):
+            kTE_matrix[src,trg,:] = kTE_trg[ii].flatten() 
     kTE_mean = np.mean(kTE_matrix,axis=2)
     
     return kTE_mean
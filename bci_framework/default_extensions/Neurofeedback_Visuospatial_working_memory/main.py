@@ -12,7 +12,7 @@ import numpy as np
 from openbci_stream.utils import autokill_process
 autokill_process('VisuospatialWorkingMemory')
 
-from bci_framework.extensions.data_analysis import DataAnalysis, Feedback, loop_consumer
+from bci_framework.extensions.data_analysis import DataAnalysis, Feedback, BandPower, loop_consumer
 from bci_framework.extensions import properties as prop
 
 import NeuroFeedbackFunctions as nff
@@ -86,10 +86,18 @@ class NeuroFeedbackCFD(NeuroFeedback):
 
 ########################################################################
 class NeuroFeedbackAlphaFz(NeuroFeedback):
-    """"""
-    calcule = lambda cls, *args: nff.neurofeedback_AlphaFz(*args)
+    """Alpha power on Fz, from the band power of the window."""
     compare = lambda cls, *args: nff.compare_AlphaFz(*args)
 
+    # ----------------------------------------------------------------------
+    def calcule(self, data: np.ndarray, ch_labels: list[str], fsample: int) -> float:
+        """"""
+        if getattr(self, 'band_power', None) is None:
+            self.band_power = BandPower({'alpha': (8, 13)}, fsample,
+                                        window=data.shape[1] / fsample,
+                                        channels=[ch_labels.index('Fz')])
+        return float(self.band_power.compute(data)[0, 0])
+
 
 ########################################################################
 class VWMGenerator(DataAnalysis):
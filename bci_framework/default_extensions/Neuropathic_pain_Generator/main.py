@@ -12,194 +12,15 @@ Universidad Nacional de Colombia, Manizales - Colombia
 yencardonaal@unal.edu.co
 """
 
-import numpy as np
-from scipy.signal import butter, filtfilt
-from scipy import signal
-
-# import matplotlib.pyplot as plt
 import logging
-import sys
 
 from bci_framework.extensions.data_analysis import (
     DataAnalysis,
     Feedback,
+    BandPower,
     loop_consumer,
 )
 
-from bci_framework.extensions import properties as prop
-
-import numpy.typing as npt
-from typing import Literal, TypeAlias, Union, Optional
-
-eeg_channels: TypeAlias = list[str]
-eeg_signal: TypeAlias = npt.NDArray
-
-
-########################################################################
-class NFB_powerbands:
-    """"""
-
-    # ----------------------------------------------------------------------
-    def __init__(
-        self,
-        ch_labels: eeg_channels,
-        fs: Union[int, float],
-        target_ch_labels: eeg_channels,
-        method: Literal['fourier', 'welch'],
-        bands: dict[str, tuple[list[int], Literal['increase', 'decrease']]],
-        baseline_count: int,
-    ):
-        """Constructor"""
-
-        self.bands = bands
-        self.method = method
-        self.target_ch_labels = target_ch_labels
-        self.fs = fs
-        self.ch_labels = ch_labels
-
-        self.historical = {}
-        self.baseline_count = baseline_count
-
-    # ----------------------------------------------------------------------
-    def add(self, data: np.ndarray) -> None:
-        """From a `(channels, time)` array, calculate the connectivity.
-
-        This vector is the historical and wil be used to calculate the baseline.
-        """
-        value = self.compute(data)
-
-        for k in value:
-            self.historical.setdefault(k, []).append(value[k])
-            if len(self.historical[k]) > self.baseline_count:
-                self.historical[k].pop(0)
-
-    # ---------------------------------------------------------------------
-    def compute(self, data: eeg_signal) -> dict[str]:
-        """
-        Compute the alpha, beta and theta bands power spectral density (PSD) for 2 seconds long EEG trial (epoch).
-
-        Parameters
-        ----------
-        data (channels,samples):
-            Input time series (number of channels x number of samples)
-        ch_labels:
-            EEG channel labels
-        fs:
-            Sampling frequency (Hz)
-        target_ch_labels:
-            Channel combination
-        method:
-            Method to estimate power spectral density (Fourier or Welch)
-
-        Returns
-        -------
-        powerband
-            Alpha, Beta and Theta PSD
-        """
-        rhyt = list(self.bands.keys())
-
-        feats = []
-        nyq = 0.5 * self.fs
-        for k in self.bands:
-            band = np.array(self.bands[k][0])
-            b, a = butter(
-                5, band / nyq, btype='band'
-            )  # fast enough to generate parameters each time
-            feats.append(filtfilt(b, a, data, axis=-1))
-
-        try:
-            target_ch = [
-                self.ch_labels.index(ch) for ch in self.target_ch_labels
-            ]
-        except ValueError:
-            logging.error("Error! Required channel not found...")
-            sys.exit()
-
-        PSD = {}
-
-        match self.method:
-
-            case 'fourier':
-                # Compute and plot the power spectral density (PSD) using Fourier Transform
-                freqs = np.fft.rfftfreq(self.fs, 1 / self.fs)
-                for r, feat in enumerate(feats):
-                    psdr = abs(
-                        np.fft.rfft(
-                            feat[target_ch, :].flatten(),
-                            n=self.fs,
-                            axis=-1,
-                        )
-                    )
-                    PSD[rhyt[r]] = psdr
-
-            case 'welch':
-                # Compute and plot the power spectral density (PSD) using Welch's method
-                for r, feat in enumerate(feats):
-                    freqs, psdr = signal.welch(
-                        feat[target_ch, :].flatten(),
-                        self.fs,
-                        nperseg=self.fs,
-                        scaling='spectrum',
-                    )
-                    PSD[rhyt[r]] = psdr
-
-        return PSD
-
-    # ----------------------------------------------------------------------
-    def compare(
-        self, psd_band: dict[str], psd_baseline: dict[str]
-    ) -> list[bool]:
-        """"""
-
-        feedback = {}
-        for band in self.bands:
-            if (
-                np.mean(psd_baseline[band]) > np.mean(psd_band[band])
-                and self.bands[band][1] == 'increase'
-            ):
-                feedback[band] = [True, self.bands[band][1]]
-            elif (
-                np.mean(psd_baseline[band]) < np.mean(psd_band[band])
-                and self.bands[band][1] == 'decrease'
-            ):
-                feedback[band] = [True, self.bands[band][1]]
-            else:
-                feedback[band] = [False, self.bands[band][1]]
-
-        return feedback
-
-    # ----------------------------------------------------------------------
-    def freeze_baseline(self):
-        """"""
-        # self.baseline_ = np.mean(self.historical)
-        self.baseline_ = {
-            k: np.mean(self.historical[k], axis=0) for k in self.historical
-        }
-        # logging.warning(f'Baseline')
-
-    @property
-    # ----------------------------------------------------------------------
-    def baseline(self) -> Optional[float]:
-        """Return the baseline if it exists."""
-
-        if baseline := getattr(self, 'baseline_', None):
-            return baseline
-        else:
-            return None
-
-    # ----------------------------------------------------------------------
-    @property
-    def value(self) -> Optional[float]:
-        """Return the baseline if the baseline exists."""
-
-        if baseline := getattr(self, 'baseline_', None):
-            return self.compare(
-                {k: self.historical[k][-1] for k in self.historical},
-                baseline,
-            )
-        else:
-            return None
-
 
 ########################################################################
 class PowerBandNeuroFeedback(DataAnalysis):
@@ -244,13 +65,26 @@ class PowerBandNeuroFeedback(DataAnalysis):
         if self.configuration['status'] == 'off':
             return
 
-        self.neurofeedback = NFB_powerbands(
-            baseline_count=self.configuration['baseline_packages'],
-            ch_labels=self.configuration['channels'],
-            target_ch_labels=self.configuration['target_channels'],
+        channels = self.configuration['channels']
+        try:
+            target_ch = [
+                channels.index(ch)
+                for ch in self.configuration['target_channels']
+            ]
+        except ValueError:
+            logging.error("Error! Required channel not found...")
+            self.configuration['status'] = 'off'
+            return
+
+        bands = self.configuration['bands']
+        self.controls = {band: bands[band][1] for band in bands}
+        self.band_power = BandPower(
+            {band: bands[band][0] for band in bands},
             fs=self.configuration['sample_rate'],
+            window=self.configuration['window_analysis'],
             method=self.configuration['method'],
-            bands=self.configuration['bands'],
+            channels=target_ch,
+            baseline_size=self.configuration['baseline_packages'],
         )
 
         self.set_package_size(configuration.get('sliding_data', 1000))
@@ -259,7 +93,22 @@ class PowerBandNeuroFeedback(DataAnalysis):
     def freeze_baseline(self) -> None:
         """Calculate the baseline."""
 
-        self.neurofeedback.freeze_baseline()
+        self.band_power.freeze_baseline()
+
+    # ----------------------------------------------------------------------
+    def compare(self) -> dict[str, list]:
+        """Compare the mean power of each band with the baseline."""
+
+        value = self.band_power.value.mean(axis=1)
+        baseline = self.band_power.baseline.mean(axis=1)
+
+        feedback = {}
+        for band, v, b in zip(self.band_power.bands, value, baseline):
+            if self.controls[band] == 'increase':
+                feedback[band] = [bool(b > v), self.controls[band]]
+            else:
+                feedback[band] = [bool(b < v), self.controls[band]]
+        return feedback
 
     # ----------------------------------------------------------------------
     @loop_consumer('eeg')
@@ -272,19 +121,12 @@ class PowerBandNeuroFeedback(DataAnalysis):
         if self.configuration['status'] == 'off':
             return
 
-        window = self.buffer_eeg[
-            :,
-            -int(prop.SAMPLE_RATE * self.configuration['window_analysis']) :,
-        ]
-        self.neurofeedback.add(window)
+        self.band_power.update(self.buffer_eeg)
 
-        if not self.neurofeedback.baseline:
+        if self.band_power.baseline is None:
             return
 
-        feedback = {
-            'feedback': self.neurofeedback.value,
-        }
-        self.feedback.write(feedback)
+        self.band_power.publish(self.feedback, feedback=self.compare())
 
 
 if __name__ == '__main__':
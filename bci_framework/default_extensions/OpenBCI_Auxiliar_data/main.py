@@ -56,8 +56,9 @@ class OpenBCIAuxiliarData(EEGStream, Widgets):
         time = np.linspace(-t, 0, aux.shape[1])        
         self.axis.set_xlim(-t, 0)
          
+        time, aux = self.decimate(time, aux, self.axis)
         for i, line in enumerate(self.lines):
-            line.set_data(time, aux[i])
+            line.set_data(time[i], aux[i])
             
         self.feed()
 
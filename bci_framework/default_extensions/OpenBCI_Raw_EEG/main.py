@@ -9,10 +9,13 @@ from bci_framework.extensions.data_analysis import (
     loop_consumer,
     fake_loop_consumer,
 )
+from bci_framework.extensions.data_analysis.transformers import (
+    center,
+    reference,
+)
 from bci_framework.extensions import properties as prop
 
 import numpy as np
-import logging
 
 
 ########################################################################
@@ -46,6 +49,12 @@ class RawEEG(EEGStream, Widgets):
 
         self.create_buffer(BUFFER, DATAWIDTH, fill=0)
 
+        # Called at the rate that the viewer can draw
+        self.set_frame_rate()
+
+        # Only the lines are rendered on each frame
+        self.set_render_mode('blit')
+
         self.stream()
 
     # ----------------------------------------------------------------------
@@ -57,13 +66,24 @@ class RawEEG(EEGStream, Widgets):
         channels = self.widget_value['Channels']
         window_time = self.widget_value['Window time']
 
-        # logging.warning(f'Latency: {latency}')
-        if data.shape[1] != 100:
-            logging.warning(f'Shape: {data.shape[1]}')
-
         eeg = self.buffer_eeg[:, -window_time * prop.SAMPLE_RATE :]
         t = np.linspace(-window_time, 0, eeg.shape[1])
-        self.axis.set_xlim(-window_time, 0)
+        if self.axis.get_xlim() != (-window_time, 0):
+            self.axis.set_xlim(-window_time, 0)
+
+        # Re-referenced once for all the channels
+        if substract == 'channel mean':
+            eeg = center(eeg)
+        elif substract == 'global mean':
+            eeg = eeg - eeg.mean()
+        elif (substract == 'Cz') and ('Cz' in prop.CHANNELS.values()):
+            index = list(prop.CHANNELS.values()).index('Cz')
+            eeg = reference(eeg, [index])
+
+        eeg = eeg + scale * np.arange(eeg.shape[0])[:, np.newaxis]
+
+        # Two points for each pixel column, the spikes are preserved
+        t, eeg = self.decimate(t, eeg, self.axis)
 
         for i, line in enumerate(self.lines):
 
@@ -71,15 +91,7 @@ class RawEEG(EEGStream, Widgets):
                 line.set_data([], [])
                 continue
 
-            if substract == 'none':
-                line.set_data(t, (eeg[i]) + scale * i)
-            elif substract == 'channel mean':
-                line.set_data(t, (eeg[i] - np.mean(eeg[i])) + scale * i)
-            elif substract == 'global mean':
-                line.set_data(t, (eeg[i] - np.mean(eeg)) + scale * i)
-            elif (substract == 'Cz') and ('Cz' in prop.CHANNELS.values()):
-                index = list(prop.CHANNELS.values()).index('Cz')
-                line.set_data(t, (eeg[i] - eeg[index - 1]) + scale * i)
+            line.set_data(t[i], eeg[i])
 
         self.feed()
 
@@ -5,11 +5,10 @@ Raw EEG
 """
 
 from bci_framework.extensions.visualizations import EEGStream, Widgets, interact
-from bci_framework.extensions.data_analysis import loop_consumer, fake_loop_consumer
+from bci_framework.extensions.data_analysis import loop_consumer, fake_loop_consumer, StreamingWelch
 from bci_framework.extensions import properties as prop
 import numpy as np
 from scipy.fftpack import fft, fftfreq, fftshift
-from scipy.signal import welch
 
 from gcpds.filters import frequency as flt
 import logging
@@ -31,6 +30,12 @@ class RawEEG(EEGStream, Widgets):
         self.axis = self.add_subplot(111)
         self.create_buffer(BUFFER, aux_shape=3, fill=0)
 
+        # Same segments of a Welch over the buffer, calculated only once
+        self.welch = StreamingWelch(len(prop.CHANNELS), prop.SAMPLE_RATE,
+                                    nperseg=100, window='flattop',
+                                    scaling='spectrum',
+                                    segments=(BUFFER * prop.SAMPLE_RATE - 100) // 50 + 1)
+
         window = BUFFER * prop.SAMPLE_RATE
         self.W = fftshift(fftfreq(window, 1 / prop.SAMPLE_RATE))
 
@@ -45,15 +50,23 @@ class RawEEG(EEGStream, Widgets):
         self.axis.set_ylabel('Amplitude')
         self.axis.grid(True)
 
+        # Called at the rate that the viewer can draw
+        self.set_frame_rate()
+
         self.stream()
 
     # ----------------------------------------------------------------------
 
     @loop_consumer('eeg')
-    def stream(self, frame):
+    def stream(self, data):
 
-        if frame % 3:
-            return
+        # Only the new samples, already filtered, are added to the estimation,
+        # `data` contains all the samples since the previous frame
+        if self.welch.count:
+            self.welch.update(self.buffer_eeg[:, -data.shape[1]:])
+        else:
+            # Started or filters changed, the buffer is filtered again
+            self.welch.update(self.buffer_eeg)
 
         channels = self.widget_value['Channels']
 
@@ -67,8 +80,7 @@ class RawEEG(EEGStream, Widgets):
             self.W = fftshift(fftfreq(EEG.shape[1], 1 / prop.SAMPLE_RATE))
 
         elif self.mode == 'Welch':
-            EEG, self.W = welch(eeg, prop.SAMPLE_RATE, window='flattop',
-                                nperseg=100, scaling='spectrum', axis=-1)
+            EEG, self.W = self.welch.psd, self.welch.freqs
 
         EEG = EEG / EEG.max()
         for i, line in enumerate(self.lines):
@@ -89,6 +101,18 @@ class RawEEG(EEGStream, Widgets):
 
         self.feed()
 
+    # ----------------------------------------------------------------------
+    def add_transformers(self, transformers):
+        """The segments with the previous filters are discarded."""
+        super().add_transformers(transformers)
+        self.welch.reset()
+
+    # ----------------------------------------------------------------------
+    def remove_transformers(self, transformers):
+        """The segments with the previous filters are discarded."""
+        super().remove_transformers(transformers)
+        self.welch.reset()
+
     # ----------------------------------------------------------------------
 
     @interact('Mode', ('Fourier', 'Welch'), 'Fourier')
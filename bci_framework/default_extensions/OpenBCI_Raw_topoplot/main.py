@@ -7,7 +7,6 @@ Raw topoplot
 from bci_framework.extensions.visualizations import EEGStream
 from bci_framework.extensions.data_analysis import loop_consumer, fake_loop_consumer
 from bci_framework.extensions import properties as prop
-import mne
 
 
 ########################################################################
@@ -20,25 +19,26 @@ class Stream(EEGStream):
         super().__init__(*args, **kwargs)
 
         self.axis = self.add_subplot(1, 1, 1)
-        self.info = self.get_mne_info()
+
+        # The interpolation and the head are built once
+        self.topomap = self.create_topomap(self.axis, cmap='cool')
+
+        # Called at the rate that the viewer can draw
+        self.set_frame_rate()
+
+        # Only the image is rendered on each frame
+        self.set_render_mode('blit')
 
         self.stream()
 
     # ----------------------------------------------------------------------
     @loop_consumer('eeg')
-    def stream(self, data, frame):
+    def stream(self, data):
         """"""
-        if (frame % 5) == 0:
-            eeg = data
-            self.axis.clear()
-            mne.viz.plot_topomap(eeg.mean(axis=1) - eeg.mean(), 
-                self.info, axes=self.axis, show=False, outlines='head', cmap='cool')
-
-            self.feed()
+        eeg = data
+        self.topomap.update(eeg.mean(axis=1) - eeg.mean())
+        self.feed()
 
 
 if __name__ == '__main__':
     Stream()
-
-
-
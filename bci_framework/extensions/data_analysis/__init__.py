@@ -5,4 +5,8 @@ Data Analysis
 """
 
 from .data_analysis import DataAnalysis, Feedback
+from .filters import StreamingFilter, BandPass, Notch
 from .utils import loop_consumer, fake_loop_consumer, thread_this, subprocess_this, marker_slicing
+from .workers import offload, submit, share
+from .spectrum import StreamingWelch
+from .band_power import BandPower
@@ -0,0 +1,155 @@
+"""
+============
+Backpressure
+============
+
+Policies for consumers with callbacks slower than the stream.
+
+With the `block` policy the messages are read only when the previous
+callback finishes, as a plain iteration over the consumer, so if the
+callbacks are slow the lag grows without bound. The other policies read the
+consumer in a background thread into a bounded queue:
+
+===========  ============================================================
+Policy       Behavior
+===========  ============================================================
+block        Every message is processed, the consumer waits.
+drop_oldest  When the queue is full the oldest `eeg` or `aux` messages are
+             discarded, the events are always delivered.
+coalesce     Every message updates the buffers, but the callback is only
+             called for the freshest message of each topic in the queue.
+===========  ============================================================
+"""
+
+import logging
+from collections import deque
+from threading import Condition, Thread
+from typing import Iterable, Iterator, Literal, Optional, Tuple
+
+from .instrumentation import get_instrumentation
+
+POLICY = Literal['block', 'drop_oldest', 'coalesce']
+
+# Topics that can be skipped, the events are always delivered
+COALESCED_TOPICS = ['eeg', 'aux']
+
+
+########################################################################
+class Backpressure:
+    """Iterate a consumer with a backpressure policy.
+
+    Parameters
+    ----------
+    stream
+        Consumer to read.
+    policy
+        `block`, `drop_oldest` or `coalesce`.
+    queue_size
+        Maximum number of messages retained.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self,
+        stream: Iterable,
+        policy: Optional[POLICY] = 'block',
+        queue_size: Optional[int] = 64,
+    ):
+        """"""
+        if policy not in ['block', 'drop_oldest', 'coalesce']:
+            raise ValueError(f'Unknown backpressure policy: {policy}')
+
+        self.stream = stream
+        self.policy = policy
+        self.queue_size = queue_size
+        self.dropped = 0
+        self.skipped = 0
+
+        self._queue = deque()
+        self._queued = {}
+        self._done = False
+        self._condition = Condition()
+        self._instrumentation = get_instrumentation()
+
+    # ----------------------------------------------------------------------
+    def _read(self) -> None:
+        """Fill the queue from the consumer."""
+        try:
+            for message in self.stream:
+                with self._condition:
+                    if self.policy == 'coalesce':
+                        # Keep all the messages, wait for space instead
+                        self._condition.wait_for(
+                            lambda: len(self._queue) < self.queue_size
+                        )
+                    elif len(self._queue) >= self.queue_size:
+                        self._drop_oldest()
+
+                    self._queue.append(message)
+                    self._queued[message.topic] = (
+                        self._queued.get(message.topic, 0) + 1
+                    )
+                    self._condition.notify_all()
+        except Exception as error:
+            logging.error(f'Consumer stopped: {error}')
+        finally:
+            with self._condition:
+                self._done = True
+                self._condition.notify_all()
+
+    # ----------------------------------------------------------------------
+    def _drop_oldest(self) -> None:
+        """Discard the oldest message of the `COALESCED_TOPICS`.
+
+        If the queue only contains events, waits for space instead. Must be
+        called with the condition acquired.
+        """
+        for i, old in enumerate(self._queue):
+            if old.topic in COALESCED_TOPICS:
+                del self._queue[i]
+                self._queued[old.topic] -= 1
+                self.dropped += 1
+                self._instrumentation.drop()
+                return
+
+        self._condition.wait_for(lambda: len(self._queue) < self.queue_size)
+
+    # ----------------------------------------------------------------------
+    def __iter__(self) -> Iterator[Tuple[object, bool]]:
+        """Iterate over the messages.
+
+        Yields
+        ------
+        tuple
+            The message and if the callback must be called for it.
+        """
+        if self.policy == 'block':
+            for message in self.stream:
+                yield message, True
+            return
+
+        Thread(target=self._read, daemon=True).start()
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._done)
+                if not self._queue:
+                    return
+                message = self._queue.popleft()
+                self._queued[message.topic] -= 1
+                newer = self._queued[message.topic]
+                self._condition.notify_all()
+
+            if (
+                self.policy == 'coalesce'
+                and newer
+                and message.topic in COALESCED_TOPICS
+            ):
+                yield message, False
+            else:
+                yield message, True
+
+    # ----------------------------------------------------------------------
+    def skip(self, n: Optional[int] = 1) -> None:
+        """Count callback invocations skipped by the consumer."""
+        self.skipped += n
+        self._instrumentation.skip(n)
@@ -0,0 +1,74 @@
+"""
+================
+Generation Cache
+================
+
+Memoization of the values derived from the buffers.
+
+The buffers only change when a new package arrives, so every derived array,
+like the interpolated timestamps or the resampled views, can be calculated
+once per package and reused by all the readers.
+"""
+
+from functools import wraps
+from typing import Any, Callable, Hashable
+
+import numpy as np
+
+
+########################################################################
+class GenerationCache:
+    """Cache invalidated each time the generation counter is increased."""
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """"""
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._values = {}
+
+    # ----------------------------------------------------------------------
+    def bump(self) -> None:
+        """Start a new generation, all the cached values are discarded."""
+        self.generation += 1
+        self._values.clear()
+
+    # ----------------------------------------------------------------------
+    def get(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """Return the cached value for `key` or calculate it with `fn`.
+
+        Arrays are cached as read-only since the same object is returned to
+        all the readers.
+        """
+        if key in self._values:
+            self.hits += 1
+            return self._values[key]
+
+        self.misses += 1
+        value = fn()
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        self._values[key] = value
+        return value
+
+    # ----------------------------------------------------------------------
+    @property
+    def stats(self) -> dict:
+        """Counters of the cache usage."""
+        return {
+            'generation': self.generation,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+# ----------------------------------------------------------------------
+def generation_cached(fn: Callable) -> Callable:
+    """Decorator to memoize a method in the `_cache` of the instance."""
+
+    @wraps(fn)
+    def wrap(self):
+        return self._cache.get(fn.__name__, lambda: fn(self))
+
+    return wrap
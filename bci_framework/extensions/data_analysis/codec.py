@@ -0,0 +1,259 @@
+"""
+=====
+Codec
+=====
+
+Binary wire format for the `eeg` and `aux` Kafka topics.
+
+Each package is a small fixed header, the serialized `context` and a raw
+little-endian block with the channels data:
+
+=========  ==========  ================================================
+Field      Type        Description
+=========  ==========  ================================================
+magic      4 bytes     `BCIF`
+version    uint8       Format version.
+codec      uint8       0: none, 1: lz4, 2: zstd.
+dtype      uint8       0: float32, 1: float64, 2: int24.
+context    uint8       Format of the context, 0: JSON, 1: pickle.
+channels   uint16
+samples    uint32
+scale      float64     Units per count, only used by `int24`.
+length     uint32      Length of the context.
+=========  ==========  ================================================
+
+The context is pickled, so any value, e.g. arrays, `datetime` or dictionaries
+with integer keys, is recovered with the same type, the JSON format is only
+decoded for packages of previous producers. The data is decoded as a writable
+array, like the pickled packages, with `writable=False` uncompressed floats
+are decoded without copy with `np.frombuffer`. Any other message, or packages
+produced by other tools, use `pickle`, and the decoder detects the format
+automatically, so producers and consumers can be migrated independently.
+
+The codec used by the producers is selected with the environ variable
+`BCISTREAM_CODEC` (`none`, `lz4`, `zstd` or `pickle`).
+"""
+
+import os
+import json
+import struct
+import pickle
+import logging
+from typing import Any, Callable, List, Literal, Optional
+
+import numpy as np
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MAGIC = b'BCIF'
+VERSION = 1
+HEADER = struct.Struct('<4sBBBBHIdI')
+
+CODECS = {'none': 0, 'lz4': 1, 'zstd': 2}
+DTYPES = {'float32': 0, 'float64': 1, 'int24': 2}
+FLOATS = {'float32': '<f4', 'float64': '<f8'}
+CONTEXTS = {'json': 0, 'pickle': 1}
+
+CODEC = Literal['none', 'lz4', 'zstd', 'pickle']
+DTYPE = Literal['float32', 'float64', 'int24']
+
+
+# ----------------------------------------------------------------------
+def available_codecs() -> List[str]:
+    """Codecs that can be used in this environment."""
+    codecs = ['pickle', 'none']
+    if lz4:
+        codecs.append('lz4')
+    if zstandard:
+        codecs.append('zstd')
+    return codecs
+
+
+# ----------------------------------------------------------------------
+def negotiate(codec: Optional[CODEC] = None) -> CODEC:
+    """Select the codec to use.
+
+    If `codec` is not defined the environ variable `BCISTREAM_CODEC` is
+    used, if the codec is not available `none` is used instead.
+    """
+    if codec is None:
+        codec = os.environ.get('BCISTREAM_CODEC', 'none').strip('"')
+
+    if codec not in available_codecs():
+        logging.warning(f'Codec {codec!r} not available, using "none"')
+        codec = 'none'
+    return codec
+
+
+# ----------------------------------------------------------------------
+def _encode_int24(data: np.ndarray, scale: float) -> bytes:
+    """Pack the data as little-endian 24 bits integers."""
+    counts = np.clip(
+        np.round(data / scale), -(2**23), 2**23 - 1
+    ).astype('<i4')
+    counts = counts.view(np.uint8).reshape(counts.shape + (4,))
+    return counts[..., :3].tobytes()
+
+
+# ----------------------------------------------------------------------
+def _decode_int24(buffer: bytes, shape: tuple, scale: float) -> np.ndarray:
+    """Unpack little-endian 24 bits integers."""
+    raw = np.frombuffer(buffer, dtype=np.uint8).reshape(shape + (3,))
+    counts = np.zeros(shape + (4,), dtype=np.uint8)
+    counts[..., :3] = raw
+    counts[..., 3] = np.where(raw[..., 2] & 0x80, 0xFF, 0)
+    return counts.view('<i4')[..., 0] * scale
+
+
+# ----------------------------------------------------------------------
+def encode(
+    value: Any,
+    codec: Optional[CODEC] = 'none',
+    dtype: Optional[DTYPE] = 'float32',
+    scale: Optional[float] = 0.02235,
+) -> bytes:
+    """Serialize a Kafka message.
+
+    Packages with the shape `{'context': dict, 'data': array}` are encoded
+    with the binary format, any other value with `pickle`.
+
+    Parameters
+    ----------
+    value
+        The message.
+    codec
+        Compression for the data block, or `pickle` to disable the binary
+        format.
+    dtype
+        Data type of the channels block.
+    scale
+        Units per count for `int24`, by default the microvolts per count of
+        the Cyton board with gain 24.
+
+    Returns
+    -------
+    bytes
+        The serialized message.
+    """
+    if (
+        codec == 'pickle'
+        or not isinstance(value, dict)
+        or set(value) != {'context', 'data'}
+        or not isinstance(value['data'], np.ndarray)
+        or value['data'].ndim != 2
+    ):
+        return pickle.dumps(value)
+
+    data = value['data']
+    channels, samples = data.shape
+
+    if dtype == 'int24':
+        block = _encode_int24(data, scale)
+    else:
+        block = np.ascontiguousarray(data, dtype=FLOATS[dtype]).tobytes()
+
+    if codec == 'lz4':
+        block = lz4.frame.compress(block)
+    elif codec == 'zstd':
+        block = zstandard.ZstdCompressor().compress(block)
+
+    context = pickle.dumps(value['context'], protocol=pickle.HIGHEST_PROTOCOL)
+    # Align the data block to 8 bytes, the padding is ignored by `pickle`
+    context += b'\0' * (-(HEADER.size + len(context)) % 8)
+
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        CODECS[codec],
+        DTYPES[dtype],
+        CONTEXTS['pickle'],
+        channels,
+        samples,
+        scale,
+        len(context),
+    )
+    return b''.join([header, context, block])
+
+
+# ----------------------------------------------------------------------
+def decode(message: bytes, writable: Optional[bool] = True) -> Any:
+    """Deserialize a Kafka message, binary packages or `pickle`.
+
+    Parameters
+    ----------
+    message
+        The serialized message.
+    writable
+        If `False`, uncompressed `float` packages are returned as read-only
+        arrays that share the memory with the message, without copy.
+    """
+    if message[:4] != MAGIC:
+        return pickle.loads(message)
+
+    (
+        _,
+        version,
+        codec,
+        dtype,
+        context_format,
+        channels,
+        samples,
+        scale,
+        context_length,
+    ) = HEADER.unpack_from(message)
+
+    if version > VERSION:
+        raise ValueError(f'Unsupported binary package version: {version}')
+
+    offset = HEADER.size
+    context = message[offset : offset + context_length]
+    if context_format == CONTEXTS['pickle']:
+        context = pickle.loads(context)
+    else:
+        context = json.loads(context)
+    offset += context_length
+
+    block = memoryview(message)[offset:]
+    if codec == CODECS['lz4']:
+        block = lz4.frame.decompress(block)
+    elif codec == CODECS['zstd']:
+        block = zstandard.ZstdDecompressor().decompress(block)
+
+    if dtype == DTYPES['int24']:
+        data = _decode_int24(block, (channels, samples), scale)
+    else:
+        dtype = FLOATS['float32' if dtype == DTYPES['float32'] else 'float64']
+        data = np.frombuffer(block, dtype=dtype).reshape(channels, samples)
+        if writable:
+            data = data.copy()
+
+    return {'context': context, 'data': data}
+
+
+# ----------------------------------------------------------------------
+def serializer(
+    codec: Optional[CODEC] = None, dtype: Optional[DTYPE] = 'float32'
+) -> Callable[[Any], bytes]:
+    """Create a `value_serializer` for `KafkaProducer`.
+
+    Parameters
+    ----------
+    codec
+        Compression for the data block, see `negotiate`.
+    dtype
+        Data type of the channels block.
+    """
+    codec = negotiate(codec)
+
+    def serialize(value: Any) -> bytes:
+        return encode(value, codec=codec, dtype=dtype)
+
+    return serialize
@@ -1,13 +1,18 @@
-import pickle
 import logging
 import json
-from typing import Optional
+from typing import List, Optional
 
 import numpy as np
 from kafka import KafkaProducer
 from openbci_stream.utils import interpolate_datetime
 
 from bci_framework.extensions import properties as prop
+from .ring_buffer import RingBuffer, RingMask
+from .filters import StreamingFilter
+from .cache import GenerationCache, generation_cached
+from .codec import serializer
+from .transformers import center, _safe_divide
+from .instrumentation import get_instrumentation
 
 # from .utils import loop_consumer, fake_loop_consumer, thread_this, subprocess_this, marker_slice
 
@@ -44,22 +49,16 @@ class Transformers:
             Centralized array.
         """
 
-        cent = np.nan_to_num(
-            np.apply_along_axis(lambda x_: x_ - x_.mean(), 1, x)
-        )
+        cent = center(x)
 
         if normalize:
             if normalize == True:
                 normalize = 1
-            return np.nan_to_num(
-                np.apply_along_axis(
-                    lambda x_: normalize * (x_ / (x_.max() - x_.min())),
-                    1,
-                    cent,
-                )
-            )
+            # Scaled by the peak to peak amplitude, zero for flat channels
+            ptp = np.ptp(cent, axis=1, keepdims=True)
+            _safe_divide(cent, ptp / normalize)
 
-        return cent
+        return np.nan_to_num(cent, copy=False)
 
 
 ########################################################################
@@ -80,6 +79,7 @@ class Feedback:
         kwargs['mode'] = 'analysis2stimuli'
         kwargs['name'] = self.name
         self.main.generic_produser('feedback', kwargs)
+        get_instrumentation().feedback()
 
     # ----------------------------------------------------------------------
     def on_feedback(self, fn):
@@ -91,6 +91,12 @@ class Feedback:
 class DataAnalysis:
     """"""
 
+    # The derived buffers, like `buffer_eeg`, are calculated once per package
+    # and each read returns a writable copy, if `True` the same read-only
+    # array is returned to all the readers without copy, and the windows of
+    # `loop_consumer` are read-only views valid only during the call
+    readonly_buffers = False
+
     # ----------------------------------------------------------------------
     def __init__(self, enable_produser=False):
         """"""
@@ -102,6 +108,7 @@ class DataAnalysis:
         self.transformers_aux_ = {}
         self._feedback = False
         self._package_size = None
+        self._cache = GenerationCache()
 
     # ----------------------------------------------------------------------
     def _enable_commands(self):
@@ -109,8 +116,7 @@ class DataAnalysis:
         try:
             self.kafka_producer = KafkaProducer(
                 bootstrap_servers=[f'{prop.HOST}:9092'],
-                compression_type='gzip',
-                value_serializer=pickle.dumps,
+                value_serializer=serializer(),
             )
         except:
             logging.error('Commands: Kafka not available!')
@@ -193,36 +199,26 @@ class DataAnalysis:
             The new AUX array
         """
 
+        self._cache.bump()
+
         if not eeg is None:
 
             c = eeg.shape[1]
+            self._ring_eeg.write(eeg)
+            self._filter_package(eeg)
 
-            self.buffer_eeg_ = np.roll(self.buffer_eeg_, -c, axis=1)
-            self.buffer_eeg_[:, -c:] = eeg
-
-            self.buffer_timestamp_ = np.roll(
-                self.buffer_timestamp_, -c, axis=0
-            )
-            self.buffer_timestamp_[-c:] = np.zeros(eeg.shape[1])
-            self.buffer_timestamp_[-1] = timestamp
-
-            if hasattr(self, 'buffer_eeg_split'):
-                self.buffer_eeg_split = np.roll(self.buffer_eeg_split, -c)
+            t = np.zeros(c)
+            t[-1] = timestamp
+            self._ring_timestamp.write(t)
 
         if not aux is None:
 
             d = aux.shape[1]
-            self.buffer_aux_ = np.roll(self.buffer_aux_, -d, axis=1)
-            self.buffer_aux_[:, -d:] = aux
+            self._ring_aux.write(aux)
 
-            self.buffer_aux_timestamp_ = np.roll(
-                self.buffer_aux_timestamp_, -d, axis=0
-            )
-            self.buffer_aux_timestamp_[-d:] = np.zeros(aux.shape[1])
-            self.buffer_aux_timestamp_[-1] = timestamp
-
-            if hasattr(self, 'buffer_aux_split'):
-                self.buffer_aux_split = np.roll(self.buffer_aux_split, -d)
+            t = np.zeros(d)
+            t[-1] = timestamp
+            self._ring_aux_timestamp.write(t)
 
     # ----------------------------------------------------------------------
     def _get_factor_near_to(self, x: int, n: Optional[int] = 1000) -> int:
@@ -254,17 +250,19 @@ class DataAnalysis:
     ) -> np.ndarray:
         """"""
         f = self._get_factor_near_to(x, resampling)
-        self.buffer_eeg_split = np.zeros(int(x))
+        split = np.zeros(int(x))
         index = np.linspace(0, x, f + 1).astype(int)[:-1]
-        self.buffer_eeg_split[index] = 1
+        split[index] = 1
+        self._eeg_split = RingMask(split, self._ring_eeg)
 
         if prop.CONNECTION == 'wifi' and prop.DAISY:
             x = x * 2
 
         f = self._get_factor_near_to(x, resampling)
-        self.buffer_aux_split = np.zeros(x)
+        split = np.zeros(x)
         index = np.linspace(0, x, f + 1).astype(int)[:-1]
-        self.buffer_aux_split[index] = 1
+        split[index] = 1
+        self._aux_split = RingMask(split, self._ring_aux)
 
     # ----------------------------------------------------------------------
     def create_buffer(
@@ -280,6 +278,9 @@ class DataAnalysis:
         Since the `loop_consumer` iterator only return the last data package, the
         object `buffer_eeg` and `buffer_aux` will retain a old data.
 
+        The buffers are circular, each new package is written in place and
+        the chronological arrays are only materialized when are readed.
+
         Parameters
         ----------
         seconds
@@ -295,10 +296,10 @@ class DataAnalysis:
         chs = len(prop.CHANNELS)
         time = int(prop.SAMPLE_RATE * seconds)
 
-        self._create_resampled_buffer(abs(time), resampling=resampling)
-
-        self.buffer_eeg_ = np.empty((chs, time))
-        self.buffer_timestamp_ = np.zeros(time)
+        self._ring_eeg = RingBuffer((chs, time), fill=fill)
+        self._ring_timestamp = RingBuffer(time)
+        self._filters_dirty = True
+        self._cache.bump()
 
         aux_mode = prop.BOARDMODE
         aux_mode = aux_mode.lower()
@@ -315,26 +316,72 @@ class DataAnalysis:
             aux_shape = 3
 
         if prop.CONNECTION == 'wifi' and prop.DAISY:
-            self.buffer_aux_ = np.empty((aux_shape, time * 2))
-            self.buffer_aux_timestamp_ = np.zeros(time * 2)
+            self._ring_aux = RingBuffer((aux_shape, time * 2), fill=fill)
+            self._ring_aux_timestamp = RingBuffer(time * 2)
         else:
-            self.buffer_aux_ = np.empty((aux_shape, time))
-            self.buffer_aux_timestamp_ = np.zeros(time)
+            self._ring_aux = RingBuffer((aux_shape, time), fill=fill)
+            self._ring_aux_timestamp = RingBuffer(time)
+
+        self._create_resampled_buffer(abs(time), resampling=resampling)
 
-        self.buffer_eeg_.fill(fill)
-        self.buffer_aux_.fill(fill)
-        # self.buffer_aux_timestamp_ = np.zeros(time)
+    # ----------------------------------------------------------------------
+    def _streaming_filters(self) -> List[StreamingFilter]:
+        """The transformers that can be applied package by package."""
+        return [
+            tr
+            for tr in self.transformers_.values()
+            if isinstance(tr, StreamingFilter)
+        ]
+
+    # ----------------------------------------------------------------------
+    def _filter_package(self, eeg: np.ndarray) -> None:
+        """Apply the streaming filters to the new package only.
+
+        The output is written in a parallel ring buffer, if the transformers
+        were changed, the buffer will be filtered again on the next read.
+        """
+        if self._filters_dirty:
+            return
+
+        filters = self._streaming_filters()
+        if not filters:
+            return
+
+        for tr in filters:
+            eeg = tr(eeg)
+        self._ring_eeg_filtered.write(eeg)
+
+    # ----------------------------------------------------------------------
+    def _warm_up_filters(self) -> None:
+        """Filter the complete raw buffer with fresh filter states."""
+        eeg = self._ring_eeg.view()
+        for tr in self._streaming_filters():
+            tr.reset()
+            eeg = tr(eeg)
+
+        self._ring_eeg_filtered = RingBuffer(self._ring_eeg.shape)
+        self._ring_eeg_filtered.write(eeg)
+        self._filters_dirty = False
 
     # ----------------------------------------------------------------------
     def set_transformers(self, transformers):
         """"""
         self.transformers_ = transformers
+        self._filters_dirty = True
+        self._cache.bump()
 
     # ----------------------------------------------------------------------
     def add_transformers(self, transformers):
-        """"""
+        """Add or replace transformers.
+
+        A transformer can be a `StreamingFilter`, that is applied only to the
+        new packages, or a tuple `(function, kwargs)` that is applied to the
+        complete buffer on every read.
+        """
         for name in transformers:
             self.transformers_[name] = transformers[name]
+        self._filters_dirty = True
+        self._cache.bump()
 
     # ----------------------------------------------------------------------
     def remove_transformers(self, transformers):
@@ -342,75 +389,151 @@ class DataAnalysis:
         for tr in transformers:
             if tr in self.transformers_:
                 self.transformers_.pop(tr)
+        self._filters_dirty = True
+        self._cache.bump()
 
     # ----------------------------------------------------------------------
     def clear_transformers(self):
         """"""
         self.transformers_ = {}
+        self._filters_dirty = True
+        self._cache.bump()
 
     # ----------------------------------------------------------------------
     def set_transformers_aux(self, transformers):
         """"""
         self.transformers_aux_ = transformers
+        self._cache.bump()
 
     # ----------------------------------------------------------------------
     def add_transformes_aux(self, transformers):
         """"""
         self.transformers_aux_.extend(transformers)
+        self._cache.bump()
 
     # ----------------------------------------------------------------------
     def clear_transformers_aux(self):
         """"""
         self.transformers_aux_ = []
+        self._cache.bump()
 
     # ----------------------------------------------------------------------
     @property
-    def buffer_eeg(self):
+    def buffer_eeg_(self) -> np.ndarray:
+        """Read-only view of the raw EEG buffer, without copy."""
+        return self._ring_eeg.view()
+
+    # ----------------------------------------------------------------------
+    @property
+    def buffer_aux_(self) -> np.ndarray:
+        """Read-only view of the raw AUX buffer, without copy."""
+        return self._ring_aux.view()
+
+    # ----------------------------------------------------------------------
+    @property
+    def buffer_timestamp_(self) -> np.ndarray:
+        """Read-only view of the raw EEG timestamps, without copy."""
+        return self._ring_timestamp.view()
+
+    # ----------------------------------------------------------------------
+    @property
+    def buffer_aux_timestamp_(self) -> np.ndarray:
+        """Read-only view of the raw AUX timestamps, without copy."""
+        return self._ring_aux_timestamp.view()
+
+    # ----------------------------------------------------------------------
+    @property
+    def buffer_eeg_split(self) -> np.ndarray:
         """"""
-        eeg = self.buffer_eeg_.copy()
-        for tr in self.transformers_.copy():
-            kwargs = self.transformers_[tr][1]
-            eeg = self.transformers_[tr][0](eeg, **kwargs)
-        return eeg
+        return self._eeg_split.view()
 
     # ----------------------------------------------------------------------
     @property
-    def buffer_aux(self):
+    def buffer_aux_split(self) -> np.ndarray:
         """"""
-        aux = self.buffer_aux_.copy()
+        return self._aux_split.view()
+
+    # ----------------------------------------------------------------------
+    def _buffer(self, value: np.ndarray) -> np.ndarray:
+        """Writable copy of a derived buffer, or the shared read-only array
+        if `readonly_buffers` is enabled."""
+        if self.readonly_buffers or not isinstance(value, np.ndarray):
+            return value
+        return value.copy()
+
+    # ----------------------------------------------------------------------
+    @property
+    @generation_cached
+    def _buffer_eeg(self) -> np.ndarray:
+        """EEG buffer with the transformers applied, shared by all the
+        readers of the current package.
+
+        Streaming filters are read from a pre-filtered buffer, so if there is
+        no other kind of transformer the ring is returned without copy.
+        """
+        if self._streaming_filters():
+            if self._filters_dirty:
+                self._warm_up_filters()
+            eeg = self._ring_eeg_filtered.view()
+        else:
+            eeg = self.buffer_eeg_
+
+        transformers = [
+            tr
+            for tr in self.transformers_.copy().values()
+            if not isinstance(tr, StreamingFilter)
+        ]
+        if transformers:
+            eeg = eeg.copy()
+        for fn, kwargs in transformers:
+            eeg = fn(eeg, **kwargs)
+        return eeg
+
+    # ----------------------------------------------------------------------
+    @property
+    @generation_cached
+    def _buffer_aux(self) -> np.ndarray:
+        """AUX buffer with the transformers applied, shared by all the
+        readers of the current package."""
+        aux = self.buffer_aux_
+        if self.transformers_aux_:
+            aux = aux.copy()
         for tr in self.transformers_aux_:
             aux = tr(aux)
         return aux
 
     # ----------------------------------------------------------------------
     @property
-    def buffer_eeg_resampled(self):
-        """"""
-        return self.buffer_eeg[:, np.argwhere(self.buffer_eeg_split == 1)][
-            :, :, 0
-        ]
+    @generation_cached
+    def _eeg_split_index(self) -> np.ndarray:
+        """Indexes of the EEG samples used for resampling."""
+        return np.flatnonzero(self.buffer_eeg_split == 1)
+
+    # ----------------------------------------------------------------------
+    @property
+    @generation_cached
+    def _aux_split_index(self) -> np.ndarray:
+        """Indexes of the AUX samples used for resampling."""
+        return np.flatnonzero(self.buffer_aux_split == 1)
 
     # ----------------------------------------------------------------------
     @property
-    def buffer_aux_resampled(self):
+    @generation_cached
+    def _buffer_eeg_resampled(self) -> np.ndarray:
         """"""
-        return self.buffer_aux[:, np.argwhere(self.buffer_aux_split == 1)][
-            :, :, 0
-        ]
+        return self._buffer_eeg[:, self._eeg_split_index]
 
     # ----------------------------------------------------------------------
     @property
-    def buffer_timestamp_resampled(self):
+    @generation_cached
+    def _buffer_aux_resampled(self) -> np.ndarray:
         """"""
-        t = self.buffer_timestamp
-        if t.shape[0]:
-            return t[np.argwhere(self.buffer_eeg_split == 1)][:, 0]
-        else:
-            return np.array([])
+        return self._buffer_aux[:, self._aux_split_index]
 
     # ----------------------------------------------------------------------
     @property
-    def buffer_timestamp(self):
+    @generation_cached
+    def _buffer_timestamp(self) -> np.ndarray:
         """"""
         try:
             return interpolate_datetime(self.buffer_timestamp_)
@@ -419,13 +542,106 @@ class DataAnalysis:
 
     # ----------------------------------------------------------------------
     @property
-    def buffer_aux_timestamp(self):
+    @generation_cached
+    def _buffer_aux_timestamp(self) -> np.ndarray:
         """"""
         try:
             return interpolate_datetime(self.buffer_aux_timestamp_)
         except:
             return self.buffer_aux_timestamp_
 
+    # ----------------------------------------------------------------------
+    @property
+    @generation_cached
+    def _buffer_timestamp_resampled(self) -> np.ndarray:
+        """"""
+        t = self._buffer_timestamp
+        if t.shape[0]:
+            return t[self._eeg_split_index]
+        else:
+            return np.array([])
+
+    # ----------------------------------------------------------------------
+    @property
+    def buffer_eeg(self) -> np.ndarray:
+        """EEG buffer with the transformers applied.
+
+        The transformers are applied once per package, each read returns a
+        writable copy, see `readonly_buffers`.
+        """
+        return self._buffer(self._buffer_eeg)
+
+    # ----------------------------------------------------------------------
+    @property
+    def buffer_aux(self) -> np.ndarray:
+        """AUX buffer with the transformers applied.
+
+        The transformers are applied once per package, each read returns a
+        writable copy, see `readonly_buffers`.
+        """
+        return self._buffer(self._buffer_aux)
+
+    # ----------------------------------------------------------------------
+    @property
+    def buffer_eeg_resampled(self) -> np.ndarray:
+        """"""
+        return self._buffer(self._buffer_eeg_resampled)
+
+    # ----------------------------------------------------------------------
+    @property
+    def buffer_aux_resampled(self) -> np.ndarray:
+        """"""
+        return self._buffer(self._buffer_aux_resampled)
+
+    # ----------------------------------------------------------------------
+    @property
+    def buffer_timestamp_resampled(self) -> np.ndarray:
+        """"""
+        return self._buffer(self._buffer_timestamp_resampled)
+
+    # ----------------------------------------------------------------------
+    @property
+    def buffer_timestamp(self) -> np.ndarray:
+        """"""
+        return self._buffer(self._buffer_timestamp)
+
+    # ----------------------------------------------------------------------
+    @property
+    def buffer_aux_timestamp(self) -> np.ndarray:
+        """"""
+        return self._buffer(self._buffer_aux_timestamp)
+
+    # ----------------------------------------------------------------------
+    @property
+    def cache_stats(self) -> dict:
+        """Hits and misses of the derived buffers cache.
+
+        The derived buffers are calculated at most once per package.
+        """
+        return self._cache.stats
+
+    # ----------------------------------------------------------------------
+    @property
+    def backpressure_stats(self) -> dict:
+        """Packages dropped and calls skipped by each `loop_consumer`."""
+        return {
+            name: {
+                'policy': consumer.policy,
+                'dropped': consumer.dropped,
+                'skipped': consumer.skipped,
+            }
+            for name, consumer in getattr(self, '_backpressure', {}).items()
+        }
+
+    # ----------------------------------------------------------------------
+    @property
+    def join_stats(self) -> dict:
+        """Counters of the `eeg` and `aux` join of each `loop_consumer`."""
+        return {
+            name: joiner.stats
+            for name, joiner in getattr(self, '_join', {}).items()
+        }
+
     # ----------------------------------------------------------------------
     def set_package_size(self, value):
         """"""
@@ -0,0 +1,347 @@
+"""
+======
+Epochs
+======
+
+Extraction of epochs around markers using sample indexes.
+
+Each stream keeps a short history of anchors, the absolute index of the last
+sample of each package and its acquisition time. A marker is located in a
+stream with `np.searchsorted` over the anchors, and its epoch is ready as
+soon as the last sample of the window was written in the buffer, then all
+the ready epochs are sliced in a single pass.
+
+The epochs can be delivered one by one or accumulated with `EpochBatch`,
+since most classifiers are much faster with batches.
+"""
+
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .ring_buffer import RingBuffer
+
+
+########################################################################
+class SampleClock:
+    """Map acquisition times to absolute sample indexes of a stream.
+
+    Parameters
+    ----------
+    sample_rate
+        Samples per second of the stream.
+    anchors
+        Number of packages retained to locate the times.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, sample_rate: float, anchors: Optional[int] = 1024):
+        """"""
+        self.sample_rate = sample_rate
+        self.written = 0
+        self._index = RingBuffer(anchors, dtype=np.int64)
+        self._time = RingBuffer(anchors)
+        self._count = 0
+
+    # ----------------------------------------------------------------------
+    def push(self, written: int, timestamp: float) -> None:
+        """Register a new package.
+
+        Parameters
+        ----------
+        written
+            Total number of samples written after this package.
+        timestamp
+            Acquisition time of the last sample of the package.
+        """
+        if written <= self.written:
+            return
+
+        # Keep the times monotonic even with jitter in the timestamps
+        if self._count:
+            timestamp = max(timestamp, self._time.view(1)[0])
+
+        self.written = written
+        self._index.write(np.array([written - 1]))
+        self._time.write(np.array([timestamp]))
+        self._count = min(self._count + 1, len(self._time))
+
+    # ----------------------------------------------------------------------
+    def index(self, t: np.ndarray) -> np.ndarray:
+        """Absolute sample index for each time in `t`.
+
+        The sample is counted from the first package with a later time,
+        times after the last package are extrapolated. Without packages
+        the index is `-1`.
+        """
+        t = np.asarray(t, dtype=float)
+        if not self._count:
+            return np.full(t.shape, -1, dtype=np.int64)
+
+        times = self._time.view(self._count)
+        index = self._index.view(self._count)
+
+        i = np.minimum(np.searchsorted(times, t), self._count - 1)
+        return index[i] + np.round((t - times[i]) * self.sample_rate).astype(
+            np.int64
+        )
+
+
+########################################################################
+class EpochExtractor:
+    """Queue of markers waiting for their epochs.
+
+    Parameters
+    ----------
+    t0
+        Start of the epoch in seconds, relative to the marker.
+    t1
+        End of the epoch in seconds, relative to the marker.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, t0: float, t1: float):
+        """"""
+        self.t0 = t0
+        self.t1 = t1
+        self.clocks = {}
+        self.lengths = {}
+
+        self._markers = []
+        self._datetimes = []
+
+    # ----------------------------------------------------------------------
+    def add_stream(
+        self, topic: str, sample_rate: float, length: int
+    ) -> None:
+        """Register a stream.
+
+        Parameters
+        ----------
+        topic
+            Name of the stream.
+        sample_rate
+            Samples per second of the stream.
+        length
+            Number of samples retained by the buffer of the stream.
+        """
+        self.clocks[topic] = SampleClock(sample_rate)
+        self.lengths[topic] = length
+
+    # ----------------------------------------------------------------------
+    def window(self, topic: str) -> Tuple[int, int]:
+        """Start and stop of the epochs in samples, relative to the marker."""
+        sample_rate = self.clocks[topic].sample_rate
+        return int(sample_rate * self.t0), int(sample_rate * self.t1)
+
+    # ----------------------------------------------------------------------
+    def push(self, topic: str, written: int, timestamp: float) -> None:
+        """Register a new package of `topic`, see `SampleClock.push`."""
+        self.clocks[topic].push(written, timestamp)
+
+    # ----------------------------------------------------------------------
+    def add_marker(self, marker: str, datetime: float) -> None:
+        """Queue a marker until its epoch is complete."""
+        self._markers.append(marker)
+        self._datetimes.append(datetime)
+
+    # ----------------------------------------------------------------------
+    @property
+    def pending(self) -> int:
+        """Number of markers waiting for data."""
+        return len(self._markers)
+
+    # ----------------------------------------------------------------------
+    @property
+    def oldest(self) -> float:
+        """Datetime of the oldest marker waiting for data."""
+        return min(self._datetimes, default=np.inf)
+
+    # ----------------------------------------------------------------------
+    def pop_ready(
+        self,
+    ) -> Tuple[List[str], np.ndarray, Dict[str, np.ndarray]]:
+        """Remove from the queue the markers with complete epochs.
+
+        The markers with epochs older than the buffers are discarded.
+
+        Returns
+        -------
+        tuple
+            The markers, their datetimes, and for each stream, the absolute
+            index of the marker samples.
+        """
+        if not self._markers:
+            return [], np.array([]), {}
+
+        datetimes = np.array(self._datetimes, dtype=float)
+        ready = np.ones(datetimes.shape, dtype=bool)
+        lost = np.zeros(datetimes.shape, dtype=bool)
+
+        indexes = {}
+        for topic, clock in self.clocks.items():
+            start, stop = self.window(topic)
+            index = clock.index(datetimes)
+            indexes[topic] = index
+            if not clock.written:
+                # No packages of this stream yet
+                ready[:] = False
+                continue
+            ready &= index + stop <= clock.written
+            lost |= index + start < clock.written - self.lengths[topic]
+
+        if lost.any():
+            logging.warning(
+                f'{lost.sum()} markers too old to synchronize, '
+                'increase the buffer length'
+            )
+
+        release = ready & ~lost
+        keep = ~ready & ~lost
+
+        markers = [m for m, r in zip(self._markers, release) if r]
+        self._markers = [m for m, k in zip(self._markers, keep) if k]
+        self._datetimes = datetimes[keep].tolist()
+
+        return (
+            markers,
+            datetimes[release],
+            {topic: index[release] for topic, index in indexes.items()},
+        )
+
+    # ----------------------------------------------------------------------
+    def slice(
+        self, topic: str, array: np.ndarray, written: int, index: np.ndarray
+    ) -> np.ndarray:
+        """Epochs of a buffer, in a single indexing operation.
+
+        Parameters
+        ----------
+        topic
+            Stream of the buffer.
+        array
+            Chronological buffer of shape (`..., time`).
+        written
+            Total samples written to the buffer.
+        index
+            Absolute sample index of each marker, from `pop_ready`.
+
+        Returns
+        -------
+        array
+            Epochs of shape (`n_epochs, ..., samples`).
+        """
+        start, stop = self.window(topic)
+        positions = (
+            index[:, np.newaxis]
+            + np.arange(start, stop)
+            - (written - array.shape[-1])
+        )
+        return np.moveaxis(np.take(array, positions, axis=-1), -2, 0)
+
+
+########################################################################
+class EpochBatch:
+    """Accumulate epochs to deliver them together.
+
+    The batch is flushed when it reaches `size` epochs, when the oldest
+    epoch waited `max_delay` seconds, or at the end of a stimulus block.
+
+    Parameters
+    ----------
+    size
+        Number of epochs of each batch.
+    max_delay
+        Maximum time in seconds that an epoch can wait in the batch.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self, size: Optional[int] = None, max_delay: Optional[float] = None
+    ):
+        """"""
+        self.size = size
+        self.max_delay = max_delay
+        self.block_end = None
+        self._clear()
+
+    # ----------------------------------------------------------------------
+    def _clear(self) -> None:
+        """"""
+        self.markers = []
+        self.datetimes = []
+        self.epochs = {}
+        self.since = None
+
+    # ----------------------------------------------------------------------
+    def __len__(self) -> int:
+        """"""
+        return len(self.markers)
+
+    # ----------------------------------------------------------------------
+    def add(
+        self,
+        markers: List[str],
+        datetimes: np.ndarray,
+        epochs: Dict[str, np.ndarray],
+        now: float,
+    ) -> None:
+        """Append epochs with shape (`n_epochs, ..., samples`)."""
+        if not markers:
+            return
+        if self.since is None:
+            self.since = now
+        self.markers.extend(markers)
+        self.datetimes.append(datetimes)
+        for name, epoch in epochs.items():
+            self.epochs.setdefault(name, []).append(epoch)
+
+    # ----------------------------------------------------------------------
+    def end_block(self, datetime: float) -> None:
+        """Flush after the epochs of the markers before `datetime`."""
+        self.block_end = datetime
+
+    # ----------------------------------------------------------------------
+    def ready(self, now: float, oldest_pending: float) -> bool:
+        """Check if the batch must be flushed.
+
+        Parameters
+        ----------
+        now
+            Current time in seconds.
+        oldest_pending
+            Datetime of the oldest marker still waiting for data.
+        """
+        if self.block_end is not None and oldest_pending > self.block_end:
+            self.block_end = None
+            return bool(self.markers)
+
+        if not self.markers:
+            return False
+        if self.size and len(self.markers) >= self.size:
+            return True
+        if self.max_delay is not None and now - self.since >= self.max_delay:
+            return True
+        return False
+
+    # ----------------------------------------------------------------------
+    def flush(
+        self, now: float
+    ) -> Tuple[List[str], np.ndarray, Dict[str, np.ndarray], float]:
+        """Empty the batch.
+
+        Returns
+        -------
+        tuple
+            The markers, their datetimes, the stacked epochs and the time
+            in seconds the oldest epoch waited in the batch.
+        """
+        markers = self.markers
+        datetimes = np.concatenate(self.datetimes)
+        epochs = {
+            name: np.concatenate(epoch) for name, epoch in self.epochs.items()
+        }
+        waited = now - self.since
+        self._clear()
+        return markers, datetimes, epochs, waited
@@ -0,0 +1,124 @@
+"""
+=================
+Streaming Filters
+=================
+
+Causal filters that keep their own state between packages, in this way only
+the new data must be processed instead of the complete buffer.
+
+These filters can be used as transformers:
+
+```
+self.add_transformers({'bandpass': BandPass(1, 30, fs=prop.SAMPLE_RATE)})
+```
+"""
+
+from typing import Optional
+
+import numpy as np
+from scipy.signal import butter, iirnotch, sosfilt, sosfilt_zi, tf2sos
+
+
+########################################################################
+class StreamingFilter:
+    """Second-order sections IIR filter with persistent state.
+
+    Parameters
+    ----------
+    sos
+        Second-order sections representation of the filter.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, sos: np.ndarray):
+        """"""
+        self.sos = sos
+        self.zi = None
+
+    # ----------------------------------------------------------------------
+    def reset(self) -> None:
+        """Forget the state, the next package will start a new stream."""
+        self.zi = None
+
+    # ----------------------------------------------------------------------
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        """Filter the next package.
+
+        Parameters
+        ----------
+        x
+            Input array of shape (`channels, time`).
+
+        Returns
+        -------
+        array
+            Filtered array with the same shape.
+        """
+        if not x.shape[-1]:
+            return x
+
+        if self.zi is None or self.zi.shape[1:-1] != x.shape[:-1]:
+            # Steady state for the first sample to avoid the initial step
+            zi = sosfilt_zi(self.sos)
+            self.zi = zi.reshape(
+                (zi.shape[0],) + (1,) * (x.ndim - 1) + (2,)
+            ) * x[..., :1].reshape((1,) + x.shape[:-1] + (1,))
+
+        y, self.zi = sosfilt(self.sos, x, axis=-1, zi=self.zi)
+        return y
+
+
+########################################################################
+class BandPass(StreamingFilter):
+    """Butterworth band-pass filter.
+
+    If the high cutoff reach the Nyquist frequency a high-pass filter is
+    used instead.
+
+    Parameters
+    ----------
+    f0
+        Low cutoff frequency.
+    f1
+        High cutoff frequency.
+    fs
+        Sample rate.
+    order
+        Order of the Butterworth filter.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self, f0: float, f1: float, fs: float, order: Optional[int] = 5
+    ):
+        """"""
+        self.f0, self.f1, self.fs = f0, f1, fs
+        if f1 >= fs / 2:
+            sos = butter(order, f0, btype='highpass', fs=fs, output='sos')
+        else:
+            sos = butter(
+                order, [f0, f1], btype='bandpass', fs=fs, output='sos'
+            )
+        super().__init__(sos)
+
+
+########################################################################
+class Notch(StreamingFilter):
+    """Notch filter for power line interference.
+
+    Parameters
+    ----------
+    f0
+        Frequency to remove.
+    fs
+        Sample rate.
+    Q
+        Quality factor.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, f0: float, fs: float, Q: Optional[float] = 30):
+        """"""
+        self.f0, self.fs = f0, fs
+        b, a = iirnotch(f0, Q, fs=fs)
+        super().__init__(tf2sos(b, a))
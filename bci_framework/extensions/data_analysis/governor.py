@@ -0,0 +1,144 @@
+"""
+========
+Governor
+========
+
+Adaptive rate of the callbacks of the visualizations.
+
+The buffers are updated with every package, but the callback, that usually
+renders a frame, is only called at the rate that the extension and the
+viewer can sustain. The interval between calls is the largest of:
+
+  * The interval of the target FPS.
+  * The CPU time of the callback divided by the CPU budget, e.g. a callback
+    of 100 ms with a budget of 0.5 is called at most 5 times per second.
+  * The duration of the callback.
+
+If the viewer has not consumed the previous frame when a new one is due,
+the call is delayed and the interval is increased until the viewer catches
+up, but never longer than `MAX_INTERVAL`, so a viewer that is gone does not
+stop the extension. The governed rate is published with the
+instrumentation, as `target_fps` in the render summary.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from .instrumentation import get_instrumentation
+
+# Smoothing of the measured costs
+ALPHA = 0.2
+# A call is allowed a bit before the interval, for the jitter of the packages
+TOLERANCE = 0.25
+# Calls accumulated while the interval is shorter than the packages period
+BURST = 1.5
+MAX_BACKOFF = 8
+MAX_INTERVAL = 2
+
+
+########################################################################
+class FrameGovernor:
+    """Decide when to call the callback of a visualization.
+
+    Parameters
+    ----------
+    fps
+        Target frames per second.
+    budget
+        Fraction of a CPU that the callbacks can use.
+    pending
+        Function that returns the number of frames produced and not yet
+        consumed by the viewer.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self,
+        fps: Optional[float] = 10,
+        budget: Optional[float] = 0.5,
+        pending: Optional[Callable[[], int]] = None,
+    ):
+        """"""
+        self.target = fps
+        self.budget = budget
+        self.pending = pending
+
+        self.cost = None
+        self.duration = None
+        self.backoff = 1
+        self.calls = 0
+        self.throttled = 0
+
+        self._credit = 1
+        self._checked = None
+        self._called = None
+        self._instrumentation = get_instrumentation()
+
+    # ----------------------------------------------------------------------
+    @property
+    def interval(self) -> float:
+        """Seconds between calls."""
+        interval = 1 / self.target
+        if self.cost is not None:
+            interval = max(interval, self.cost / self.budget, self.duration)
+        return min(interval * self.backoff, MAX_INTERVAL)
+
+    # ----------------------------------------------------------------------
+    @property
+    def fps(self) -> float:
+        """Governed frames per second."""
+        return 1 / self.interval
+
+    # ----------------------------------------------------------------------
+    def ready(self) -> bool:
+        """If the callback must be called for the current package."""
+        now = time.monotonic()
+        if self._checked is not None:
+            self._credit = min(
+                self._credit + (now - self._checked) / self.interval, BURST
+            )
+        self._checked = now
+
+        if self._credit < 1 - TOLERANCE:
+            self.throttled += 1
+            return False
+
+        if (
+            self.pending is not None
+            and self._called is not None
+            and now - self._called < MAX_INTERVAL
+            and self.pending() > 0
+        ):
+            # The viewer is behind
+            self.backoff = min(self.backoff * 1.25, MAX_BACKOFF)
+            self.throttled += 1
+            return False
+
+        self.backoff = max(self.backoff * 0.95, 1)
+        return True
+
+    # ----------------------------------------------------------------------
+    @contextmanager
+    def measure(self):
+        """Measure the cost of a callback."""
+        start = time.monotonic()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            self.record(time.monotonic() - start, time.process_time() - cpu)
+
+    # ----------------------------------------------------------------------
+    def record(self, duration: float, cost: float) -> None:
+        """Update the interval with the duration and CPU time of a call."""
+        if self.cost is None:
+            self.cost, self.duration = cost, duration
+        else:
+            self.cost += ALPHA * (cost - self.cost)
+            self.duration += ALPHA * (duration - self.duration)
+
+        self.calls += 1
+        self._called = time.monotonic()
+        self._credit -= 1
+        self._instrumentation.governed(self.fps, self.throttled)
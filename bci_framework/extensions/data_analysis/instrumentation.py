@@ -0,0 +1,435 @@
+"""
+===============
+Instrumentation
+===============
+
+Per-packet latency along the acquisition, analysis and feedback path.
+
+Each package is stamped when it is acquired (`timestamp.binary`), when the
+consumer dequeue it, before and after the callback of `loop_consumer`, and
+when a feedback is sent with `Feedback.write`. The intervals are aggregated
+in logarithmic histograms, like HDR histograms, with a relative error below
+1%, so the percentiles can be calculated without keep the samples:
+
+=========  ==========================================================
+Stage      Interval
+=========  ==========================================================
+transport  From the acquisition to the dequeue in the consumer.
+queue      From the dequeue to the start of the callback.
+callback   Execution time of the callback.
+total      From the acquisition to the end of the callback.
+feedback   From the acquisition to `Feedback.write`.
+flush      Time the oldest epoch waited in a batch of `marker_slicing`.
+render     Time to render and encode a frame of a visualization.
+=========  ==========================================================
+
+The size of the batches delivered by `marker_slicing` is aggregated in the
+same way, as `batch_size` in the summary, and the packages discarded or not
+delivered to the callbacks by the backpressure policies are counted as
+`dropped` and `skipped`. The visualizations also report the frames per
+second achieved, the frames skipped because nothing changed, and the rate
+selected by the frame governor with the packages not rendered, as `render`.
+
+Every extension publish its histograms each second to a local HTTP endpoint,
+by default `http://localhost:5090/latency` (`BCISTREAM_INSTRUMENTATION_PORT`),
+the same endpoint serves the summary of all the extensions as JSON. The
+endpoint is started by the Visualization environment, or with:
+
+    $ python -m bci_framework.extensions.data_analysis.instrumentation
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+from threading import Thread
+from collections import deque
+from contextlib import contextmanager
+from urllib.request import Request, urlopen
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Optional
+
+STAGES = [
+    'transport',
+    'queue',
+    'callback',
+    'total',
+    'feedback',
+    'flush',
+    'render',
+]
+PERCENTILES = [50, 95, 99]
+
+SUB_BITS = 7
+HALF = 2 ** (SUB_BITS - 1)
+MAX_BITS = 36  # about 19 hours in microseconds
+
+
+# ----------------------------------------------------------------------
+def get_port() -> int:
+    """Port of the instrumentation endpoint."""
+    return int(
+        os.environ.get('BCISTREAM_INSTRUMENTATION_PORT', '5090').strip('"')
+    )
+
+
+########################################################################
+class LatencyHistogram:
+    """Log-linear histogram of latencies.
+
+    Values are recorded in microseconds, exact below 128 µs and with 64
+    sub-buckets for each power of two above it.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """"""
+        self.counts = [0] * (HALF * (MAX_BITS + 2))
+        self.reset()
+
+    # ----------------------------------------------------------------------
+    def reset(self) -> None:
+        """Discard all the recorded values."""
+        self.counts[:] = [0] * len(self.counts)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    # ----------------------------------------------------------------------
+    def _index(self, value: int) -> int:
+        """Bucket of a value in microseconds."""
+        shift = value.bit_length() - SUB_BITS
+        if shift <= 0:
+            return value
+        return min(shift * HALF + (value >> shift), len(self.counts) - 1)
+
+    # ----------------------------------------------------------------------
+    def _value(self, index: int) -> float:
+        """Middle value of a bucket in microseconds."""
+        if index < 2 * HALF:
+            return index
+        shift = index // HALF - 1
+        return ((index - shift * HALF) << shift) + (1 << shift) / 2
+
+    # ----------------------------------------------------------------------
+    def record(self, latency: float) -> None:
+        """Record a latency in milliseconds, negative values are ignored."""
+        value = int(latency * 1000)
+        if value < 0:
+            return
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    # ----------------------------------------------------------------------
+    def percentile(self, p: float) -> float:
+        """Percentile `p` (0-100) in milliseconds."""
+        if not self.count:
+            return 0
+        target = max(1, int(round(self.count * p / 100)))
+        accumulated = 0
+        for index, count in enumerate(self.counts):
+            accumulated += count
+            if accumulated >= target:
+                return min(self._value(index), self.max) / 1000
+        return self.max / 1000
+
+    # ----------------------------------------------------------------------
+    def summary(self) -> dict:
+        """Count, mean, max and percentiles in milliseconds."""
+        summary = {
+            'count': self.count,
+            'mean': self.sum / self.count / 1000 if self.count else 0,
+            'max': self.max / 1000,
+        }
+        for p in PERCENTILES:
+            summary[f'p{p}'] = self.percentile(p)
+        return summary
+
+
+########################################################################
+class Instrumentation:
+    """Latency stamps of the packages processed by an extension.
+
+    Parameters
+    ----------
+    name
+        Name of the extension, by default the folder of the main script.
+    publish
+        Publish the summary each `interval` seconds.
+    interval
+        Seconds between publications.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self,
+        name: Optional[str] = None,
+        publish: Optional[bool] = True,
+        interval: Optional[float] = 1,
+    ):
+        """"""
+        if name is None:
+            name = os.path.basename(
+                os.path.dirname(os.path.abspath(sys.argv[0]))
+            )
+        self.name = name
+        self.interval = interval
+        self.histograms = {stage: LatencyHistogram() for stage in STAGES}
+        self.batch_size = LatencyHistogram()
+        self.dropped = 0
+        self.skipped = 0
+        self.frames_skipped = 0
+        self.frames_throttled = 0
+        self.target_fps = None
+        self._frames = deque(maxlen=64)
+        self.acquired = None
+        self.dequeued = None
+
+        if publish:
+            Thread(target=self._publish, daemon=True).start()
+
+    # ----------------------------------------------------------------------
+    def dequeue(self, acquired: float) -> None:
+        """Stamp a new package.
+
+        Parameters
+        ----------
+        acquired
+            Timestamp of the acquisition in seconds, already corrected
+            with the clock offset.
+        """
+        self.acquired = acquired
+        self.dequeued = time.time()
+        self.histograms['transport'].record(
+            (self.dequeued - acquired) * 1000
+        )
+
+    # ----------------------------------------------------------------------
+    @contextmanager
+    def callback(self):
+        """Stamp the execution of a callback for the current package."""
+        start = time.time()
+        try:
+            yield
+        finally:
+            end = time.time()
+            if self.acquired is not None:
+                self.histograms['queue'].record((start - self.dequeued) * 1000)
+                self.histograms['total'].record((end - self.acquired) * 1000)
+            self.histograms['callback'].record((end - start) * 1000)
+
+    # ----------------------------------------------------------------------
+    def feedback(self) -> None:
+        """Stamp a feedback produced for the current package."""
+        if self.acquired is not None:
+            self.histograms['feedback'].record(
+                (time.time() - self.acquired) * 1000
+            )
+
+    # ----------------------------------------------------------------------
+    def batch(self, size: int, waited: float) -> None:
+        """Stamp the delivery of a batch of epochs.
+
+        Parameters
+        ----------
+        size
+            Number of epochs in the batch.
+        waited
+            Seconds the oldest epoch waited in the batch.
+        """
+        self.histograms['flush'].record(waited * 1000)
+        # The histogram keeps the unit of the recorded values
+        self.batch_size.record(size)
+
+    # ----------------------------------------------------------------------
+    def drop(self) -> None:
+        """Count a package discarded before being processed."""
+        self.dropped += 1
+
+    # ----------------------------------------------------------------------
+    def skip(self, n: Optional[int] = 1) -> None:
+        """Count callback invocations skipped."""
+        self.skipped += n
+
+    # ----------------------------------------------------------------------
+    def frame(self, duration: Optional[float]) -> None:
+        """Stamp a frame of a visualization.
+
+        Parameters
+        ----------
+        duration
+            Seconds to render the frame, `None` for frames skipped.
+        """
+        if duration is None:
+            self.frames_skipped += 1
+            return
+        self._frames.append(time.time())
+        self.histograms['render'].record(duration * 1000)
+
+    # ----------------------------------------------------------------------
+    def governed(self, fps: float, throttled: int) -> None:
+        """Stamp the rate selected by the frame governor.
+
+        Parameters
+        ----------
+        fps
+            Governed frames per second.
+        throttled
+            Packages not rendered by the governor.
+        """
+        self.target_fps = fps
+        self.frames_throttled = throttled
+
+    # ----------------------------------------------------------------------
+    @property
+    def fps(self) -> float:
+        """Frames per second over the last frames."""
+        if len(self._frames) < 2:
+            return 0
+        # Decays when the frames stop
+        elapsed = max(self._frames[-1], time.time() - 1) - self._frames[0]
+        return (len(self._frames) - 1) / elapsed if elapsed > 0 else 0
+
+    # ----------------------------------------------------------------------
+    def render_summary(self) -> dict:
+        """Achieved and governed FPS, frames skipped and throttled, and
+        frame time in milliseconds."""
+        return {
+            'fps': self.fps,
+            'target_fps': self.target_fps,
+            'skipped': self.frames_skipped,
+            'throttled': self.frames_throttled,
+            'frame_time': self.histograms['render'].summary(),
+        }
+
+    # ----------------------------------------------------------------------
+    def summary(self) -> dict:
+        """Percentiles of all the stages."""
+        summary = {
+            'name': self.name,
+            'pid': os.getpid(),
+            'dropped': self.dropped,
+            'skipped': self.skipped,
+            'stages': {
+                stage: histogram.summary()
+                for stage, histogram in self.histograms.items()
+                if histogram.count
+            },
+        }
+        if self.batch_size.count:
+            summary['batch_size'] = self.batch_size.summary()
+        if self._frames or self.frames_skipped:
+            summary['render'] = self.render_summary()
+        return summary
+
+    # ----------------------------------------------------------------------
+    def _publish(self) -> None:
+        """Send the summary to the local endpoint."""
+        url = f'http://localhost:{get_port()}/latency'
+        while True:
+            time.sleep(self.interval)
+            request = Request(
+                url,
+                data=json.dumps(self.summary()).encode(),
+                headers={'Content-Type': 'application/json'},
+                method='POST',
+            )
+            try:
+                urlopen(request, timeout=self.interval).close()
+            except OSError:
+                pass  # the endpoint is not running
+
+
+_instrumentation = None
+
+
+# ----------------------------------------------------------------------
+def get_instrumentation() -> Instrumentation:
+    """The instrumentation of this process."""
+    global _instrumentation
+    if _instrumentation is None:
+        _instrumentation = Instrumentation()
+    return _instrumentation
+
+
+########################################################################
+class LatencyHandler(BaseHTTPRequestHandler):
+    """Collect the summaries and serve them as JSON."""
+
+    # ----------------------------------------------------------------------
+    def do_POST(self) -> None:
+        """"""
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            summary = json.loads(self.rfile.read(length))
+            key = f"{summary['name']}:{summary['pid']}"
+        except (ValueError, KeyError):
+            self.send_response(400)
+            self.end_headers()
+            return
+
+        summary['updated'] = time.time()
+        self.server.summaries[key] = summary
+        self.send_response(204)
+        self.end_headers()
+
+    # ----------------------------------------------------------------------
+    def do_GET(self) -> None:
+        """"""
+        # Forget the extensions that stopped publishing
+        for key, summary in list(self.server.summaries.items()):
+            if time.time() - summary['updated'] > 10:
+                self.server.summaries.pop(key, None)
+
+        body = json.dumps(list(self.server.summaries.values())).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # ----------------------------------------------------------------------
+    def log_message(self, format, *args) -> None:
+        """Silence the requests log."""
+
+
+# ----------------------------------------------------------------------
+def serve(port: Optional[int] = None, block: Optional[bool] = True):
+    """Start the local endpoint.
+
+    Parameters
+    ----------
+    port
+        Port to listen, by default `BCISTREAM_INSTRUMENTATION_PORT`.
+    block
+        If `False` the server runs in a daemon thread and is returned.
+    """
+    server = ThreadingHTTPServer(
+        ('localhost', port or get_port()), LatencyHandler
+    )
+    server.summaries = {}
+    if block:
+        server.serve_forever()
+    else:
+        Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+# ----------------------------------------------------------------------
+def fetch(port: Optional[int] = None) -> List[dict]:
+    """Read the summaries of all the extensions from the local endpoint."""
+    try:
+        with urlopen(
+            f'http://localhost:{port or get_port()}/latency', timeout=1
+        ) as response:
+            return json.loads(response.read())
+    except OSError:
+        logging.warning('Instrumentation endpoint not available')
+        return []
+
+
+if __name__ == '__main__':
+    serve()
@@ -0,0 +1,164 @@
+"""
+====
+Join
+====
+
+Join of the `eeg` and `aux` streams in sample-aligned blocks.
+
+The acquisition produces an `aux` package for each `eeg` package, with the
+same `timestamp.binary`, but they are consumed as independent messages and
+the `aux` packages can have a different number of samples, twice on WiFi
+boards with daisy. The join pairs the packages by timestamp, checks the
+`sample_ids` when available, and resamples the `aux` package to the samples
+of the `eeg` package with the nearest sample, so digital and analog inputs
+keep their levels.
+
+The packages waiting for their pair are limited by `max_pending`, the
+oldest are discarded and counted as unmatched.
+"""
+
+import logging
+from collections import deque
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+Block = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+########################################################################
+class StreamJoin:
+    """Pair `eeg` and `aux` packages.
+
+    Parameters
+    ----------
+    sample_rate
+        Sample rate of the EEG.
+    tolerance
+        Maximum difference in seconds between the timestamps of a pair.
+    max_pending
+        Maximum number of packages waiting for its pair, for each stream.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self,
+        sample_rate: float,
+        tolerance: Optional[float] = 0.01,
+        max_pending: Optional[int] = 32,
+    ):
+        """"""
+        self.sample_rate = sample_rate
+        self.tolerance = tolerance
+        self.pending = {
+            'eeg': deque(maxlen=max_pending),
+            'aux': deque(maxlen=max_pending),
+        }
+
+        self.joined = 0
+        self.unmatched = 0
+        self.misaligned = 0
+        self.resampled = 0
+        self.max_skew = 0
+
+    # ----------------------------------------------------------------------
+    @property
+    def stats(self) -> dict:
+        """Counters of the join, `max_skew` in milliseconds."""
+        return {
+            'joined': self.joined,
+            'unmatched': self.unmatched,
+            'misaligned': self.misaligned,
+            'resampled': self.resampled,
+            'max_skew': self.max_skew * 1000,
+        }
+
+    # ----------------------------------------------------------------------
+    def push(
+        self, topic: str, data: np.ndarray, context: dict, timestamp: float
+    ) -> Iterator[Block]:
+        """Add a package and iterate over the completed blocks.
+
+        Parameters
+        ----------
+        topic
+            `eeg` or `aux`.
+        data
+            Array of shape (`channels, time`).
+        context
+            Context of the package, for the `sample_ids`.
+        timestamp
+            Acquisition time of the package, already corrected with the
+            clock offset.
+
+        Yields
+        ------
+        tuple
+            The `eeg` of shape (`channels, time`), the `aux` of shape
+            (`aux_channels, time`) and the timestamps of shape (`time`).
+        """
+        other = 'aux' if topic == 'eeg' else 'eeg'
+        package = (timestamp, data, context.get('sample_ids'))
+
+        # Packages of the other stream without pair are lost
+        while (
+            self.pending[other]
+            and self.pending[other][0][0] < timestamp - self.tolerance
+        ):
+            self.pending[other].popleft()
+            self._unmatched(other)
+
+        if (
+            self.pending[other]
+            and abs(self.pending[other][0][0] - timestamp) <= self.tolerance
+        ):
+            pair = self.pending[other].popleft()
+            if topic == 'eeg':
+                yield self._join(package, pair)
+            else:
+                yield self._join(pair, package)
+            return
+
+        if len(self.pending[topic]) == self.pending[topic].maxlen:
+            self._unmatched(topic)
+        self.pending[topic].append(package)
+
+    # ----------------------------------------------------------------------
+    def _unmatched(self, topic: str) -> None:
+        """"""
+        self.unmatched += 1
+        if self.unmatched == 1 or not self.unmatched % 100:
+            logging.warning(
+                f'{self.unmatched} packages without pair, last from {topic!r}'
+            )
+
+    # ----------------------------------------------------------------------
+    def _join(self, eeg_package: tuple, aux_package: tuple) -> Block:
+        """Align a pair of packages."""
+        t_eeg, eeg, eeg_ids = eeg_package
+        t_aux, aux, aux_ids = aux_package
+
+        self.joined += 1
+        self.max_skew = max(self.max_skew, abs(t_eeg - t_aux))
+
+        n = eeg.shape[1]
+        if aux.shape[1] != n:
+            self.resampled += 1
+            index = np.round(np.linspace(0, aux.shape[1] - 1, n)).astype(int)
+            aux = aux[:, index]
+            if aux_ids is not None:
+                aux_ids = np.asarray(aux_ids)[..., index]
+
+        if eeg_ids is not None and aux_ids is not None:
+            eeg_ids = np.asarray(eeg_ids)
+            aux_ids = np.asarray(aux_ids)
+            if eeg_ids.shape == aux_ids.shape and (eeg_ids != aux_ids).any():
+                self.misaligned += 1
+                if self.misaligned == 1 or not self.misaligned % 100:
+                    logging.warning(
+                        f'{self.misaligned} packages with misaligned sample ids'
+                    )
+
+        # The timestamp is the one of the last sample
+        timestamps = t_eeg - np.arange(n)[::-1] / self.sample_rate
+        return eeg, aux, timestamps
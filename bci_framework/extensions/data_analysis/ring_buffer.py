@@ -0,0 +1,227 @@
+"""
+===========
+Ring Buffer
+===========
+
+Circular buffers used to retain the last seconds of streamed data.
+
+The samples are written twice, once in each half of an array with the double
+of the requested length, in this way the last `N` samples are always
+contiguous in memory and can be returned as a view, without `np.roll` or
+any other full copy of the buffer on every new package.
+"""
+
+from typing import Iterator, Optional, Tuple, Union
+
+import numpy as np
+
+
+########################################################################
+class RingBuffer:
+    """Fixed length circular buffer over the last axis.
+
+    Parameters
+    ----------
+    shape
+        Shape of the chronological buffer, the last axis is the time, e.g.
+        (`channels, time`) or (`time`, ).
+    fill
+        Initialize buffer with this value.
+    dtype
+        Data type of the buffer.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self,
+        shape: Union[int, Tuple[int, ...]],
+        fill: Optional[float] = 0,
+        dtype: Optional[np.dtype] = np.float64,
+    ):
+        """"""
+        if isinstance(shape, (int, np.integer)):
+            shape = (shape,)
+        shape = tuple(int(s) for s in shape)
+
+        self.shape = shape
+        self.length = shape[-1]
+        self.cursor = 0
+        self.written = 0
+
+        self._data = np.empty(shape[:-1] + (2 * self.length,), dtype=dtype)
+        self._data.fill(fill)
+
+    # ----------------------------------------------------------------------
+    def write(self, data: np.ndarray) -> None:
+        """Append new samples to the buffer.
+
+        The cost of this method is proportional to the size of `data`, not
+        to the length of the buffer.
+
+        Parameters
+        ----------
+        data
+            Array with the same shape of the buffer except for the last axis.
+        """
+        n = self.length
+        c = data.shape[-1]
+        if not c or not n:
+            return
+
+        self.written += c
+        p = self.cursor
+        if c > n:
+            p = (p + c - n) % n
+            data = data[..., -n:]
+            c = n
+
+        end = p + c
+        self._data[..., p:end] = data
+        if end <= n:
+            self._data[..., p + n : end + n] = data
+        else:
+            split = n - p
+            self._data[..., p + n :] = data[..., :split]
+            self._data[..., : end - n] = data[..., split:]
+
+        self.cursor = end % n
+
+    # ----------------------------------------------------------------------
+    def view(self, samples: Optional[int] = None) -> np.ndarray:
+        """Chronological read-only view of the last samples.
+
+        No data is copied, the view will reflect future writes on the
+        overwritten positions, so use `copy` to retain a snapshot.
+
+        Parameters
+        ----------
+        samples
+            Number of most recent samples, all the buffer by default.
+
+        Returns
+        -------
+        array
+            Contiguous array with the oldest sample first.
+        """
+        n = self.length
+        if samples is None or samples > n:
+            samples = n
+        elif samples < 0:
+            samples = 0
+
+        start = self.cursor + n - samples
+        view = self._data[..., start : self.cursor + n]
+        view.flags.writeable = False
+        return view
+
+    # ----------------------------------------------------------------------
+    def copy(self, samples: Optional[int] = None) -> np.ndarray:
+        """Chronological copy of the last samples.
+
+        Parameters
+        ----------
+        samples
+            Number of most recent samples, all the buffer by default.
+        """
+        return self.view(samples).copy()
+
+    # ----------------------------------------------------------------------
+    def __len__(self) -> int:
+        """"""
+        return self.length
+
+
+########################################################################
+class RingMask:
+    """Static mask that follows the write cursor of a `RingBuffer`.
+
+    The resampling masks select the same samples while they move through
+    the buffer, this is equivalent to roll the mask with the data.
+
+    Parameters
+    ----------
+    mask
+        Chronological mask at cursor zero.
+    ring
+        The buffer to follow.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, mask: np.ndarray, ring: RingBuffer):
+        """"""
+        self.ring = ring
+        self._data = np.concatenate([mask, mask])
+        self._data.flags.writeable = False
+
+    # ----------------------------------------------------------------------
+    def view(self) -> np.ndarray:
+        """Chronological view of the mask."""
+        n = self.ring.length
+        return self._data[self.ring.cursor : self.ring.cursor + n]
+
+
+########################################################################
+class WindowAccumulator:
+    """Split a stream of packages in windows with exact sample count.
+
+    The samples are written in a preallocated `RingBuffer`, and each
+    completed window is yielded as a writable copy.
+
+    Parameters
+    ----------
+    window
+        Number of samples of each window.
+    hop
+        Number of samples between the start of consecutive windows, by
+        default is equal to `window` (non overlapped windows). Smaller values
+        produce sliding windows.
+    copy
+        If `False` the windows are yielded as read-only views of the
+        buffer, without copy, valid only until the iteration continues.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self, window: int, hop: Optional[int] = None, copy: bool = True
+    ):
+        """"""
+        if hop is None:
+            hop = window
+        if window <= 0 or hop <= 0:
+            raise ValueError('`window` and `hop` must be positive')
+
+        self.window = int(window)
+        self.hop = int(hop)
+        self.copy = copy
+        self.ring = None
+        self._pending = self.window
+
+    # ----------------------------------------------------------------------
+    def push(self, data: np.ndarray) -> Iterator[np.ndarray]:
+        """Add a new package and iterate over the completed windows.
+
+        Parameters
+        ----------
+        data
+            Array of shape (`channels, time`).
+
+        Yields
+        ------
+        array
+            The windows completed by this package, oldest first.
+        """
+        if self.ring is None or self.ring.shape[:-1] != data.shape[:-1]:
+            self.ring = RingBuffer(data.shape[:-1] + (self.window,))
+            self._pending = self.window
+
+        pos = 0
+        c = data.shape[-1]
+        while pos < c:
+            k = min(c - pos, self._pending)
+            self.ring.write(data[..., pos : pos + k])
+            self._pending -= k
+            pos += k
+
+            if not self._pending:
+                self._pending = self.hop
+                yield self.ring.copy() if self.copy else self.ring.view()
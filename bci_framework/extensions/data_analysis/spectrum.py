@@ -0,0 +1,281 @@
+"""
+========
+Spectrum
+========
+
+Incremental Welch estimator for streamed data.
+
+The spectrum of each segment is calculated only once, when the segment is
+completed by a new package, and kept in a ring with the last `segments`
+spectra, that is also a rolling spectrogram. The mean PSD is updated with
+the new and the discarded segments, so reading it does not depend on the
+length of the analysis window, the median PSD is calculated at most once
+per package.
+
+The windows, scales and frequencies are cached by configuration, so many
+estimators, or the same estimator created again, share them. The results
+are equivalent to `scipy.signal.welch` with `detrend='constant'`.
+"""
+
+from functools import lru_cache
+from typing import Literal, Optional, Tuple
+
+import numpy as np
+from scipy.signal import get_window
+
+from .ring_buffer import RingBuffer, WindowAccumulator
+
+SCALING = Literal['density', 'spectrum']
+AVERAGE = Literal['mean', 'median']
+
+
+# ----------------------------------------------------------------------
+@lru_cache(maxsize=32)
+def _plan(
+    nperseg: int, fs: float, window: str, scaling: SCALING
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Window, scale of each frequency and frequencies of a configuration.
+
+    The arrays are read-only since they are shared.
+    """
+    win = get_window(window, nperseg)
+    if scaling == 'density':
+        scale = 1.0 / (fs * (win**2).sum())
+    else:
+        scale = 1.0 / win.sum() ** 2
+
+    freqs = np.fft.rfftfreq(nperseg, 1 / fs)
+    scales = np.full(freqs.shape, scale)
+    # One-sided spectrum, without DC and Nyquist
+    if nperseg % 2:
+        scales[1:] *= 2
+    else:
+        scales[1:-1] *= 2
+
+    for array in (win, scales, freqs):
+        array.flags.writeable = False
+    return win, scales, freqs
+
+
+# ----------------------------------------------------------------------
+def _median_bias(n: int) -> float:
+    """Bias of the median of `n` chi-squared values, as `scipy.signal`."""
+    ii_2 = 2 * np.arange(1.0, (n - 1) // 2 + 1)
+    return 1 + np.sum(1.0 / (ii_2 + 1) - 1.0 / ii_2)
+
+
+# ----------------------------------------------------------------------
+def segments_psd(
+    segments: np.ndarray,
+    fs: float,
+    window: Optional[str] = 'hann',
+    scaling: Optional[SCALING] = 'density',
+) -> np.ndarray:
+    """Periodogram of each segment.
+
+    Parameters
+    ----------
+    segments
+        Array of shape (`..., nperseg`).
+
+    Returns
+    -------
+    array
+        Array of shape (`..., frequencies`).
+    """
+    win, scales, _ = _plan(segments.shape[-1], fs, window, scaling)
+    segments = segments - segments.mean(axis=-1, keepdims=True)
+    spectrum = np.fft.rfft(segments * win, axis=-1)
+    psd = spectrum.real**2
+    psd += spectrum.imag**2
+    psd *= scales
+    return psd
+
+
+# ----------------------------------------------------------------------
+def welch(
+    x: np.ndarray,
+    fs: float,
+    nperseg: Optional[int] = 256,
+    noverlap: Optional[int] = None,
+    window: Optional[str] = 'hann',
+    scaling: Optional[SCALING] = 'density',
+    average: Optional[AVERAGE] = 'mean',
+    max_segments: Optional[int] = None,
+    batch: Optional[int] = 64,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Welch PSD of a long array, reading it in batches of segments.
+
+    Parameters
+    ----------
+    x
+        Array of shape (`channels, time`), can be a memory map.
+    max_segments
+        Use at most this number of segments, evenly spaced over the array,
+        to bound the cost for long recordings.
+    batch
+        Segments calculated at once.
+
+    Returns
+    -------
+    tuple
+        The frequencies and the PSD of shape (`channels, frequencies`).
+    """
+    noverlap = nperseg // 2 if noverlap is None else noverlap
+    starts = np.arange(0, x.shape[-1] - nperseg + 1, nperseg - noverlap)
+    if max_segments and starts.size > max_segments:
+        starts = starts[
+            np.linspace(0, starts.size - 1, max_segments).astype(int)
+        ]
+
+    psd = []
+    for i in range(0, starts.size, batch):
+        segments = np.stack(
+            [x[..., s : s + nperseg] for s in starts[i : i + batch]], axis=-2
+        )
+        psd.append(segments_psd(segments, fs, window, scaling))
+    psd = np.concatenate(psd, axis=-2)
+
+    if average == 'median':
+        psd = np.median(psd, axis=-2) / _median_bias(psd.shape[-2])
+    else:
+        psd = psd.mean(axis=-2)
+
+    return _plan(nperseg, fs, window, scaling)[2], psd
+
+
+########################################################################
+class StreamingWelch:
+    """Welch PSD and spectrogram updated package by package.
+
+    Parameters
+    ----------
+    channels
+        Number of channels.
+    fs
+        Sample rate.
+    nperseg
+        Samples of each segment.
+    noverlap
+        Samples shared by consecutive segments, by default `nperseg // 2`.
+    segments
+        Number of segments averaged, the analysis window is
+        `nperseg + (segments - 1) * (nperseg - noverlap)` samples.
+    window
+        Window of the segments, any of `scipy.signal.get_window`.
+    scaling
+        `density` for V**2/Hz, `spectrum` for V**2.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self,
+        channels: int,
+        fs: float,
+        nperseg: Optional[int] = 256,
+        noverlap: Optional[int] = None,
+        segments: Optional[int] = 32,
+        window: Optional[str] = 'hann',
+        scaling: Optional[SCALING] = 'density',
+    ):
+        """"""
+        self.fs = fs
+        self.nperseg = nperseg
+        self.noverlap = nperseg // 2 if noverlap is None else noverlap
+        self.window = window
+        self.scaling = scaling
+
+        self.channels = channels
+        self.segments = segments
+
+        self.freqs = _plan(nperseg, fs, window, scaling)[2]
+        self.reset()
+
+    # ----------------------------------------------------------------------
+    def reset(self) -> None:
+        """Discard all the segments, e.g. after changing the filters."""
+        self._accumulator = WindowAccumulator(
+            self.nperseg, self.nperseg - self.noverlap, copy=False
+        )
+        self._ring = RingBuffer(
+            (self.channels, self.freqs.size, self.segments)
+        )
+        self._sum = np.zeros((self.channels, self.freqs.size))
+        self._writes = 0
+        self._median = None
+
+    # ----------------------------------------------------------------------
+    @property
+    def count(self) -> int:
+        """Number of segments in the estimation."""
+        return min(self._ring.written, len(self._ring))
+
+    # ----------------------------------------------------------------------
+    def update(self, data: np.ndarray) -> int:
+        """Add a new package of shape (`channels, time`).
+
+        Returns
+        -------
+        int
+            Number of segments completed by the package.
+        """
+        segments = [
+            segment.copy() for segment in self._accumulator.push(data)
+        ]
+        if not segments:
+            return 0
+
+        # All the segments of the package in a single FFT
+        psd = segments_psd(
+            np.stack(segments, axis=-2), self.fs, self.window, self.scaling
+        )
+        psd = np.moveaxis(psd, -2, -1)
+        new = psd.shape[-1]
+        length = len(self._ring)
+        count = self.count
+        # The oldest segments, overwritten by the new ones
+        discarded = max(0, count + new - length)
+
+        if new >= length or self._writes >= length:
+            self._ring.write(psd)
+            # Recalculated once per turn of the ring to avoid accumulated
+            # rounding errors
+            self._sum = self._ring.view(self.count).sum(axis=-1)
+            self._writes = 0
+        else:
+            if discarded:
+                self._sum -= self._ring.view(count)[..., :discarded].sum(
+                    axis=-1
+                )
+            self._ring.write(psd)
+            self._sum += psd.sum(axis=-1)
+            self._writes += new
+
+        self._median = None
+        return new
+
+    # ----------------------------------------------------------------------
+    @property
+    def psd(self) -> np.ndarray:
+        """Mean PSD of shape (`channels, frequencies`)."""
+        if not self.count:
+            return np.zeros(self._sum.shape)
+        return self._sum / self.count
+
+    # ----------------------------------------------------------------------
+    @property
+    def median_psd(self) -> np.ndarray:
+        """Median PSD of shape (`channels, frequencies`)."""
+        if self._median is None:
+            if not self.count:
+                return np.zeros(self._sum.shape)
+            self._median = np.median(
+                self.spectrogram, axis=-1
+            ) / _median_bias(self.count)
+        return self._median
+
+    # ----------------------------------------------------------------------
+    @property
+    def spectrogram(self) -> np.ndarray:
+        """Read-only view of shape (`channels, frequencies, segments`)."""
+        return self._ring.view(self.count)
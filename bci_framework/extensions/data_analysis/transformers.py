@@ -0,0 +1,180 @@
+"""
+============
+Transformers
+============
+
+Vectorized preprocessing of EEG blocks.
+
+All the functions operate over arrays of shape (`channels, time`) with
+broadcasting, without Python loops over the channels. The result is written
+in `out` if defined, use `out=x` to transform the array in place and avoid
+the allocation of a new block:
+
+    center(eeg, out=eeg)
+    car(eeg, out=eeg)
+
+The channels without variation are not scaled, instead of produce `nan`.
+
+The functions can be used as buffer transformers, e.g.:
+
+    self.add_transformers({'car': (car, {})})
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+# Consistency constant of the median absolute deviation for normal data
+MAD_SCALE = 1.4826
+
+
+# ----------------------------------------------------------------------
+def _output(x: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+    """Float array to write the result."""
+    if out is None:
+        return np.empty(x.shape, dtype=np.result_type(x, np.float32))
+    return out
+
+
+# ----------------------------------------------------------------------
+def _safe_divide(out: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    """Divide by `scale` in place, with zero for the null scales."""
+    null = scale == 0
+    np.divide(out, scale, out=out, where=~null)
+    if null.any():
+        out[np.broadcast_to(null, out.shape)] = 0
+    return out
+
+
+# ----------------------------------------------------------------------
+def center(x: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Remove the mean of each channel.
+
+    Parameters
+    ----------
+    x
+        Array of shape (`channels, time`).
+    out
+        Array to write the result, can be `x`.
+
+    Returns
+    -------
+    array
+        Centered array.
+    """
+    mean = x.mean(axis=-1, keepdims=True)
+    return np.subtract(x, mean, out=_output(x, out))
+
+
+# ----------------------------------------------------------------------
+def minmax(
+    x: np.ndarray,
+    out: Optional[np.ndarray] = None,
+    low: Optional[float] = 0,
+    high: Optional[float] = 1,
+) -> np.ndarray:
+    """Scale each channel to the range [`low`, `high`].
+
+    Parameters
+    ----------
+    x
+        Array of shape (`channels, time`).
+    out
+        Array to write the result, can be `x`.
+    low
+        Minimum of the scaled channels.
+    high
+        Maximum of the scaled channels.
+    """
+    minimum = x.min(axis=-1, keepdims=True)
+    ptp = x.max(axis=-1, keepdims=True) - minimum
+    out = np.subtract(x, minimum, out=_output(x, out))
+    _safe_divide(out, ptp / (high - low))
+    out += low
+    return out
+
+
+# ----------------------------------------------------------------------
+def car(x: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Common average reference, remove the mean of all the channels.
+
+    Parameters
+    ----------
+    x
+        Array of shape (`channels, time`).
+    out
+        Array to write the result, can be `x`.
+    """
+    mean = x.mean(axis=0)
+    return np.subtract(x, mean, out=_output(x, out))
+
+
+# ----------------------------------------------------------------------
+def reference(
+    x: np.ndarray,
+    channels: Sequence[int],
+    out: Optional[np.ndarray] = None,
+) -> np.ndarray:
+    """Re-reference to the mean of some channels.
+
+    Parameters
+    ----------
+    x
+        Array of shape (`channels, time`).
+    channels
+        Indexes of the reference channels, e.g. `[index_Cz]` or the two
+        mastoids.
+    out
+        Array to write the result, can be `x`.
+    """
+    channels = list(channels)
+    if len(channels) == 1:
+        ref = x[channels[0]]
+    else:
+        ref = x[channels].mean(axis=0)
+    return np.subtract(x, ref, out=_output(x, out))
+
+
+# ----------------------------------------------------------------------
+def detrend(x: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Remove the least squares line of each channel.
+
+    Parameters
+    ----------
+    x
+        Array of shape (`channels, time`).
+    out
+        Array to write the result, can be `x`.
+    """
+    n = x.shape[-1]
+    t = np.arange(n) - (n - 1) / 2
+    norm = (t**2).sum() or 1
+
+    # Slopes and means before `x` is overwritten
+    slope = (x @ t)[..., np.newaxis] / norm
+    mean = x.mean(axis=-1, keepdims=True)
+
+    out = np.subtract(x, mean, out=_output(x, out))
+    out -= slope * t
+    return out
+
+
+# ----------------------------------------------------------------------
+def robust_zscore(
+    x: np.ndarray, out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Standardize each channel with the median and the MAD.
+
+    Less sensitive to artifacts than the mean and the standard deviation.
+
+    Parameters
+    ----------
+    x
+        Array of shape (`channels, time`).
+    out
+        Array to write the result, can be `x`.
+    """
+    median = np.median(x, axis=-1, keepdims=True)
+    out = np.subtract(x, median, out=_output(x, out))
+    mad = np.median(np.abs(out), axis=-1, keepdims=True) * MAD_SCALE
+    return _safe_divide(out, mad)
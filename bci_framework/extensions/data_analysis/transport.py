@@ -0,0 +1,435 @@
+"""
+=========
+Transport
+=========
+
+Shared memory transport for extensions running in the same machine.
+
+A single ingest process consumes Kafka and writes the raw messages into a
+`multiprocessing.shared_memory` ring, each message with a sequence number.
+Any number of consumers read the ring and decode the messages by themselves,
+so the Kafka deserialization and network traffic is done only once.
+
+The consumers sleep on a UNIX datagram socket, the ingest process sends a one
+byte notification to all of them after each message. On platforms without
+UNIX sockets the consumers fall back to polling.
+
+Start the ingest process with:
+
+    $ python -m bci_framework.extensions.data_analysis.transport
+
+and select the transport on the extensions with the environ variable
+`BCISTREAM_TRANSPORT=shm` or with `loop_consumer(..., transport='shm')`.
+
+The slots are sized by default for the packages of the acquisition, from
+`STREAMING_PACKAGE_SIZE` and the number of channels, and their number is
+bounded to keep the ring in `MEMORY` bytes. Both can be defined with the
+environ variables `BCISTREAM_SHM_SLOTS` and `BCISTREAM_SHM_SLOT_SIZE`, or
+with the arguments of the ingest process:
+
+    $ python -m bci_framework.extensions.data_analysis.transport \
+        --slots 64 --slot-size 1048576
+
+Messages larger than the slots can not be transported and are discarded.
+"""
+
+import os
+import glob
+import time
+import socket
+import struct
+import logging
+import argparse
+import tempfile
+from collections import namedtuple
+from multiprocessing import shared_memory, resource_tracker
+from typing import Iterator, List, Literal, Optional, Tuple
+
+from kafka import KafkaConsumer
+
+from ...extensions import properties as prop
+from .codec import decode
+
+TRANSPORT = Literal['kafka', 'shm']
+DEFAULT_NAME = 'bciframework'
+
+MAGIC = b'BCIFSHM1'
+HEADER = struct.Struct('<8sQII')
+SLOT = struct.Struct('<QIxxxxd16s')
+
+Message = namedtuple('Message', ['topic', 'value', 'timestamp'])
+
+# Bytes reserved for the context of each package
+CONTEXT_SIZE = 2**14
+# Size of the ring when the number of slots is not defined
+MEMORY = 2**25
+MIN_SLOTS = 16
+MAX_SLOTS = 256
+
+
+# ----------------------------------------------------------------------
+def get_transport(transport: Optional[TRANSPORT] = None) -> TRANSPORT:
+    """Transport selected with `BCISTREAM_TRANSPORT`, `kafka` by default."""
+    if transport is None:
+        transport = os.environ.get('BCISTREAM_TRANSPORT', 'kafka').strip('"')
+    return transport
+
+
+# ----------------------------------------------------------------------
+def package_slot_size(
+    package_size: Optional[int] = None, channels: Optional[int] = None
+) -> int:
+    """Slot size for the packages of the acquisition.
+
+    The data is assumed `float64`, with the sample ids in the context, and
+    twice the samples, for the variable size of the packages and the `aux`
+    packages of the daisy boards.
+
+    Parameters
+    ----------
+    package_size
+        Samples of each package, by default `STREAMING_PACKAGE_SIZE`.
+    channels
+        Number of channels, by default the channels of the acquisition.
+    """
+    package_size = package_size or prop.STREAMING_PACKAGE_SIZE or 100
+    channels = channels or len(prop.CHANNELS or {}) or 16
+    size = 2 * 8 * package_size * (channels + 1) + CONTEXT_SIZE
+    return max(2**16, 1 << (size - 1).bit_length())
+
+
+# ----------------------------------------------------------------------
+def get_ring_size(
+    slots: Optional[int] = None, slot_size: Optional[int] = None
+) -> Tuple[int, int]:
+    """Number of slots and slot size of the ring.
+
+    The values not defined are read from the environ variables
+    `BCISTREAM_SHM_SLOTS` and `BCISTREAM_SHM_SLOT_SIZE`, and otherwise
+    calculated from the packages of the acquisition.
+    """
+    if slot_size is None:
+        slot_size = os.environ.get('BCISTREAM_SHM_SLOT_SIZE', '').strip('"')
+        slot_size = int(slot_size) if slot_size else package_slot_size()
+    if slots is None:
+        slots = os.environ.get('BCISTREAM_SHM_SLOTS', '').strip('"')
+        if slots:
+            slots = int(slots)
+        else:
+            slots = min(max(MEMORY // slot_size, MIN_SLOTS), MAX_SLOTS)
+    return slots, slot_size
+
+
+########################################################################
+class SharedMemoryRing:
+    """Ring of fixed size slots in shared memory.
+
+    Parameters
+    ----------
+    name
+        Name of the shared memory segment.
+    slots
+        Number of messages retained, only used on creation, see
+        `get_ring_size`.
+    slot_size
+        Maximum size of each message, only used on creation, see
+        `get_ring_size`.
+    create
+        Create the segment, only the ingest process must do it.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self,
+        name: Optional[str] = DEFAULT_NAME,
+        slots: Optional[int] = None,
+        slot_size: Optional[int] = None,
+        create: Optional[bool] = False,
+    ):
+        """"""
+        self.name = name
+        self.discarded = 0
+
+        if create:
+            slots, slot_size = get_ring_size(slots, slot_size)
+            size = HEADER.size + slots * (SLOT.size + slot_size)
+            try:
+                self.shm = shared_memory.SharedMemory(
+                    name=name, create=True, size=size
+                )
+            except FileExistsError:
+                old = shared_memory.SharedMemory(name=name)
+                old.close()
+                old.unlink()
+                self.shm = shared_memory.SharedMemory(
+                    name=name, create=True, size=size
+                )
+            HEADER.pack_into(self.shm.buf, 0, MAGIC, 0, slots, slot_size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            # Only the ingest process owns the segment
+            resource_tracker.unregister(self.shm._name, 'shared_memory')
+
+        magic, _, self.slots, self.slot_size = HEADER.unpack_from(
+            self.shm.buf
+        )
+        if magic != MAGIC:
+            raise ValueError(f'{name!r} is not a BCI-Framework ring')
+
+    # ----------------------------------------------------------------------
+    @property
+    def sequence(self) -> int:
+        """Sequence number of the last message written."""
+        return HEADER.unpack_from(self.shm.buf)[1]
+
+    # ----------------------------------------------------------------------
+    def _slot(self, sequence: int) -> int:
+        """Offset of the slot used by `sequence`."""
+        return HEADER.size + (sequence % self.slots) * (
+            SLOT.size + self.slot_size
+        )
+
+    # ----------------------------------------------------------------------
+    def write(self, topic: str, value: bytes, timestamp: float) -> bool:
+        """Write a raw message, only one process must write.
+
+        Returns
+        -------
+        bool
+            `False` if the message does not fit in a slot.
+        """
+        if len(value) > self.slot_size:
+            self.discarded += 1
+            logging.error(
+                f'Message of {len(value)} bytes discarded, the slot size is '
+                f'{self.slot_size}, increase it with BCISTREAM_SHM_SLOT_SIZE'
+            )
+            return False
+
+        sequence = self.sequence + 1
+        offset = self._slot(sequence)
+
+        # The slot is invalid while it is written
+        SLOT.pack_into(self.shm.buf, offset, 0, 0, 0, b'')
+        start = offset + SLOT.size
+        self.shm.buf[start : start + len(value)] = value
+        SLOT.pack_into(
+            self.shm.buf,
+            offset,
+            sequence,
+            len(value),
+            timestamp,
+            topic.encode(),
+        )
+
+        struct.pack_into('<Q', self.shm.buf, 8, sequence)
+        return True
+
+    # ----------------------------------------------------------------------
+    def read(self, sequence: int) -> Optional[Message]:
+        """Read a raw message.
+
+        Returns
+        -------
+        Message
+            The message, or `None` if it was overwritten.
+        """
+        offset = self._slot(sequence)
+        seq, length, timestamp, topic = SLOT.unpack_from(self.shm.buf, offset)
+        if seq != sequence:
+            return None
+
+        start = offset + SLOT.size
+        value = bytes(self.shm.buf[start : start + length])
+
+        # Check that the writer did not reuse the slot while reading
+        if SLOT.unpack_from(self.shm.buf, offset)[0] != sequence:
+            return None
+
+        return Message(topic.rstrip(b'\0').decode(), value, timestamp)
+
+    # ----------------------------------------------------------------------
+    def close(self) -> None:
+        """"""
+        self.shm.close()
+
+    # ----------------------------------------------------------------------
+    def unlink(self) -> None:
+        """Destroy the segment."""
+        self.shm.unlink()
+
+
+# ----------------------------------------------------------------------
+def _socket_pattern(name: str) -> str:
+    """Glob pattern for the notification sockets of the consumers."""
+    return os.path.join(tempfile.gettempdir(), f'{name}-*.sock')
+
+
+########################################################################
+class SharedMemoryConsumer:
+    """Iterate over the messages of the shared memory ring.
+
+    The interface is compatible with the `KafkaConsumer` used by
+    `loop_consumer`, the messages have the attributes `topic`, `value` and
+    `timestamp`.
+
+    Parameters
+    ----------
+    topics
+        Topics to yield, the other ones are ignored.
+    name
+        Name of the shared memory segment.
+    timeout
+        Maximum time waiting for a notification.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self,
+        topics: List[str],
+        name: Optional[str] = DEFAULT_NAME,
+        timeout: Optional[float] = 0.1,
+    ):
+        """"""
+        self.topics = set(topics)
+        self.timeout = timeout
+        self.dropped = 0
+        self.ring = SharedMemoryRing(name)
+        self.last = self.ring.sequence
+
+        self.socket = None
+        if hasattr(socket, 'AF_UNIX'):
+            self.path = _socket_pattern(name).replace(
+                '*', f'{os.getpid()}-{id(self)}'
+            )
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self.socket.bind(self.path)
+            self.socket.settimeout(timeout)
+
+    # ----------------------------------------------------------------------
+    def wait(self) -> None:
+        """Sleep until the ingest process notifies a new message."""
+        if self.socket is None:
+            time.sleep(self.timeout / 100)
+            return
+        try:
+            self.socket.recv(64)
+        except socket.timeout:
+            pass
+
+    # ----------------------------------------------------------------------
+    def __iter__(self) -> Iterator[Message]:
+        """"""
+        while True:
+            sequence = self.ring.sequence
+            if sequence == self.last:
+                self.wait()
+                continue
+
+            # The consumer is too slow and the ring was overwritten
+            if sequence - self.last > self.ring.slots:
+                self.dropped += sequence - self.last - self.ring.slots
+                self.last = sequence - self.ring.slots
+
+            while self.last < sequence:
+                self.last += 1
+                message = self.ring.read(self.last)
+                if message is None:
+                    self.dropped += 1
+                    continue
+                if message.topic in self.topics:
+                    yield Message(
+                        message.topic, decode(message.value), message.timestamp
+                    )
+
+    # ----------------------------------------------------------------------
+    def close(self) -> None:
+        """"""
+        if self.socket is not None:
+            self.socket.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        self.ring.close()
+
+
+# ----------------------------------------------------------------------
+def ingest(
+    topics: Optional[List[str]] = [
+        'eeg',
+        'aux',
+        'marker',
+        'annotation',
+        'command',
+        'feedback',
+    ],
+    name: Optional[str] = DEFAULT_NAME,
+    slots: Optional[int] = None,
+    slot_size: Optional[int] = None,
+) -> None:
+    """Copy the Kafka messages into the shared memory ring.
+
+    The messages are not deserialized, the consumers decode them. The size
+    of the ring is defined with `get_ring_size`.
+    """
+    ring = SharedMemoryRing(name, slots, slot_size, create=True)
+    logging.info(
+        f'Shared memory ring {name!r}: {ring.slots} slots of '
+        f'{ring.slot_size} bytes'
+    )
+    consumer = KafkaConsumer(
+        bootstrap_servers=[f'{prop.HOST}:9092'],
+        auto_offset_reset='latest',
+    )
+    consumer.subscribe(topics)
+
+    notifier = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    notifier.setblocking(False)
+    readers, refresh = [], 0
+
+    try:
+        for message in consumer:
+            ring.write(message.topic, message.value, message.timestamp)
+
+            if time.time() > refresh:
+                readers = glob.glob(_socket_pattern(name))
+                refresh = time.time() + 1
+
+            for reader in list(readers):
+                try:
+                    notifier.sendto(b'\0', reader)
+                except BlockingIOError:
+                    pass  # the reader has pending notifications
+                except OSError:
+                    # The consumer is gone
+                    readers.remove(reader)
+                    try:
+                        os.remove(reader)
+                    except OSError:
+                        pass
+    finally:
+        consumer.close()
+        notifier.close()
+        ring.close()
+        ring.unlink()
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description='Copy the Kafka messages into a shared memory ring.'
+    )
+    parser.add_argument(
+        '--name', default=DEFAULT_NAME, help='Name of the ring.'
+    )
+    parser.add_argument(
+        '--slots', type=int, default=None, help='Messages retained.'
+    )
+    parser.add_argument(
+        '--slot-size',
+        type=int,
+        default=None,
+        help='Maximum size of each message in bytes.',
+    )
+    args = parser.parse_args()
+
+    ingest(name=args.name, slots=args.slots, slot_size=args.slot_size)
@@ -11,16 +11,26 @@ import json
 import time
 import logging
 import random
-from datetime import datetime, timedelta
+from datetime import datetime
+from contextlib import closing, nullcontext
 from multiprocessing import Process
 from threading import Thread
-from typing import Callable
+from functools import wraps
+from concurrent.futures import Future
+from typing import Callable, List, Optional, Union
 import re
 
 import numpy as np
-from openbci_stream.acquisition import OpenBCIConsumer
+from kafka import KafkaConsumer
 
 from ...extensions import properties as prop
+from .ring_buffer import WindowAccumulator
+from .epochs import EpochExtractor, EpochBatch
+from .backpressure import Backpressure, COALESCED_TOPICS
+from .join import StreamJoin
+from .codec import decode
+from .instrumentation import get_instrumentation
+from .transport import TRANSPORT, SharedMemoryConsumer, get_transport
 
 
 class data:
@@ -29,13 +39,15 @@ class data:
     }
 
 
-data_tmp_aux_ = None
-data_tmp_eeg_ = None
-
 
 # ----------------------------------------------------------------------
 def subprocess_this(fn: Callable) -> Callable:
-    """Decorator to move methods to subprocessing."""
+    """Decorator to move methods to subprocessing.
+
+    Each call starts a new `Process`, so `self` is not required to be
+    picklable, use `workers.offload` to run picklable functions in the
+    persistent worker pool.
+    """
 
     def wraper(*args, **kwargs):
         c = Process(target=fn, args=args)
@@ -46,11 +58,26 @@ def subprocess_this(fn: Callable) -> Callable:
 
 # ----------------------------------------------------------------------
 def thread_this(fn: Callable) -> Callable:
-    """Decorator to move methods to threading."""
+    """Decorator to move methods to threading.
 
-    def wraper(*args, **kwargs):
-        c = Thread(target=fn, args=args)
-        c.start()
+    Each call runs in its own thread, since these methods are
+    usually long running loops, and returns a future with the result.
+    """
+
+    @wraps(fn)
+    def wraper(*args, **kwargs) -> Future:
+        future = Future()
+
+        def target():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except BaseException as error:
+                future.set_exception(error)
+
+        Thread(target=target).start()
+        return future
 
     return wraper
 
@@ -70,41 +97,176 @@ def timeit(fn: Callable) -> Callable:
 
 
 # ----------------------------------------------------------------------
-def loop_consumer(*topics, package_size=None) -> Callable:
+def _create_consumer(
+    topics: List[str], transport: Optional[TRANSPORT] = None
+) -> Union[KafkaConsumer, SharedMemoryConsumer]:
+    """Consumer for binary and pickled packages.
+
+    With the `shm` transport the messages are read from the shared memory
+    ring filled by the ingest process, see `transport`.
+    """
+    if get_transport(transport) == 'shm':
+        try:
+            return SharedMemoryConsumer(topics)
+        except FileNotFoundError:
+            logging.warning(
+                'Shared memory ingest process not running, using Kafka'
+            )
+
+    consumer = KafkaConsumer(
+        bootstrap_servers=[f'{prop.HOST}:9092'],
+        value_deserializer=decode,
+        auto_offset_reset='latest',
+    )
+    consumer.subscribe(topics)
+    return consumer
+
+
+# ----------------------------------------------------------------------
+def _governed_measure(governor) -> Callable:
+    """Context to measure the cost of the calls governed by `governor`.
+
+    Only the calls for the `COALESCED_TOPICS` are governed, the events are
+    neither measured nor consume frame credit.
+    """
+
+    def measure(topic: str):
+        if governor is None or topic not in COALESCED_TOPICS:
+            return nullcontext()
+        return governor.measure()
+
+    return measure
+
+
+# ----------------------------------------------------------------------
+def _get_accumulator(
+    accumulators: dict,
+    topic: str,
+    package_size: int,
+    hop: int,
+    copy: bool = True,
+) -> WindowAccumulator:
+    """Get the window accumulator of a consumer for `topic`.
+
+    The accumulator is created again if the size of the windows changes.
+    With `copy=False` the windows are read-only views of the accumulator.
+    """
+    if topic == 'aux' and prop.CONNECTION == 'wifi' and prop.DAISY:
+        factor = 2
+    else:
+        factor = 1
+
+    window = package_size * factor
+    hop = (hop or package_size) * factor
+
+    accumulator = accumulators.get(topic)
+    if accumulator is None or (accumulator.window, accumulator.hop) != (
+        window,
+        hop,
+    ):
+        accumulator = WindowAccumulator(window, hop, copy)
+        accumulators[topic] = accumulator
+    return accumulator
+
+
+# ----------------------------------------------------------------------
+def loop_consumer(
+    *topics,
+    package_size=None,
+    hop=None,
+    transport=None,
+    backpressure='block',
+    queue_size=64,
+    join=False,
+    governed=True,
+) -> Callable:
     """Decorator to iterate methods with new streamming data.
 
     This decorator will call a method on every new data streamming input.
-    """
-    global data_tmp_eeg_, data_tmp_aux_, package_size_
 
+    Parameters
+    ----------
+    topics
+        Kafka topics to consume.
+    package_size
+        If defined, the `eeg` and `aux` packages are accumulated and the
+        method is called with windows of exactly this number of samples.
+    hop
+        Number of samples between consecutive windows, by default is equal
+        to `package_size`, smaller values produce overlapped windows.
+    transport
+        `kafka` or `shm`, by default is selected with the environ variable
+        `BCISTREAM_TRANSPORT`.
+    backpressure
+        Policy when the method is slower than the stream, `block`,
+        `drop_oldest` or `coalesce`, see `Backpressure`. The counters of
+        skipped calls are available in `backpressure_stats`.
+    queue_size
+        Maximum number of packages retained by the `drop_oldest` and
+        `coalesce` policies.
+    join
+        Call the method once for each pair of `eeg` and `aux` packages,
+        with the arguments `eeg`, `aux` and `timestamp` aligned sample by
+        sample, see `StreamJoin`. The counters of the join are available in
+        `join_stats`.
+    governed
+        Use the frame governor of the class, if any.
+
+    The visualizations can enable a frame governor with `set_frame_rate`,
+    see `FrameGovernor`, then the buffers are updated with every `eeg` and
+    `aux` package but the method is only called at the rate that the
+    visualization and the viewer can sustain. Without `package_size` the
+    argument `data` contains all the samples received since the previous
+    call, instead of a single package.
+    """
     topics = list(topics)
+    if join:
+        topics += [topic for topic in ['eeg', 'aux'] if topic not in topics]
 
+    # Throttle the calls on Raspad, but keep the size of the windows
     if json.loads(os.getenv('BCISTREAM_RASPAD')):
-        package_size_ = 1000
-    else:
-        package_size_ = package_size
+        if package_size:
+            hop = max(hop or package_size, 1000)
+        else:
+            package_size = 1000
 
     def wrap_wrap(fn: Callable) -> Callable:
-        global data_tmp_eeg_, data_tmp_aux_, package_size_
 
         arguments = fn.__code__.co_varnames[1 : fn.__code__.co_argcount]
 
         def wrap(cls):
-            global data_tmp_eeg_, data_tmp_aux_, package_size_
 
             if cls._feedback:
                 topics.append('feedback')
 
-            # if cls._package_size:
-            # package_size_ = cls._package_size
+            accumulators = {}
+            # Windows without copy only if the class opts in
+            copy = not getattr(cls, 'readonly_buffers', False)
+            instrumentation = get_instrumentation()
 
-            with OpenBCIConsumer(host=prop.HOST, topics=topics) as stream:
+            governor = getattr(cls, '_governor', None) if governed else None
+            measure = _governed_measure(governor)
+            held = {}
+
+            with closing(
+                _create_consumer(topics, transport)
+            ) as stream:
                 frame = 0
 
-                for data in stream:
+                consumer = Backpressure(stream, backpressure, queue_size)
+                if not hasattr(cls, '_backpressure'):
+                    cls._backpressure = {}
+                cls._backpressure[fn.__name__] = consumer
+
+                if join:
+                    joiner = StreamJoin(prop.SAMPLE_RATE)
+                    if not hasattr(cls, '_join'):
+                        cls._join = {}
+                    cls._join[fn.__name__] = joiner
+
+                for data, call in consumer:
 
-                    if cls._package_size:
-                        package_size_ = cls._package_size
+                    package_size_ = cls._package_size or package_size
 
                     if data.topic == 'feedback':
                         feedback = data.value
@@ -118,7 +280,7 @@ def loop_consumer(*topics, package_size=None) -> Callable:
 
                     if data.topic == 'eeg':
                         frame += 1
-                        if hasattr(cls, 'buffer_eeg_'):
+                        if hasattr(cls, '_ring_eeg'):
                             cls.update_buffer(
                                 eeg=data.value['data'],
                                 timestamp=min(
@@ -129,7 +291,7 @@ def loop_consumer(*topics, package_size=None) -> Callable:
                         data_ = data.value['data']
                     elif data.topic == 'aux':
                         frame += 1
-                        if hasattr(cls, 'buffer_aux_'):
+                        if hasattr(cls, '_ring_aux'):
                             cls.update_buffer(
                                 aux=data.value['data'],
                                 timestamp=min(
@@ -143,61 +305,101 @@ def loop_consumer(*topics, package_size=None) -> Callable:
 
                     # latency calculated with `timestamp.binary`
                     if data.topic in ['eeg', 'aux']:
-                        latency = (
-                            datetime.now()
-                            - datetime.fromtimestamp(
-                                min(
-                                    data.value['context']['timestamp.binary']
-                                )
-                                - prop.OFFSET
-                            )
-                        ).total_seconds() * 1000
-
+                        acquired = (
+                            min(data.value['context']['timestamp.binary'])
+                            - prop.OFFSET
+                        )
                         samples = data.value['context']['sample_ids']
 
                     else:
                         # latency calculated with kafka timestamp
-                        latency = (
-                            datetime.now()
-                            - datetime.fromtimestamp(data.timestamp / 1000)
-                        ).total_seconds() * 1000
-
+                        acquired = data.timestamp / 1000
                         samples = None
 
-                    if package_size_ and (data.topic in ['eeg', 'aux']):
+                    latency = (
+                        datetime.now() - datetime.fromtimestamp(acquired)
+                    ).total_seconds() * 1000
+                    instrumentation.dequeue(acquired)
+                    topic = data.topic
 
-                        if data.topic == 'eeg':
-                            if data_tmp_eeg_ is None:
-                                data_tmp_eeg_ = np.zeros((data_.shape[0], 0))
-                            data_tmp_eeg_ = np.concatenate(
-                                [data_tmp_eeg_, data_], axis=1
-                            )
-                            d = data_tmp_eeg_
-                        elif data.topic == 'aux':
-                            if data_tmp_aux_ is None:
-                                data_tmp_aux_ = np.zeros((data_.shape[0], 0))
-                            data_tmp_aux_ = np.concatenate(
-                                [data_tmp_aux_, data_], axis=1
-                            )
-                            d = data_tmp_aux_
-
-                        kwargs = {
-                            'data': d,
-                            'kafka_stream': data,
-                            'topic': data.topic,
-                            'frame': frame,
-                            'latency': latency,
-                            'samples': samples,
-                        }
-                        n = package_size_ // prop.STREAMING_PACKAGE_SIZE
-                        if frame % n == 0:
-                            fn(*[cls] + [kwargs[v] for v in arguments])
-                            # else:
-                            if data.topic == 'eeg':
-                                data_tmp_eeg_ = np.zeros((data_.shape[0], 0))
-                            elif data.topic == 'aux':
-                                data_tmp_aux_ = np.zeros((data_.shape[0], 0))
+                    if join and data.topic in ['eeg', 'aux']:
+                        for eeg, aux, t in joiner.push(
+                            data.topic, data_, data.value['context'], acquired
+                        ):
+                            if package_size_:
+                                # Accumulated together to keep the alignment
+                                accumulator = _get_accumulator(
+                                    accumulators,
+                                    'join',
+                                    package_size_,
+                                    hop,
+                                    copy,
+                                )
+                                blocks = (
+                                    np.split(window, [eeg.shape[0], -1])
+                                    for window in accumulator.push(
+                                        np.concatenate([eeg, aux, t[None]])
+                                    )
+                                )
+                            else:
+                                blocks = [(eeg, aux, t[None])]
+
+                            for eeg_, aux_, t_ in blocks:
+                                if not call:
+                                    consumer.skip()
+                                    continue
+                                if governor and not governor.ready():
+                                    continue
+                                kwargs = {
+                                    'data': (eeg_, aux_),
+                                    'eeg': eeg_,
+                                    'aux': aux_,
+                                    'timestamp': t_[0],
+                                    'kafka_stream': data,
+                                    'topic': data.topic,
+                                    'frame': frame,
+                                    'latency': latency,
+                                    'samples': samples,
+                                }
+                                with instrumentation.callback(), measure(
+                                    topic
+                                ):
+                                    fn(*[cls] + [kwargs[v] for v in arguments])
+
+                    elif package_size_ and (data.topic in ['eeg', 'aux']):
+
+                        accumulator = _get_accumulator(
+                            accumulators, data.topic, package_size_, hop, copy
+                        )
+                        for window in accumulator.push(data_):
+                            # The windows are accumulated anyway
+                            if not call:
+                                consumer.skip()
+                                continue
+                            if governor and not governor.ready():
+                                continue
+                            kwargs = {
+                                'data': window,
+                                'kafka_stream': data,
+                                'topic': data.topic,
+                                'frame': frame,
+                                'latency': latency,
+                                'samples': samples,
+                            }
+                            with instrumentation.callback(), measure(topic):
+                                fn(*[cls] + [kwargs[v] for v in arguments])
+                    elif not call:
+                        consumer.skip()
                     else:
+                        if governor and data.topic in COALESCED_TOPICS:
+                            # Delivered with the next call, the governor
+                            # interval is bounded so all the samples are kept
+                            held.setdefault(data.topic, []).append(data_)
+                            if not governor.ready():
+                                continue
+                            data_ = np.concatenate(
+                                held.pop(data.topic), axis=-1
+                            )
                         kwargs = {
                             'data': data_,
                             'kafka_stream': data,
@@ -206,7 +408,8 @@ def loop_consumer(*topics, package_size=None) -> Callable:
                             'latency': latency,
                             'samples': samples,
                         }
-                        fn(*[cls] + [kwargs[v] for v in arguments])
+                        with instrumentation.callback(), measure(topic):
+                            fn(*[cls] + [kwargs[v] for v in arguments])
 
         return wrap
 
@@ -214,11 +417,25 @@ def loop_consumer(*topics, package_size=None) -> Callable:
 
 
 # ----------------------------------------------------------------------
-def fake_loop_consumer(*topics, package_size=None) -> Callable:
+def fake_loop_consumer(
+    *topics,
+    package_size=None,
+    hop=None,
+    transport=None,
+    backpressure='block',
+    queue_size=64,
+    join=False,
+    governed=True,
+) -> Callable:
     """Decorator to iterate methods with new streamming data.
 
-    This decorator will call a method with fake data.
+    This decorator will call a method with fake data, the arguments are the
+    same of `loop_consumer`. The fake data is generated in the same thread,
+    so `transport`, `backpressure` and `queue_size` have no effect.
     """
+    topics = list(topics)
+    if join:
+        topics += [topic for topic in ['eeg', 'aux'] if topic not in topics]
 
     # ----------------------------------------------------------------------
     def wrap_wrap(fn: Callable) -> Callable:
@@ -227,6 +444,72 @@ def fake_loop_consumer(*topics, package_size=None) -> Callable:
 
         def wrap(cls):
             frame = 0
+            accumulators = {}
+            copy = not getattr(cls, 'readonly_buffers', False)
+
+            governor = getattr(cls, '_governor', None) if governed else None
+            measure = _governed_measure(governor)
+            held = {}
+
+            if join:
+                joiner = StreamJoin(prop.SAMPLE_RATE)
+                if not hasattr(cls, '_join'):
+                    cls._join = {}
+                cls._join[fn.__name__] = joiner
+
+            def call(topic, data_, kwargs):
+                package_size_ = cls._package_size or package_size
+                if not package_size_:
+                    if governor:
+                        held.setdefault(topic, []).append(data_)
+                        if not governor.ready():
+                            return
+                        kwargs['data'] = np.concatenate(
+                            held.pop(topic), axis=-1
+                        )
+                    with measure(topic):
+                        fn(*[cls] + [kwargs[v] for v in arguments])
+                    return
+
+                accumulator = _get_accumulator(
+                    accumulators, topic, package_size_, hop, copy
+                )
+                for window in accumulator.push(data_):
+                    if governor and not governor.ready():
+                        continue
+                    kwargs['data'] = window
+                    with measure(topic):
+                        fn(*[cls] + [kwargs[v] for v in arguments])
+
+            def call_joined(eeg, aux, t, kwargs):
+                package_size_ = cls._package_size or package_size
+                if package_size_:
+                    # Accumulated together to keep the alignment
+                    accumulator = _get_accumulator(
+                        accumulators, 'join', package_size_, hop, copy
+                    )
+                    blocks = (
+                        np.split(window, [eeg.shape[0], -1])
+                        for window in accumulator.push(
+                            np.concatenate([eeg, aux, t[None]])
+                        )
+                    )
+                else:
+                    blocks = [(eeg, aux, t[None])]
+
+                for eeg_, aux_, t_ in blocks:
+                    if governor and not governor.ready():
+                        continue
+                    kwargs.update(
+                        {
+                            'data': (eeg_, aux_),
+                            'eeg': eeg_,
+                            'aux': aux_,
+                            'timestamp': t_[0],
+                        }
+                    )
+                    with measure('eeg'):
+                        fn(*[cls] + [kwargs[v] for v in arguments])
 
             while True:
                 frame += 1
@@ -267,7 +550,7 @@ def fake_loop_consumer(*topics, package_size=None) -> Callable:
                 # data.value['data'] = eeg, aux
 
                 if 'eeg' in topics:
-                    if hasattr(cls, 'buffer_eeg'):
+                    if hasattr(cls, '_ring_eeg'):
                         cls.update_buffer(
                             eeg=eeg,
                             timestamp=data.value['timestamp'].timestamp(),
@@ -280,10 +563,11 @@ def fake_loop_consumer(*topics, package_size=None) -> Callable:
                         'frame': frame,
                         'latency': 0,
                     }
-                    fn(*[cls] + [kwargs[v] for v in arguments])
+                    if not join:
+                        call('eeg', eeg, kwargs)
 
                 if 'aux' in topics:
-                    if hasattr(cls, 'buffer_aux'):
+                    if hasattr(cls, '_ring_aux'):
                         cls.update_buffer(
                             aux=aux,
                             timestamp=data.value['timestamp'].timestamp(),
@@ -296,7 +580,20 @@ def fake_loop_consumer(*topics, package_size=None) -> Callable:
                         'frame': frame,
                         'latency': 0,
                     }
-                    fn(*[cls] + [kwargs[v] for v in arguments])
+                    if not join:
+                        call('aux', aux, kwargs)
+
+                if join and aux is not None:
+                    t = data.value['timestamp'].timestamp()
+                    for topic, package in [('eeg', eeg), ('aux', aux)]:
+                        for block in joiner.push(topic, package, {}, t):
+                            kwargs = {
+                                'kafka_stream': data,
+                                'topic': topic,
+                                'frame': frame,
+                                'latency': 0,
+                            }
+                            call_joined(*block, kwargs)
 
                 if 'marker' in topics:
                     if np.random.random() > 0.9:
@@ -331,91 +628,176 @@ def fake_loop_consumer(*topics, package_size=None) -> Callable:
 
 
 # ----------------------------------------------------------------------
-def marker_slicing(markers, t0, t1):
-    """"""
+def marker_slicing(
+    markers,
+    t0,
+    t1=None,
+    duration=None,
+    batch=None,
+    max_delay=None,
+    block_end=None,
+):
+    """Decorator to call methods with the epochs around markers.
+
+    The markers are located in the `eeg` and `aux` buffers by sample index,
+    see `EpochExtractor`, and the method is called as soon as the last
+    sample of the epoch arrives. The buffers must be created with
+    `create_buffer` and be long enough to contain the epochs.
+
+    Parameters
+    ----------
+    markers
+        Regular expressions, or list of them, for the markers to slice.
+    t0
+        Start of the epoch in seconds, relative to the marker.
+    t1
+        End of the epoch in seconds, relative to the marker.
+    duration
+        Length of the epoch in seconds, alternative to `t1`.
+    batch
+        Deliver the epochs in batches of this number of epochs.
+    max_delay
+        Deliver the batch when the oldest epoch waited this seconds.
+    block_end
+        Regular expression for the marker at the end of a stimulus block,
+        the batch is delivered after the epochs of the block.
+
+    If any of `batch`, `max_delay` or `block_end` is defined, the method is
+    called with the stacked epochs, `eeg` and `aux` of shape
+    (`n_epochs, channels, samples`), `timestamp` of shape
+    (`n_epochs, samples`), the `marker` labels and their `marker_datetime`.
+    Otherwise the method is called for each epoch as soon as it is ready.
+    """
     if isinstance(markers, str):
         markers = [markers]
+    if t1 is None:
+        t1 = t0 + duration
 
     def wrap_wrap(fn):
 
         arguments = fn.__code__.co_varnames[1 : fn.__code__.co_argcount]
 
         def wrap(cls):
-            cls._target_marker = []
-
-            @loop_consumer('aux', 'marker')
+            if prop.CONNECTION == 'wifi' and prop.DAISY:
+                factor = 2
+            else:
+                factor = 1
+
+            cls._epochs = EpochExtractor(t0, t1)
+            cls._epochs.add_stream(
+                'eeg', prop.SAMPLE_RATE, len(cls._ring_eeg)
+            )
+            cls._epochs.add_stream(
+                'aux', prop.SAMPLE_RATE * factor, len(cls._ring_aux)
+            )
+
+            if batch or max_delay is not None or block_end:
+                cls._epochs_batch = EpochBatch(batch, max_delay)
+            else:
+                cls._epochs_batch = None
+            instrumentation = get_instrumentation()
+
+            def slice_epochs(cls, index):
+                """All the ready epochs in a single indexing operation."""
+                return {
+                    'eeg': cls._epochs.slice(
+                        'eeg',
+                        cls.buffer_eeg_,
+                        cls._ring_eeg.written,
+                        index['eeg'],
+                    ),
+                    'aux': cls._epochs.slice(
+                        'aux',
+                        cls.buffer_aux_,
+                        cls._ring_aux.written,
+                        index['aux'],
+                    ),
+                    'timestamp': cls._epochs.slice(
+                        'aux',
+                        cls.buffer_aux_timestamp,
+                        cls._ring_aux.written,
+                        index['aux'],
+                    ),
+                }
+
+            # Every package is needed to locate the epochs
+            @loop_consumer('eeg', 'aux', 'marker', governed=False)
             def marker_slicing_(cls, topic, data, kafka_stream, latency):
 
                 if topic == 'marker':
-                    # if data['marker'] in markers:
-                    # cls._target_marker.append(
-                    # [data['marker'], kafka_stream.value['datetime']])
-
                     if any(
                         [
                             bool(re.match(mkr, data['marker']))
                             for mkr in markers
                         ]
                     ):
-                        cls._target_marker.append(
-                            [data['marker'], kafka_stream.value['datetime']]
+                        cls._epochs.add_marker(
+                            data['marker'], kafka_stream.value['datetime']
                         )
-
-                if len(cls._target_marker) < 3:
-                    return
-
-                if target := getattr(cls, '_target_marker', False):
-
-                    # marker, target = target
-
-                    last_buffer_timestamp = (
-                        cls.buffer_aux_timestamp[-1] - prop.OFFSET
+                    if (
+                        block_end
+                        and cls._epochs_batch is not None
+                        and re.match(block_end, data['marker'])
+                    ):
+                        cls._epochs_batch.end_block(
+                            kafka_stream.value['datetime']
+                        )
+                else:
+                    ring = cls._ring_eeg if topic == 'eeg' else cls._ring_aux
+                    cls._epochs.push(
+                        topic,
+                        ring.written,
+                        min(kafka_stream.value['context']['timestamp.binary'])
+                        - prop.OFFSET,
                     )
-                    last_target_timestamp = (
-                        datetime.fromtimestamp(target[0][1])
-                        + timedelta(seconds=t1)
-                    ).timestamp()
-
-                    if last_buffer_timestamp > last_target_timestamp:
-                        # if True:
 
-                        _marker, _target = target.pop(0)
-
-                        argmin = np.abs(
-                            cls.buffer_aux_timestamp - _target
-                        ).argmin()
+                if cls._epochs.pending:
+                    _markers, _targets, index = cls._epochs.pop_ready()
+                else:
+                    _markers = []
 
-                        start = int((prop.SAMPLE_RATE) * t0)
-                        stop = int((prop.SAMPLE_RATE) * t1)
+                if _markers:
+                    epochs = slice_epochs(cls, index)
 
-                        t = cls.buffer_aux_timestamp[
-                            argmin + start : argmin + stop
-                        ]
-                        eeg = cls.buffer_eeg_[
-                            :, argmin + start : argmin + stop
-                        ]
-                        aux = cls.buffer_aux_[
-                            :, argmin + start : argmin + stop
-                        ]
+                    if cls._epochs_batch is None:
+                        for i, (_marker, _target) in enumerate(
+                            zip(_markers, _targets)
+                        ):
+                            kwargs = {
+                                'eeg': epochs['eeg'][i],
+                                'aux': epochs['aux'][i],
+                                'timestamp': epochs['timestamp'][i],
+                                'marker_datetime': _target,
+                                'marker': _marker,
+                                'latency': latency,
+                            }
+                            fn(*[cls] + [kwargs[v] for v in arguments])
+                        return
 
-                        kwargs = {
-                            'eeg': eeg,
-                            'aux': aux,
-                            'timestamp': t,
-                            'marker_datetime': _target,
-                            'marker': _marker,
-                            'latency': latency,
-                            # 'samples': samples,
-                        }
+                    cls._epochs_batch.add(
+                        _markers, _targets, epochs, time.time()
+                    )
 
-                        fn(*[cls] + [kwargs[v] for v in arguments])
+                if cls._epochs_batch is not None and cls._epochs_batch.ready(
+                    time.time(), cls._epochs.oldest
+                ):
+                    (
+                        _markers,
+                        _targets,
+                        epochs,
+                        waited,
+                    ) = cls._epochs_batch.flush(time.time())
+                    instrumentation.batch(len(_markers), waited)
 
-                    else:
-                        logging.warning('Date too old to synchronize')
-                        logging.warning(f'Offset: {prop.OFFSET}')
-                        logging.warning(
-                            f'{datetime.fromtimestamp(last_buffer_timestamp), datetime.fromtimestamp(last_target_timestamp)}'
-                        )
+                    kwargs = {
+                        'eeg': epochs['eeg'],
+                        'aux': epochs['aux'],
+                        'timestamp': epochs['timestamp'],
+                        'marker_datetime': _targets,
+                        'marker': _markers,
+                        'latency': latency,
+                    }
+                    fn(*[cls] + [kwargs[v] for v in arguments])
 
             marker_slicing_(cls)
 
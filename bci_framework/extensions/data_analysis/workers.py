@@ -0,0 +1,361 @@
+"""
+=======
+Workers
+=======
+
+Persistent process pool for the heavy computations of the extensions.
+
+The workers are started once, the first time the pool is used, so the
+tasks do not pay the startup of a new process. Each call returns a `Task`,
+a future with the result of the function. The numpy arrays larger than
+`SHARED_THRESHOLD` bytes are copied once to shared memory instead of being
+pickled, and an array used by several tasks can be shared explicitly with
+`share`:
+
+    with share(eeg) as eeg_:
+        tasks = [submit(connectivity, eeg_, pair) for pair in pairs]
+        values = [task.result() for task in tasks]
+
+The functions must be defined at module level, and since the workers are
+started with `forkserver`, or `spawn` where not available, the code of the
+main script must be under `if __name__ == '__main__'`. The decorator
+`offload` moves a function to the pool, optionally with a deadline, the
+tasks that are not started before the deadline are discarded:
+
+    @offload(deadline=1)
+    def kte(eeg, pair):
+        ...
+
+    task = kte(eeg, pair)
+    task.cancel()
+
+The number of workers is defined with the environ variable
+`BCISTREAM_WORKERS`, by default the number of CPUs.
+"""
+
+import os
+import sys
+import time
+import pickle
+import logging
+import importlib
+import multiprocessing
+from functools import wraps
+from threading import Lock, Timer
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+from typing import Any, Callable, List, Optional
+
+import numpy as np
+
+# Arrays smaller than this are pickled
+SHARED_THRESHOLD = 2**16
+
+_pool = None
+_attached = []
+
+
+########################################################################
+class DeadlineExceeded(TimeoutError):
+    """The task was not completed before its deadline."""
+
+
+########################################################################
+class SharedArray:
+    """Copy of an array in shared memory.
+
+    Only the name of the segment is pickled, the workers map the same
+    memory. The segment is released with `release` or at the end of the
+    `with` block.
+
+    Parameters
+    ----------
+    array
+        The array to share.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, array: np.ndarray):
+        """"""
+        array = np.asarray(array)
+        self.shape = array.shape
+        self.dtype = array.dtype
+        self.shm = shared_memory.SharedMemory(
+            create=True, size=max(array.nbytes, 1)
+        )
+        np.ndarray(self.shape, self.dtype, buffer=self.shm.buf)[:] = array
+
+    # ----------------------------------------------------------------------
+    def __reduce__(self):
+        """"""
+        return _attach, (self.shm.name, self.shape, self.dtype.str)
+
+    # ----------------------------------------------------------------------
+    def release(self) -> None:
+        """Free the shared memory."""
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    # ----------------------------------------------------------------------
+    def __enter__(self) -> 'SharedArray':
+        """"""
+        return self
+
+    # ----------------------------------------------------------------------
+    def __exit__(self, *args) -> None:
+        """"""
+        self.release()
+
+
+# ----------------------------------------------------------------------
+def share(array: np.ndarray) -> SharedArray:
+    """Copy an array to shared memory to use it in several tasks."""
+    return SharedArray(array)
+
+
+# ----------------------------------------------------------------------
+def _attach(name: str, shape: tuple, dtype: str) -> np.ndarray:
+    """Map a `SharedArray` in a worker."""
+    shm = shared_memory.SharedMemory(name=name)
+    _attached.append(shm)
+    array = np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+    array.flags.writeable = False
+    return array
+
+
+# ----------------------------------------------------------------------
+def _reference(fn: Callable) -> Any:
+    """Functions are sent by name, so decorated functions can be found."""
+    qualname = getattr(fn, '__qualname__', '')
+    if '<' in qualname or not hasattr(fn, '__module__'):
+        return fn
+    return fn.__module__, qualname
+
+
+# ----------------------------------------------------------------------
+def _resolve(reference: Any) -> Callable:
+    """The function of a reference, without the `offload` wrapper."""
+    if not isinstance(reference, tuple):
+        return reference
+
+    module, qualname = reference
+    fn = sys.modules.get(module) or importlib.import_module(module)
+    for name in qualname.split('.'):
+        fn = getattr(fn, name)
+    if getattr(fn, '_offloaded', False):
+        fn = fn.__wrapped__
+    return fn
+
+
+# ----------------------------------------------------------------------
+def _run(reference: Any, args: tuple, kwargs: dict, deadline: float) -> bytes:
+    """Execute a task in a worker."""
+    try:
+        if deadline and time.time() > deadline:
+            raise DeadlineExceeded('The task was not started on time')
+
+        result = _resolve(reference)(*args, **kwargs)
+        # Serialized here, the result can be a view of the shared memory
+        return pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+
+    finally:
+        del args, kwargs
+        while _attached:
+            shm = _attached.pop()
+            try:
+                shm.close()
+            except BufferError:
+                pass  # still referenced by the function
+
+
+# ----------------------------------------------------------------------
+def _noop() -> None:
+    """"""
+
+
+# ----------------------------------------------------------------------
+def get_workers() -> int:
+    """Number of workers of the pool."""
+    workers = os.environ.get('BCISTREAM_WORKERS', '').strip('"')
+    return int(workers) if workers else os.cpu_count() or 1
+
+
+# ----------------------------------------------------------------------
+def _get_context() -> multiprocessing.context.BaseContext:
+    """Start method of the workers.
+
+    The extensions run consumer threads, and a fork copies the locks held
+    by them, so the workers are started from a clean process.
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+# ----------------------------------------------------------------------
+def get_pool() -> ProcessPoolExecutor:
+    """The process pool of the extension, started on the first use."""
+    global _pool
+    if _pool is None:
+        # The workers must share the tracker of the segments created here
+        resource_tracker.ensure_running()
+        _pool = ProcessPoolExecutor(
+            max_workers=get_workers(), mp_context=_get_context()
+        )
+        # Start all the workers now and not on the first tasks
+        for future in [_pool.submit(_noop) for _ in range(get_workers())]:
+            future.result()
+    return _pool
+
+
+########################################################################
+class Task(Future):
+    """Future of a function running in the pool.
+
+    Parameters
+    ----------
+    future
+        The future of the pool.
+    shared
+        Arrays shared only for this task.
+    deadline
+        Timestamp to complete the task.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self,
+        future: Future,
+        shared: List[SharedArray],
+        deadline: Optional[float] = None,
+    ):
+        """"""
+        super().__init__()
+        self._future = future
+        self._shared = shared
+        self._lock = Lock()
+        self._timer = None
+        self._expired = False
+
+        if deadline:
+            self._timer = Timer(
+                max(deadline - time.time(), 0), self._expire
+            )
+            self._timer.daemon = True
+            self._timer.start()
+
+        future.add_done_callback(self._done)
+
+    # ----------------------------------------------------------------------
+    def cancel(self) -> bool:
+        """Cancel the task if it is not running yet."""
+        return self._future.cancel()
+
+    # ----------------------------------------------------------------------
+    def _expire(self) -> None:
+        """Fail the task on its deadline, the worker result is discarded."""
+        self._expired = True
+        if self._future.cancel():
+            return
+        with self._lock:
+            if not self.done():
+                self.set_exception(
+                    DeadlineExceeded('The task was not completed on time')
+                )
+
+    # ----------------------------------------------------------------------
+    def _done(self, future: Future) -> None:
+        """"""
+        if self._timer:
+            self._timer.cancel()
+        for array in self._shared:
+            array.release()
+
+        with self._lock:
+            if self.done():
+                return
+            if future.cancelled() and self._expired:
+                self.set_exception(
+                    DeadlineExceeded('The task was not started on time')
+                )
+            elif future.cancelled():
+                super().cancel()
+            elif future.exception() is not None:
+                self.set_exception(future.exception())
+            else:
+                self.set_result(pickle.loads(future.result()))
+
+
+# ----------------------------------------------------------------------
+def _submit(
+    fn: Callable, args: tuple, kwargs: dict, deadline: Optional[float] = None
+) -> Task:
+    """"""
+    shared = []
+
+    def prepare(value):
+        if isinstance(value, np.ndarray) and value.nbytes >= SHARED_THRESHOLD:
+            value = SharedArray(value)
+            shared.append(value)
+        return value
+
+    args = tuple(prepare(arg) for arg in args)
+    kwargs = {key: prepare(value) for key, value in kwargs.items()}
+    if deadline:
+        deadline = time.time() + deadline
+
+    try:
+        future = get_pool().submit(
+            _run, _reference(fn), args, kwargs, deadline
+        )
+    except Exception:
+        for array in shared:
+            array.release()
+        raise
+    return Task(future, shared, deadline)
+
+
+# ----------------------------------------------------------------------
+def submit(fn: Callable, *args, **kwargs) -> Task:
+    """Execute `fn(*args, **kwargs)` in the pool."""
+    return _submit(fn, args, kwargs)
+
+
+# ----------------------------------------------------------------------
+def offload(
+    fn: Optional[Callable] = None, deadline: Optional[float] = None
+) -> Callable:
+    """Decorator to execute a function in the pool.
+
+    The decorated function returns a `Task` instead of the result.
+
+    Parameters
+    ----------
+    deadline
+        Seconds to complete the task, after that the task is cancelled if
+        it was not started, or fails with `DeadlineExceeded`.
+    """
+
+    def wrap(fn: Callable) -> Callable:
+        @wraps(fn)
+        def call(*args, **kwargs) -> Task:
+            return _submit(fn, args, kwargs, deadline)
+
+        call._offloaded = True
+        return call
+
+    if fn is None:
+        return wrap
+    return wrap(fn)
+
+
+# ----------------------------------------------------------------------
+def shutdown(wait: Optional[bool] = True) -> None:
+    """Stop the workers, the pool is started again if used."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=wait, cancel_futures=True)
+        _pool = None
+        logging.info('Worker pool stopped')
@@ -22,10 +22,13 @@ class Properties:
     Example:
     ```
     from bci_framework.projects import properties as prop
+    from bci_framework.extensions.data_analysis.codec import decode
 
-    with OpenBCIConsumer(host=prop.HOST) as stream:
-        for message in stream:
-            ...
+    stream = KafkaConsumer(bootstrap_servers=[f'{prop.HOST}:9092'],
+                           value_deserializer=decode)
+    stream.subscribe(['eeg'])
+    for message in stream:
+        ...
     ```
     """
 
@@ -7,7 +7,6 @@ This handlers are used to configure the `Stimuli Delivery`.
 """
 
 import json
-import pickle
 import logging
 from queue import Queue
 from typing import TypeVar
@@ -22,6 +21,7 @@ from kafka import KafkaProducer, KafkaConsumer
 from datetime import datetime, timedelta
 from bci_framework.extensions import properties as prop
 from bci_framework.extensions.data_analysis.utils import thread_this, subprocess_this
+from bci_framework.extensions.data_analysis.codec import serializer, decode
 
 created_consumer = [False]
 clients = {}
@@ -40,7 +40,7 @@ def bci_consumer():
     try:
         consumer = KafkaConsumer(
             bootstrap_servers=[f'{prop.HOST}:9092'],
-            value_deserializer=pickle.loads,
+            value_deserializer=decode,
             auto_offset_reset='latest',
         )
     except:
@@ -91,8 +91,7 @@ class WSHandler(WebSocketHandler):
         try:
             self.kafka_producer = KafkaProducer(
                 bootstrap_servers=[f'{prop.HOST}:9092'],
-                compression_type='gzip',
-                value_serializer=pickle.dumps,
+                value_serializer=serializer(),
             )
         except:
             logging.warning(
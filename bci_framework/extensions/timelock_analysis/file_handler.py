@@ -1,9 +1,28 @@
+import os
+import shutil
+import tempfile
+import weakref
+from itertools import count
+
+import numpy as np
 from openbci_stream.utils.hdf5 import HDF5Reader
 
+from .lod import MinMaxPyramid
+
+# Samples copied from the HDF5 file on each read
+CHUNK = 2**16
+
 
 ########################################################################
 class FileHandler:
-    """"""
+    """Access to the records without copy the data on each read.
+
+    The arrays are copied once, in chunks, from the HDF5 file to `.npy` files
+    in a temporary directory, and returned as copy-on-write memory maps: the
+    pages are only loaded when they are read, and any write creates a
+    private copy of the page, so the cache is never modified. The arrays
+    assigned to the handler are stored in the same way.
+    """
 
     # ----------------------------------------------------------------------
     def __init__(self, filename):
@@ -13,53 +32,179 @@ class FileHandler:
             self.file = HDF5Reader(filename)
             print(self.file)
 
+        self._cache_dir = tempfile.mkdtemp(prefix='bciframework-')
+        self._cache_names = {}
+        self._cache_count = count()
+        weakref.finalize(
+            self, shutil.rmtree, self._cache_dir, ignore_errors=True
+        )
+
+    # ----------------------------------------------------------------------
+    def _cached(self, name, build=None):
+        """Copy-on-write memory map of a cached array."""
+        if name not in self._cache_names:
+            if build is None:
+                return None
+            path = os.path.join(self._cache_dir, f'{name}.npy')
+            build(path)
+            self._cache_names[name] = path
+        return np.load(self._cache_names[name], mmap_mode='c')
+
+    # ----------------------------------------------------------------------
+    def _store(self, name, value):
+        """Write an array to the cache."""
+        # A new file each time, a truncated file would break the memory
+        # maps already returned
+        path = os.path.join(
+            self._cache_dir, f'{name}-{next(self._cache_count)}.npy'
+        )
+        np.save(path, np.asarray(value))
+        if previous := self._cache_names.get(name):
+            os.remove(previous)
+        self._cache_names[name] = path
+
+    # ----------------------------------------------------------------------
+    def _dump_aligned(self, node, offsets, split):
+        """Builder for arrays aligned with the offsets of each board.
+
+        Equivalent to the `eeg` and `aux` of `HDF5Reader`, but without load
+        the full array in memory.
+        """
+        def build(path):
+            channels, samples = map(int, node.shape)
+            if len(offsets) > 1:
+                samples -= max(offsets)
+            channels = min(channels, int(sum(split)))
+
+            array = np.lib.format.open_memmap(
+                path, mode='w+', dtype=node.dtype, shape=(channels, samples)
+            )
+            row = 0
+            for pos, nchan in zip(offsets, split):
+                rows = slice(row, min(row + int(nchan), channels))
+                pos = int(pos)
+                for start in range(0, samples, CHUNK):
+                    stop = min(start + CHUNK, samples)
+                    array[rows, start:stop] = node[
+                        rows, start + pos : stop + pos
+                    ]
+                row += int(nchan)
+            array.flush()
+
+        return build
+
+    # ----------------------------------------------------------------------
+    def _dump(self, fn):
+        """Builder for arrays calculated in memory."""
+        return lambda path: np.save(path, np.asarray(fn()))
+
     # ----------------------------------------------------------------------
     @property
     def eeg(self):
         """"""
-        if hasattr(self, '_modified_eeg'):
-            return self._modified_eeg
-        else:
-            return self.file.eeg.copy()
+        modified = self._cached('modified_eeg')
+        if modified is not None:
+            return modified
+        return self.original_eeg
 
     # ----------------------------------------------------------------------
     @property
     def original_eeg(self):
         """"""
-        return self.file.eeg.copy()
+        if 'eeg' in self._cache_names:
+            return self._cached('eeg')
+
+        # Calculate the offsets of the boards
+        self.file.timestamp
+        return self._cached(
+            'eeg',
+            self._dump_aligned(
+                self.file.f.root.eeg_data,
+                self.file.offsets_position,
+                self.file.header['channels_by_board'],
+            ),
+        )
 
     # ----------------------------------------------------------------------
     @eeg.setter
     def eeg(self, value):
         """"""
-        self._modified_eeg = value
+        self._store('modified_eeg', value)
 
     # ----------------------------------------------------------------------
     @property
     def aux(self):
         """"""
-        if hasattr(self, '_modified_aux'):
-            return self._modified_aux
-        else:
-            return self.file.aux.copy()
+        modified = self._cached('modified_aux')
+        if modified is not None:
+            return modified
+
+        if 'aux' in self._cache_names:
+            return self._cached('aux')
+
+        self.file.aux_timestamp
+        node = self.file.f.root.aux_data
+        boards = len(self.file.header['channels_by_board'])
+        return self._cached(
+            'aux',
+            self._dump_aligned(
+                node,
+                self.file.aux_offsets_position,
+                [node.shape[0] / boards] * boards,
+            ),
+        )
 
     # ----------------------------------------------------------------------
     @aux.setter
     def aux(self, value):
         """"""
-        self._modified_aux = value
+        self._store('modified_aux', value)
 
     # ----------------------------------------------------------------------
     @property
     def timestamp(self):
         """"""
-        return self.file.timestamp.copy()
+        return self._cached(
+            'timestamp', self._dump(lambda: self.file.timestamp)
+        )
 
     # ----------------------------------------------------------------------
     @property
     def aux_timestamp(self):
         """"""
-        return self.file.aux_timestamp.copy()
+        return self._cached(
+            'aux_timestamp', self._dump(lambda: self.file.aux_timestamp)
+        )
+
+    # ----------------------------------------------------------------------
+    def lod(self):
+        """Min/max pyramid of `eeg` for plotting.
+
+        The pyramid of the original data is saved next to the record, the
+        pyramid of modified data is only kept in memory.
+        """
+        key = self._cache_names.get('modified_eeg')
+        if getattr(self, '_lod', (False, None))[0] == key:
+            return self._lod[1]
+
+        eeg = self.eeg
+        duration = self.timestamp[0][-1] / 1000
+
+        if key:
+            pyramid = MinMaxPyramid(eeg, duration)
+        else:
+            filename = self.file.filename.replace('.h5', '.lod.npz')
+            signature = os.path.getmtime(self.file.filename)
+            pyramid = MinMaxPyramid.load(filename, eeg, signature)
+            if pyramid is None:
+                pyramid = MinMaxPyramid(eeg, duration)
+                try:
+                    pyramid.save(filename, signature)
+                except OSError:
+                    pass
+
+        self._lod = (key, pyramid)
+        return pyramid
 
     # ----------------------------------------------------------------------
     @property
@@ -104,6 +249,12 @@ class FileHandler:
     # ----------------------------------------------------------------------
     def close(self):
         """"""
+        # The data is still available from the cache
+        self.original_eeg
+        self.timestamp
+        if hasattr(self.file.f.root, 'aux_data'):
+            self.aux
+            self.aux_timestamp
         self.file.close()
 
     # ----------------------------------------------------------------------
@@ -121,4 +272,3 @@ class FileHandler:
     def fix_markers(self, target_markers, rises, range_=2000):
         """"""
         return self.file.fix_markers(target_markers, rises)
-
@@ -0,0 +1,170 @@
+"""
+===============
+Level of detail
+===============
+
+Min/max envelopes of long recordings for plotting.
+
+Each level keeps the minimum and maximum of bins of samples, each level with
+bins `FACTOR` times larger than the previous one. A query for a time range
+returns the finest level with no more points than pixels, so the cost of
+draw a window of 500 milliseconds or 1 hour is the same, and the envelope
+keeps the peaks that a decimation would lose.
+"""
+
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+BASE = 16
+FACTOR = 4
+CHUNK = 2**16
+
+
+########################################################################
+class MinMaxPyramid:
+    """Multi-resolution min/max envelope of a `(channels, time)` array.
+
+    Parameters
+    ----------
+    data
+        Array of shape (`channels, time`), it is not copied, so memory maps
+        can be used.
+    duration
+        Time in seconds between the first and the last sample.
+    levels
+        Precalculated levels, used by `load`.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self,
+        data: np.ndarray,
+        duration: float,
+        levels: Optional[list] = None,
+    ):
+        """"""
+        self.data = data
+        self.channels, self.samples = data.shape
+        self.duration = duration
+        self.dt = duration / max(self.samples - 1, 1)
+
+        if levels is None:
+            levels = self._build()
+        self.levels = levels
+
+    # ----------------------------------------------------------------------
+    def _build(self) -> list:
+        """Calculate all the levels, reading the data in chunks."""
+        levels = []
+
+        chunk = BASE * (CHUNK // BASE)
+        mins, maxs = [], []
+        for start in range(0, self.samples, chunk):
+            block = np.asarray(
+                self.data[:, start : start + chunk], dtype=np.float32
+            )
+            block = self._pad(block, BASE)
+            block = block.reshape(self.channels, -1, BASE)
+            mins.append(block.min(axis=2))
+            maxs.append(block.max(axis=2))
+        if not mins:
+            return levels
+        levels.append(
+            (BASE, np.concatenate(mins, axis=1), np.concatenate(maxs, axis=1))
+        )
+
+        while levels[-1][1].shape[1] > FACTOR:
+            bin_, mins, maxs = levels[-1]
+            mins = self._pad(mins, FACTOR).reshape(self.channels, -1, FACTOR)
+            maxs = self._pad(maxs, FACTOR).reshape(self.channels, -1, FACTOR)
+            levels.append((bin_ * FACTOR, mins.min(axis=2), maxs.max(axis=2)))
+
+        return levels
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def _pad(array: np.ndarray, size: int) -> np.ndarray:
+        """Pad the last axis to a multiple of `size` repeating the edge."""
+        missing = -array.shape[1] % size
+        if missing:
+            array = np.pad(array, ((0, 0), (0, missing)), mode='edge')
+        return array
+
+    # ----------------------------------------------------------------------
+    def query(
+        self, t0: float, t1: float, pixels: Optional[int] = 1000
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Points to draw the range `t0`, `t1` with `pixels` of width.
+
+        Returns
+        -------
+        tuple
+            The times of shape (`points`) and the values of shape
+            (`channels, points`). If the range has few samples they are
+            returned without change, otherwise the minimum and maximum of
+            each bin are interleaved.
+        """
+        start = min(max(int(t0 / self.dt), 0), self.samples)
+        stop = min(max(int(np.ceil(t1 / self.dt)) + 1, start), self.samples)
+
+        if stop - start <= 2 * pixels or not self.levels:
+            t = np.arange(start, stop) * self.dt
+            return t, np.asarray(self.data[:, start:stop])
+
+        for bin_, mins, maxs in self.levels:
+            if (stop - start) / bin_ <= pixels:
+                break
+
+        b0, b1 = start // bin_, -(-stop // bin_)
+        values = np.empty((self.channels, 2 * (b1 - b0)), dtype=mins.dtype)
+        values[:, 0::2] = mins[:, b0:b1]
+        values[:, 1::2] = maxs[:, b0:b1]
+
+        t = (np.arange(b0, b1) * bin_ + bin_ / 2) * self.dt
+        return np.repeat(t, 2), values
+
+    # ----------------------------------------------------------------------
+    def save(self, filename: str, signature: Optional[str] = '') -> None:
+        """Persist the levels in a `.npz` file."""
+        arrays = {
+            'duration': self.duration,
+            'shape': np.array(self.data.shape),
+            'signature': signature,
+        }
+        for i, (bin_, mins, maxs) in enumerate(self.levels):
+            arrays[f'bin_{i}'] = bin_
+            arrays[f'min_{i}'] = mins
+            arrays[f'max_{i}'] = maxs
+
+        # Write to a temporary file to not leave a broken cache
+        np.savez(f'{filename}.tmp.npz', **arrays)
+        os.replace(f'{filename}.tmp.npz', filename)
+
+    # ----------------------------------------------------------------------
+    @classmethod
+    def load(
+        cls, filename: str, data: np.ndarray, signature: Optional[str] = ''
+    ) -> Optional['MinMaxPyramid']:
+        """Load the levels saved with `save`.
+
+        Returns `None` if the file does not exist or was created for other
+        data.
+        """
+        if not os.path.exists(filename):
+            return None
+
+        with np.load(filename) as file:
+            if tuple(file['shape']) != data.shape or str(
+                file['signature']
+            ) != str(signature):
+                return None
+
+            levels = []
+            while f'bin_{len(levels)}' in file:
+                i = len(levels)
+                levels.append(
+                    (int(file[f'bin_{i}']), file[f'min_{i}'], file[f'max_{i}'])
+                )
+            return cls(data, float(file['duration']), levels)
@@ -8,8 +8,7 @@ from abc import ABCMeta, abstractmethod
 import mne
 import numpy as np
 # from scipy.fftpack import rfft, rfftfreq
-from scipy.signal import welch, decimate
-from scipy.signal import decimate, welch
+from scipy.signal import decimate
 
 from cycler import cycler
 import matplotlib
@@ -25,6 +24,7 @@ from PySide6.QtWidgets import QSpacerItem, QSizePolicy
 from gcpds.filters import frequency as flt
 from gcpds.filters import frequency as flt
 from bci_framework.framework.dialogs import Dialogs
+from bci_framework.extensions.data_analysis import spectrum as spectral
 
 # from bci_framework.extensions.data_analysis.utils import thread_this, subprocess_this
 
@@ -559,10 +559,28 @@ class TimelockSeries(TimelockWidget):
         self.fill_color = os.environ.get(
             'QTMATERIAL_PRIMARYCOLOR', '#ff0000')
 
+        # Transformation of the data before plot it
+        self.lod_scale = 1
+        self.lod_spacing = 0
+
+    # ----------------------------------------------------------------------
+    def update_window(self, t0=None):
+        """Query the min/max pyramid for the visible range."""
+        if t0 is None:
+            t0 = self.scroll.value() / 1000
+
+        pixels = max(int(self.ax1.get_window_extent().width), 100)
+        t, values = self.pyramid.query(t0, t0 + self.window_value, pixels)
+        for i, line in enumerate(self.lines):
+            line.set_data(t, values[i] * self.lod_scale +
+                          self.lod_spacing * i)
+
+        self.ax1.set_xlim(t0, t0 + self.window_value)
+
     # ----------------------------------------------------------------------
     def move_plot(self, value):
         """"""
-        self.ax1.set_xlim(value / 1000, (value / 1000 + self.window_value))
+        self.update_window(value / 1000)
         self.ax2.collections.clear()
         self.ax2.fill_between([value / 1000, (value / 1000 + self.window_value)],
                               *self.ax1.get_ylim(), color=self.fill_color, alpha=self.fill_opacity)
@@ -574,18 +592,12 @@ class TimelockSeries(TimelockWidget):
         self.window_value = self._get_seconds_from_human(
             self.combobox.currentText())
 
-        eeg = self.pipeline_output.eeg
-        timestamp = self.pipeline_output.timestamp
-
-        timestamp = np.linspace(
-            0, timestamp[0][-1], eeg.shape[1], endpoint=True) / 1000
-
-        self.scroll.setMaximum((timestamp[-1] - self.window_value) * 1000)
+        self.scroll.setMaximum(
+            (self.pyramid.duration - self.window_value) * 1000)
         self.scroll.setMinimum(0)
         self.scroll.setPageStep(self.window_value * 1000)
 
-        self.ax1.set_xlim(self.scroll.value() / 1000,
-                          (self.scroll.value() / 1000 + self.window_value))
+        self.update_window()
 
         self.ax2.collections.clear()
         self.ax2.fill_between([self.scroll.value() / 1000, (self.scroll.value() + self.window_value) / 1000],
@@ -605,27 +617,37 @@ class TimelockSeries(TimelockWidget):
         return np.prod(list(map(float, value.split())))
 
     # ----------------------------------------------------------------------
-    def set_data(self, timestamp, eeg, labels, ylabel='', xlabel='', legend=True):
+    def set_data(self, pyramid, labels, ylabel='', xlabel='', legend=True):
         """"""
         self.ax1.clear()
         self.ax2.clear()
+        self.pyramid = pyramid
 
-        for i, ch in enumerate(eeg):
-            self.ax1.plot(timestamp, eeg[i], label=labels[i])
-            self.ax2.plot(timestamp, eeg[i], alpha=0.5)
+        # The overview use the coarsest resolution needed
+        pixels = max(int(self.ax2.get_window_extent().width), 100)
+        t, values = pyramid.query(0, pyramid.duration, pixels)
+
+        self.lines = []
+        for i, ch in enumerate(values):
+            line, = self.ax1.plot([], [], label=labels[i])
+            self.lines.append(line)
+            self.ax2.plot(t, ch * self.lod_scale + self.lod_spacing * i,
+                          alpha=0.5)
+
+        self.ax1.set_ylim(*self.ax2.get_ylim())
+        self.update_window(0)
 
         self.ax1.grid(True, axis='x')
         if legend:
             self.ax1.legend(loc='upper center', ncol=8,
                             bbox_to_anchor=(0.5, 1.4), **LEGEND_KWARGS)
-        self.ax1.set_xlim(0, self.window_value)
 
         self.ax2.grid(True, axis='x')
-        self.ax2.set_xlim(0, timestamp[-1])
+        self.ax2.set_xlim(0, pyramid.duration)
         self.ax2.fill_between([0, self.window_value], *self.ax1.get_ylim(),
-                              color=self.fill_color, alpha=self.fill_opacity)
+                              color=self.fill_color, alpha=self.fill_opacity, label='AREA')
 
-        self.scroll.setMaximum((timestamp[-1] - self.window_value) * 1000)
+        self.scroll.setMaximum((pyramid.duration - self.window_value) * 1000)
         self.scroll.setMinimum(0)
 
         self.ax1.set_ylabel(ylabel)
@@ -727,8 +749,10 @@ class Filters(TimelockWidget):
 
         # self.output_signal = eeg
 
-        w, spectrum = welch(eeg, fs=1000, axis=1,
-                            nperseg=1024, noverlap=256, average='median')
+        # The median is stable enough with a bounded number of segments
+        w, spectrum = spectral.welch(eeg, fs=1000, nperseg=1024,
+                                     noverlap=256, average='median',
+                                     max_segments=512)
 
         # spectrum = decimate(spectrum, 15, axis=1)
         # w = np.linspace(0, w[-1], spectrum.shape[1])
@@ -747,7 +771,7 @@ class Filters(TimelockWidget):
 
         self.pipeline_tunned = True
         self._pipeline_output = self.pipeline_input
-        self._pipeline_output.eeg = eeg.copy()
+        self._pipeline_output.eeg = eeg
         self._pipeline_propagate()
 
     # ----------------------------------------------------------------------
@@ -841,29 +865,24 @@ class LoadDatabase(TimelockSeries):
         datafile = self.pipeline_input
 
         header = datafile.header
-        eeg = datafile.eeg
         datafile.aux
-        timestamp = datafile.timestamp
 
         self.database_description.setText(datafile.description)
 
-        eeg = decimate(eeg, 15, axis=1)
-        timestamp = np.linspace(
-            0, timestamp[0][-1], eeg.shape[1], endpoint=True) / 1000
+        pyramid = datafile.lod()
+        self.lod_scale = 1 / 1000
 
-        eeg = eeg / 1000
+        self.set_data(pyramid,
+                      labels=list(header['channels'].values()),
+                      ylabel='Millivolt [$mv$]',
+                      xlabel='Time [$s$]')
 
         options = [self._get_seconds_from_human(
             w) for w in self.window_options]
-        l = len([o for o in options if o < timestamp[-1]])
+        l = len([o for o in options if o < pyramid.duration])
         self.combobox.clear()
         self.combobox.addItems(self.window_options[:l])
 
-        self.set_data(timestamp, eeg,
-                      labels=list(header['channels'].values()),
-                      ylabel='Millivolt [$mv$]',
-                      xlabel='Time [$s$]')
-
         datafile.close()
 
         self.pipeline_tunned = True
@@ -1105,19 +1124,13 @@ class AddMarkers(TimelockSeries):
         self.markers.addItems(markers)
 
         header = datafile.header
-        eeg = datafile.eeg
-        timestamp = datafile.timestamp
-
-        eeg = decimate(eeg, 15, axis=1)
-        timestamp = np.linspace(
-            0, timestamp[0][-1], eeg.shape[1], endpoint=True) / 1000
-
-        # eeg = eeg / 1000
+        pyramid = datafile.lod()
 
         self.threshold = 150
-        channels = eeg.shape[0]
+        self.lod_spacing = self.threshold
+        channels = pyramid.channels
 
-        self.set_data(timestamp, eeg,
+        self.set_data(pyramid,
                       labels=list(header['channels'].values()),
                       ylabel='Millivolt [$mv$]',
                       xlabel='Time [$s$]',
@@ -1140,39 +1153,10 @@ class AddMarkers(TimelockSeries):
         self.pipeline_tunned = True
         self.pipeline_output = self.pipeline_input
 
-    # ----------------------------------------------------------------------
-    def set_data(self, timestamp, eeg, labels, ylabel='', xlabel='', legend=True):
-        """"""
-        self.ax1.clear()
-        self.ax2.clear()
-
-        for i, ch in enumerate(eeg):
-            self.ax1.plot(timestamp, ch + self.threshold *
-                          i, label=labels[i])
-            self.ax2.plot(timestamp, ch + self.threshold * i, alpha=0.5)
-
-        self.ax1.grid(True, axis='x')
-        if legend:
-            self.ax1.legend(loc='upper center', ncol=8,
-                            bbox_to_anchor=(0.5, 1.4), **LEGEND_KWARGS)
-        self.ax1.set_xlim(0, self.window_value)
-
-        self.ax2.grid(True, axis='x')
-        self.ax2.set_xlim(0, timestamp[-1])
-
-        self.ax2.fill_between([0, self.window_value], *self.ax1.get_ylim(),
-                              color=self.fill_color, alpha=self.fill_opacity, label='AREA')
-
-        self.scroll.setMaximum((timestamp[-1] - self.window_value) * 1000)
-        self.scroll.setMinimum(0)
-
-        self.ax1.set_ylabel(ylabel)
-        self.ax2.set_xlabel(xlabel)
-
     # ----------------------------------------------------------------------
     def move_plot(self, value):
         """"""
-        self.ax1.set_xlim(value / 1000, (value / 1000 + self.window_value))
+        self.update_window(value / 1000)
 
         for area in [i for i, c in enumerate(self.ax2.collections) if c.get_label() == 'AREA'][::-1]:
             self.ax2.collections.pop(area)
@@ -1193,18 +1177,12 @@ class AddMarkers(TimelockSeries):
         self.window_value = self._get_seconds_from_human(
             self.combobox.currentText())
 
-        eeg = self.pipeline_output.eeg
-        timestamp = self.pipeline_output.timestamp
-
-        timestamp = np.linspace(
-            0, timestamp[0][-1], eeg.shape[1], endpoint=True) / 1000
-
-        self.scroll.setMaximum((timestamp[-1] - self.window_value) * 1000)
+        self.scroll.setMaximum(
+            (self.pyramid.duration - self.window_value) * 1000)
         self.scroll.setMinimum(0)
         self.scroll.setPageStep(self.window_value * 1000)
 
-        self.ax1.set_xlim(self.scroll.value() / 1000,
-                          (self.scroll.value() / 1000 + self.window_value))
+        self.update_window()
 
         self.draw()
 
@@ -0,0 +1,404 @@
+"""
+======
+Canvas
+======
+
+Streaming of the lines data to a canvas rendered by the browser.
+
+Instead of rasterizing the figure and sending an image on each frame, the
+layout of the figure (axes, limits, ticks, labels and the style of the
+lines) is sent as JSON only when changes, and each frame is a binary message
+with the new samples of each line. The browser keeps the data of each line
+in a ring and draws it on a canvas with its own min/max decimation, so the
+cost for the server depends on the data rate and not on the pixels.
+
+A frame is a little-endian message with a header::
+
+    uint32 frame, uint16 blocks, uint16 reserved
+
+followed by one block for each line that changed::
+
+    uint16 line, uint8 kind, uint8 reserved, uint32 length, uint32 count,
+    float64 x0, float64 x1, float32[count] y, float32[count] x
+
+`length` is the number of points of the line, the x values are evenly
+spaced between `x0` and `x1`. With the kind `APPEND` the `count` values are
+appended to the end of the line, discarding the oldest ones. With `REPLACE`
+the line is replaced. With `XY` the x values are not evenly spaced and are
+sent after the y values.
+
+The new samples are detected comparing the data of each line with the
+previous one shifted by the samples received in the buffers, any other
+change is sent as a replacement.
+"""
+
+import os
+import json
+import struct
+import asyncio
+import logging
+from urllib.parse import urlparse
+from typing import Optional, Sequence
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.colors import to_hex
+from matplotlib import rcParams
+from tornado.ioloop import IOLoop
+from tornado.web import Application
+from tornado.template import Template
+from tornado.httpserver import HTTPServer
+from tornado.netutil import bind_sockets
+from tornado.websocket import WebSocketHandler, WebSocketClosedError
+
+from ..data_analysis.utils import thread_this
+
+APPEND = 0
+REPLACE = 1
+XY = 2
+
+FRAME_HEADER = struct.Struct('<IHH')
+BLOCK_HEADER = struct.Struct('<HBxIIdd')
+
+TEMPLATE = os.path.join(os.path.dirname(__file__), 'canvas.html')
+
+
+########################################################################
+class CanvasHandler(WebSocketHandler):
+    """WebSocket of each viewer."""
+
+    # ----------------------------------------------------------------------
+    def initialize(self, renderer: 'CanvasRenderer') -> None:
+        """"""
+        self.renderer = renderer
+
+    # ----------------------------------------------------------------------
+    def check_origin(self, origin: str) -> bool:
+        """The viewer is served by `FigureStream` from another port of the
+        same host."""
+        return urlparse(origin).hostname == self.request.host_name
+
+    # ----------------------------------------------------------------------
+    def open(self) -> None:
+        """"""
+        self.set_nodelay(True)
+        self.renderer.connect(self)
+
+    # ----------------------------------------------------------------------
+    def on_close(self) -> None:
+        """"""
+        self.renderer.disconnect(self)
+
+    # ----------------------------------------------------------------------
+    def on_message(self, message: str) -> None:
+        """Messages from the viewer, the size of the canvas and the frames
+        drawn."""
+        data = json.loads(message)
+        if data['action'] == 'resize':
+            self.renderer.resize(data['width'], data['height'])
+        elif data['action'] == 'frame':
+            self.renderer.acknowledge(data['frame'])
+
+
+########################################################################
+class LineState:
+    """The data of a line known by the viewers."""
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """"""
+        self.y = None
+        self.x = None
+        self.uniform = True
+
+    # ----------------------------------------------------------------------
+    def block(
+        self, index: int, x: np.ndarray, y: np.ndarray, shifts: Sequence[int]
+    ) -> Optional[bytes]:
+        """Encode the changes of the line since the previous frame.
+
+        Returns
+        -------
+        bytes
+            The block of the line, or `None` if it did not change.
+        """
+        y = np.asarray(y, dtype='<f4')
+        x = np.asarray(x, dtype='<f8')
+        length = y.size
+        x0, x1 = (x[0], x[-1]) if length else (0, 0)
+
+        same_x = self.x is not None and np.array_equal(x, self.x)
+        if not same_x:
+            self.uniform = length < 3 or np.ptp(np.diff(x)) <= 1e-6 * abs(
+                (x1 - x0) / (length - 1)
+            )
+
+        kind = REPLACE if self.uniform else XY
+        new = y
+
+        if self.y is not None and self.y.size == length and self.uniform:
+            # Bitwise comparison, the NaN are equal
+            current = y.view('<u4')
+            previous = self.y.view('<u4')
+            for shift in (0, *shifts):
+                if 0 <= shift < length and np.array_equal(
+                    current[: length - shift], previous[shift:]
+                ):
+                    kind = APPEND
+                    new = y[length - shift :]
+                    break
+
+            if kind == APPEND and not new.size and same_x:
+                return None
+
+        self.y = y.copy()
+        self.x = x.copy()
+
+        header = BLOCK_HEADER.pack(index, kind, length, new.size, x0, x1)
+        if kind == XY:
+            return header + new.tobytes() + x.astype('<f4').tobytes()
+        return header + new.tobytes()
+
+
+########################################################################
+class CanvasRenderer:
+    """Send the figure to the viewers as layout and lines data.
+
+    Parameters
+    ----------
+    figure
+        The figure to stream, only its lines are sent as data.
+    max_pending
+        Frames sent and not yet drawn by the viewers before start to skip
+        frames.
+    host
+        Address where the WebSocket listens, by default only the local
+        viewer can connect.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self,
+        figure: Figure,
+        max_pending: Optional[int] = 8,
+        host: Optional[str] = 'localhost',
+    ):
+        """"""
+        self.figure = figure
+        self.max_pending = max_pending
+        self.lines = []
+        self.states = []
+
+        self.clients = set()
+        self.sent = 0
+        self.acknowledged = 0
+        self.bytes = 0
+        self.skipped = 0
+        self._reset = True
+        self._layout = None
+
+        sockets = bind_sockets(0, host)
+        self.port = sockets[0].getsockname()[1]
+        self._loop = None
+        self._serve(sockets)
+
+    # ----------------------------------------------------------------------
+    @thread_this
+    def _serve(self, sockets: list) -> None:
+        """Run the WebSocket server in its own event loop."""
+        asyncio.set_event_loop(asyncio.new_event_loop())
+        application = Application(
+            [('/ws', CanvasHandler, {'renderer': self})]
+        )
+        HTTPServer(application).add_sockets(sockets)
+        self._loop = IOLoop.current()
+        self._loop.start()
+
+    # ----------------------------------------------------------------------
+    def add(self, *artists) -> None:
+        """Stream these lines on each frame, other artists are ignored."""
+        for artist in artists:
+            if isinstance(artist, Line2D) and artist not in self.lines:
+                artist.set_animated(True)
+                self.lines.append(artist)
+                self.states.append(LineState())
+        self._reset = True
+
+    # ----------------------------------------------------------------------
+    @property
+    def stats(self) -> dict:
+        """Frames sent and skipped, bytes sent and frames not yet drawn."""
+        return {
+            'sent': self.sent,
+            'skipped': self.skipped,
+            'bytes': self.bytes,
+            'pending': self.sent - self.acknowledged,
+            'clients': len(self.clients),
+        }
+
+    # ----------------------------------------------------------------------
+    def html(self, background: Optional[str] = None) -> bytes:
+        """The page of the viewer."""
+        with open(TEMPLATE, 'r') as file:
+            template = Template(file.read())
+        return template.generate(port=self.port, background=background)
+
+    # ----------------------------------------------------------------------
+    def connect(self, client: WebSocketHandler) -> None:
+        """A new viewer receives the layout and the full lines."""
+        self.clients.add(client)
+        self.acknowledged = self.sent
+        self._reset = True
+
+    # ----------------------------------------------------------------------
+    def disconnect(self, client: WebSocketHandler) -> None:
+        """"""
+        self.clients.discard(client)
+
+    # ----------------------------------------------------------------------
+    def resize(self, width: float, height: float) -> None:
+        """Use the size of the canvas for the layout of the figure."""
+        dpi = self.figure.get_dpi()
+        size = (width / dpi, height / dpi)
+        if tuple(self.figure.get_size_inches()) != size:
+            self.figure.set_size_inches(*size)
+
+    # ----------------------------------------------------------------------
+    def acknowledge(self, frame: int) -> None:
+        """The last frame drawn by a viewer."""
+        self.acknowledged = max(self.acknowledged, frame)
+
+    # ----------------------------------------------------------------------
+    def layout(self) -> dict:
+        """Axes, ticks, labels and the style of the lines."""
+        axes = self.figure.get_axes()
+        layout = {
+            'background': to_hex(self.figure.get_facecolor()),
+            'color': to_hex(rcParams['text.color']),
+            'font': f"{rcParams['font.size']}px {rcParams['font.family'][0]}",
+            'axes': [self._axis_layout(axis) for axis in axes],
+            'lines': [
+                {
+                    'axis': axes.index(line.axes),
+                    'color': to_hex(line.get_color()),
+                    'width': line.get_linewidth(),
+                    'visible': line.get_visible(),
+                }
+                for line in self.lines
+            ],
+        }
+        return layout
+
+    # ----------------------------------------------------------------------
+    def _axis_layout(self, axis) -> dict:
+        """"""
+        gridlines = axis.xaxis.get_gridlines()
+        grid = any(line.get_visible() for line in gridlines)
+        handles, labels = axis.get_legend_handles_labels()
+        return {
+            'position': list(axis.get_position().bounds),
+            'facecolor': to_hex(axis.get_facecolor()),
+            'xlim': list(axis.get_xlim()),
+            'ylim': list(axis.get_ylim()),
+            'xticks': self._ticks(axis.xaxis, axis.get_xlim()),
+            'yticks': self._ticks(axis.yaxis, axis.get_ylim()),
+            'title': axis.get_title(),
+            'xlabel': axis.get_xlabel(),
+            'ylabel': axis.get_ylabel(),
+            'grid': to_hex(gridlines[0].get_color()) if grid else None,
+            'legend': [
+                [label, to_hex(handle.get_color())]
+                for handle, label in zip(handles, labels)
+                if isinstance(handle, Line2D)
+            ]
+            if axis.get_legend()
+            else [],
+        }
+
+    # ----------------------------------------------------------------------
+    @staticmethod
+    def _ticks(axis, limits) -> list:
+        """Position and label of the visible ticks."""
+        locs = axis.get_majorticklocs()
+        labels = axis.get_major_formatter().format_ticks(locs)
+        low, high = sorted(limits)
+        return [
+            [float(loc), label]
+            for loc, label in zip(locs, labels)
+            if low <= loc <= high
+        ]
+
+    # ----------------------------------------------------------------------
+    def render(self, shifts: Optional[Sequence[int]] = ()) -> Optional[bytes]:
+        """Encode a new frame.
+
+        Parameters
+        ----------
+        shifts
+            Samples received by the buffers since the previous frame, used
+            to detect the lines that only appended new samples.
+
+        Returns
+        -------
+        bytes
+            The binary frame, or `None` if there are no viewers, they are
+            behind, or nothing changed.
+        """
+        if not self.clients:
+            self._reset = True
+            return None
+
+        if self.sent - self.acknowledged > self.max_pending:
+            # The next frame will replace the lines
+            self.skipped += 1
+            self._reset = True
+            return None
+
+        if self._reset:
+            for state in self.states:
+                state.__init__()
+
+        if self._reset or self.figure.stale:
+            layout = self.layout()
+            if self._reset or layout != self._layout:
+                self._layout = layout
+                self.send(json.dumps({'layout': layout}), binary=False)
+            self.figure.stale = False
+        self._reset = False
+
+        blocks = []
+        for i, (line, state) in enumerate(zip(self.lines, self.states)):
+            block = state.block(i, line.get_xdata(), line.get_ydata(), shifts)
+            if block is not None:
+                blocks.append(block)
+
+        if not blocks:
+            self.skipped += 1
+            return None
+
+        self.sent += 1
+        return (
+            FRAME_HEADER.pack(self.sent, len(blocks), 0)
+            + b''.join(blocks)
+        )
+
+    # ----------------------------------------------------------------------
+    def send(self, message, binary: Optional[bool] = True) -> None:
+        """Send a message to all the viewers from any thread."""
+        if self._loop is None:
+            return
+        if binary:
+            self.bytes += len(message)
+        self._loop.add_callback(self._broadcast, message, binary)
+
+    # ----------------------------------------------------------------------
+    def _broadcast(self, message, binary: bool) -> None:
+        """"""
+        for client in list(self.clients):
+            try:
+                client.write_message(message, binary=binary)
+            except WebSocketClosedError:
+                self.clients.discard(client)
+            except Exception as error:
+                logging.warning(f'Canvas viewer: {error}')
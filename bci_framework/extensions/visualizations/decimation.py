@@ -0,0 +1,69 @@
+"""
+==========
+Decimation
+==========
+
+Reduction of the signals to the resolution of the screen.
+
+A line with more points than pixel columns is rasterized with several points
+over the same column, so only the extremes of each column are visible. The
+signals are split in one bucket per column and each bucket is replaced by
+its minimum and maximum, in the order they appear, so the spikes are
+preserved and the figure looks the same with two points per column. All the
+channels are reduced at once.
+"""
+
+from typing import Tuple
+
+import numpy as np
+
+
+# ----------------------------------------------------------------------
+def minmax(
+    time: np.ndarray, data: np.ndarray, columns: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Min/max decimation of the signals to a number of pixel columns.
+
+    Parameters
+    ----------
+    time
+        Array of shape (`time`, ).
+    data
+        Array of shape (`channels, time`).
+    columns
+        Number of pixel columns, e.g. the width of the axis.
+
+    Returns
+    -------
+    tuple
+        Time and data of shape (`channels, 2 * columns`), the time is
+        different for each channel since it is the time of the extremes.
+        If the signals are shorter than two points per column they are
+        returned unchanged, with the time broadcasted.
+    """
+    data = np.asarray(data)
+    n = data.shape[-1]
+    columns = max(int(columns), 1)
+
+    if n <= 2 * columns:
+        return np.broadcast_to(time, data.shape), data
+
+    # Buckets of the same size, the last one padded with the last sample
+    size = -(-n // columns)
+    columns = -(-n // size)
+    index = np.minimum(np.arange(columns * size), n - 1)
+    buckets = data[..., index].reshape(*data.shape[:-1], columns, size)
+
+    argmin = buckets.argmin(axis=-1)
+    argmax = buckets.argmax(axis=-1)
+    # The extremes of each bucket in chronological order
+    first = np.minimum(argmin, argmax)
+    second = np.maximum(argmin, argmax)
+
+    offset = np.arange(columns) * size
+    positions = np.stack([first + offset, second + offset], axis=-1)
+    positions = np.minimum(positions, n - 1).reshape(
+        *data.shape[:-1], 2 * columns
+    )
+
+    return time[positions], np.take_along_axis(data, positions, axis=-1)
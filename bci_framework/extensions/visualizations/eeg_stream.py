@@ -21,11 +21,19 @@ import matplotlib
 from matplotlib import pyplot
 from cycler import cycler
 from kafka import KafkaProducer
+from flask import request
 from figurestream import FigureStream
 from typing import Optional, Tuple, Literal, Callable
 
 from ...extensions import properties as prop
 from ...extensions.data_analysis import DataAnalysis
+from ...extensions.data_analysis.cache import GenerationCache
+from ...extensions.data_analysis.instrumentation import get_instrumentation
+from ...extensions.data_analysis.governor import FrameGovernor
+from .render import BlitRenderer
+from .canvas import CanvasRenderer
+from .topomap import Topomap
+from . import decimation
 
 # Consigure matplotlib
 if ('light' in sys.argv) or (
@@ -82,6 +90,19 @@ class MNEObjects:
         montage = mne.channels.make_standard_montage(prop.MONTAGE_NAME)
         return montage
 
+    # ----------------------------------------------------------------------
+    def create_topomap(self, axis: matplotlib.axes.Axes, **kwargs) -> Topomap:
+        """Create a `Topomap` with the channels and montage of the GUI.
+
+        The interpolation and the head are built once, use
+        `Topomap.update` on each frame. The image, the outlines and the
+        sensors are animated. Any other argument is passed to `Topomap`.
+        """
+        topomap = Topomap(axis, self.get_mne_info(), **kwargs)
+        if hasattr(self, 'animate'):
+            self.animate(*topomap.artists)
+        return topomap
+
     # ----------------------------------------------------------------------
     def get_mne_evoked(self) -> mne.EvokedArray:
         """Create the `Evoked` object to use with mne handlers.
@@ -118,12 +139,222 @@ class EEGStream(FigureStream, DataAnalysis, MNEObjects):
 
         self._feedback = False
         self._package_size = None
+        self._cache = GenerationCache()
 
         self.transformers_ = {}
         self.transformers_aux_ = {}
         self.widget_value = {}
+        self._renderer = None
+        self._render_mode = 'full'
+        self._animated = []
+        self._written = (0, 0)
+        # Opt-in, see `set_frame_rate`
+        self._governor = None
         self.wait_for_interact()
 
+    # ----------------------------------------------------------------------
+    def set_frame_rate(
+        self,
+        fps: Optional[float] = 10,
+        budget: Optional[float] = 0.5,
+    ) -> None:
+        """Enable the frame governor.
+
+        The methods decorated with `loop_consumer` are called at most `fps`
+        times per second, less if the callbacks use more than `budget` of a
+        CPU or if the viewer can not draw the frames as fast, the buffers
+        are updated anyway with every package. Must be called before start
+        the consumer.
+
+        By default the governor is disabled and the methods are called for
+        every package. With the governor the argument `data` contains all
+        the samples received since the previous call, not a single package.
+
+        Parameters
+        ----------
+        fps
+            Target frames per second, `None` to call the methods for every
+            package.
+        budget
+            Fraction of a CPU that the callbacks can use.
+        """
+        if fps is None:
+            self._governor = None
+        else:
+            self._governor = FrameGovernor(
+                fps, budget, pending=self._viewer_pending
+            )
+
+    # ----------------------------------------------------------------------
+    @property
+    def frame_rate(self) -> Optional[float]:
+        """Frames per second selected by the governor."""
+        if self._governor is None:
+            return None
+        return self._governor.fps
+
+    # ----------------------------------------------------------------------
+    def _figurestream(self, name: str) -> Optional[object]:
+        """Private attribute of `FigureStream`, `None` if the installed
+        version does not have it."""
+        return getattr(self, f'_FigureStream__{name}', None)
+
+    # ----------------------------------------------------------------------
+    def _viewer_pending(self) -> int:
+        """Frames produced and not yet consumed by the viewer."""
+        if self._render_mode == 'canvas':
+            return self._renderer.stats['pending']
+
+        buffer = self._figurestream('buffer')
+        if buffer is None:
+            return 0
+        pending = buffer.qsize()
+
+        # The clients of `FigureStream` that did not take the last frame, a
+        # client is gone if it does not in a second
+        try:
+            events = self._figurestream('class_attr')['event'].events
+        except (TypeError, KeyError, AttributeError):
+            return pending
+        now = time.time()
+        return pending + sum(
+            event.is_set() and now - updated < 1
+            for event, updated in events.values()
+        )
+
+    # ----------------------------------------------------------------------
+    def set_render_mode(self, mode: Literal['full', 'blit', 'canvas']) -> None:
+        """Select how the frames are rendered.
+
+        In `full` mode each frame renders the complete figure. In `blit`
+        mode the static part of the figure is rendered only when changes,
+        and each frame draws only the animated artists over it, the lines
+        created with `create_lines` and the artists added with `animate`.
+        The frames without changes in the animated artists are skipped.
+
+        The static artists should not be updated on each frame, e.g. call
+        `set_xlim` only when the limits change, or the full figure will be
+        rendered anyway.
+
+        In `canvas` mode the figure is not rendered by the server, the
+        layout of the axes is sent when changes and each frame sends only
+        the new samples of the lines to the viewer, that draws them on a
+        canvas. Only the lines are animated, other artists are ignored.
+        """
+        if mode == 'blit':
+            self._renderer = BlitRenderer(self)
+        elif mode == 'canvas':
+            self._renderer = CanvasRenderer(self)
+        else:
+            self._renderer = None
+
+        if self._renderer is not None:
+            self._renderer.add(*self._animated)
+        self._render_mode = mode
+
+    # ----------------------------------------------------------------------
+    def animate(self, *artists: matplotlib.artist.Artist) -> None:
+        """Artists updated on each frame, for the `blit` and `canvas` render
+        modes."""
+        self._animated.extend(artists)
+        if self._renderer is not None:
+            self._renderer.add(*artists)
+
+    # ----------------------------------------------------------------------
+    def decimate(
+        self,
+        time: np.ndarray,
+        data: np.ndarray,
+        axis: matplotlib.axes.Axes,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Reduce the signals to two points for each pixel column.
+
+        The width of the axis is the one of the current size of the figure,
+        updated by the viewer on each resize. In `canvas` mode the signals
+        are returned unchanged, the viewer reduces them when draws.
+
+        Parameters
+        ----------
+        time
+            Array of shape (`time`, ).
+        data
+            Array of shape (`channels, time`).
+        axis
+            The axis where the signals will be drawn.
+
+        Returns
+        -------
+        tuple
+            Time and data of shape (`channels, points`), to use with
+            `set_data` on each line.
+        """
+        if self._render_mode == 'canvas':
+            return np.broadcast_to(time, data.shape), data
+
+        columns = int(np.ceil(axis.bbox.width))
+        return decimation.minmax(time, data, columns)
+
+    # ----------------------------------------------------------------------
+    @property
+    def render_stats(self) -> dict:
+        """Frames rendered, frame time, and achieved and governed FPS."""
+        stats = get_instrumentation().render_summary()
+        if self._renderer is not None:
+            stats.update(self._renderer.stats)
+        return stats
+
+    # ----------------------------------------------------------------------
+    def feed(self) -> None:
+        """Render a new frame and send it to the viewer."""
+        instrumentation = get_instrumentation()
+        start = time.time()
+
+        # The frames queue of `FigureStream`
+        buffer = self._figurestream('buffer')
+        if self._renderer is None or (
+            self._render_mode == 'blit' and buffer is None
+        ):
+            super().feed()
+            instrumentation.frame(time.time() - start)
+            return
+
+        if self._render_mode == 'canvas':
+            frame = self._renderer.render(self._new_samples())
+        else:
+            frame = self._renderer.render()
+
+        if frame is None:
+            instrumentation.frame(None)
+            return
+
+        if self._render_mode == 'canvas':
+            self._renderer.send(frame)
+        else:
+            buffer.put(frame)
+        instrumentation.frame(time.time() - start)
+
+    # ----------------------------------------------------------------------
+    def _new_samples(self) -> Tuple[int, int]:
+        """EEG and AUX samples written in the buffers since the last call."""
+        written = tuple(
+            getattr(self, ring).written if hasattr(self, ring) else 0
+            for ring in ('_ring_eeg', '_ring_aux')
+        )
+        new = tuple(
+            now - before for now, before in zip(written, self._written)
+        )
+        self._written = written
+        return new
+
+    # ----------------------------------------------------------------------
+    def figure_template(self):
+        """The page of the viewer, with a canvas in `canvas` mode."""
+        if getattr(self, '_render_mode', 'full') != 'canvas':
+            return super().figure_template()
+
+        self.proccess_interact(request.values)
+        return self._renderer.html(request.values.get('background', None))
+
     # ----------------------------------------------------------------------
     def create_lines(
         self,
@@ -239,6 +470,7 @@ class EEGStream(FigureStream, DataAnalysis, MNEObjects):
             ),
             zorder=0,
         )
+        self.animate(*lines)
         lines = np.array(lines)
 
         return axis, time, lines
@@ -6,14 +6,16 @@ from ...extensions import properties as prop
 from typing import Callable
 
 from functools import wraps
-from gcpds.filters import frequency as flt
 
 import numpy as np
 
+from ..data_analysis.filters import BandPass, Notch
+
 notch_filters = ('none', '50 Hz', '60 Hz')
 bandpass_filters = ('none', 'delta', 'theta', 'alpha', 'beta',
                     '5-45 Hz', '3-30 Hz', '4-40 Hz', '2-45 Hz', '1-50 Hz',
                     '7-13 Hz', '15-50 Hz', '1-100 Hz', '5-50 Hz',)
+bands = {'delta': (1, 4), 'theta': (4, 8), 'alpha': (8, 12), 'beta': (12, 30)}
 scale = ('50 µV', '100 µV', '200 µV', '400 µV', '800 µV', '1000 µV')
 channels = ['All'] + list(prop.CHANNELS.values())
 substract = ('none', 'channel mean', 'global mean', 'Cz')
@@ -61,15 +63,13 @@ class Filters:
         """"""
         if bandpass == 'none':
             self.remove_transformers(['bandpass'])
-        elif bandpass in ['delta', 'theta', 'alpha', 'beta']:
-            bandpass = getattr(flt, bandpass)
-            self.add_transformers(
-                {'bandpass': (bandpass, {'fs': prop.SAMPLE_RATE})})
         else:
-            bandpass = bandpass.replace(' Hz', '').replace('-', '')
-            bandpass = getattr(flt, f'band{bandpass}')
+            if bandpass in bands:
+                f0, f1 = bands[bandpass]
+            else:
+                f0, f1 = map(float, bandpass.replace(' Hz', '').split('-'))
             self.add_transformers(
-                {'bandpass': (bandpass, {'fs': prop.SAMPLE_RATE})})
+                {'bandpass': BandPass(f0, f1, fs=prop.SAMPLE_RATE)})
 
     # ----------------------------------------------------------------------
     @interact('Notch', notch_filters, '60 Hz')
@@ -78,10 +78,9 @@ class Filters:
         if notch == 'none':
             self.remove_transformers(['notch'])
         else:
-            notch = notch.replace(' Hz', '')
-            notch = getattr(flt, f'notch{notch}')
+            notch = float(notch.replace(' Hz', ''))
             self.add_transformers(
-                {'notch': (notch, {'fs': prop.SAMPLE_RATE})})
+                {'notch': Notch(notch, fs=prop.SAMPLE_RATE)})
 
     # ----------------------------------------------------------------------
     @interact('Scale', scale, '100 µV', 100)
@@ -0,0 +1,119 @@
+"""
+======
+Render
+======
+
+Incremental rendering of the figures with blitting.
+
+The static part of the figure (axes, ticks, labels, grid and legends) is
+rendered once and kept as background, each new frame restores the
+background and draws only the animated artists, usually the lines. The
+background is rendered again when the figure is resized or when a static
+artist changes, e.g. after `set_xlim`, since the animated artists do not
+mark the figure as stale. If no animated artist changed since the last
+frame the frame is skipped.
+"""
+
+from io import BytesIO
+from typing import Optional
+
+from PIL import Image
+from matplotlib.artist import Artist
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+########################################################################
+class BlitRenderer:
+    """Render a figure blitting only the animated artists.
+
+    Parameters
+    ----------
+    figure
+        The figure to render, its canvas is replaced with an Agg canvas.
+    quality
+        Quality of the JPEG frames.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(self, figure: Figure, quality: Optional[int] = 75):
+        """"""
+        self.figure = figure
+        self.canvas = FigureCanvasAgg(figure)
+        self.quality = quality
+        self.artists = []
+
+        self.background = None
+        self._size = None
+        self._output = BytesIO()
+
+        self.full = 0
+        self.blit = 0
+        self.skipped = 0
+
+    # ----------------------------------------------------------------------
+    def add(self, *artists: Artist) -> None:
+        """Render these artists on each frame over the background."""
+        for artist in artists:
+            if artist not in self.artists:
+                artist.set_animated(True)
+                self.artists.append(artist)
+        self.background = None
+
+    # ----------------------------------------------------------------------
+    @property
+    def stats(self) -> dict:
+        """Frames rendered completely, blitted and skipped."""
+        return {
+            'full': self.full,
+            'blit': self.blit,
+            'skipped': self.skipped,
+        }
+
+    # ----------------------------------------------------------------------
+    def render(self) -> Optional[bytes]:
+        """Render a new frame.
+
+        Returns
+        -------
+        bytes
+            The JPEG frame, or `None` if nothing changed.
+        """
+        size = (*self.figure.get_size_inches(), self.figure.dpi)
+
+        if self.background is None or self.figure.stale or size != self._size:
+            # The animated artists are excluded by `draw`
+            self.canvas.draw()
+            self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+            self._size = size
+            self.full += 1
+        elif any(artist.stale for artist in self.artists):
+            self.canvas.restore_region(self.background)
+            self.blit += 1
+        else:
+            self.skipped += 1
+            return None
+
+        for artist in self.artists:
+            self.figure.draw_artist(artist)
+        return self.encode()
+
+    # ----------------------------------------------------------------------
+    def encode(self) -> bytes:
+        """JPEG of the current content of the canvas."""
+        renderer = self.canvas.get_renderer()
+        image = Image.frombuffer(
+            'RGBA',
+            (int(renderer.width), int(renderer.height)),
+            self.canvas.buffer_rgba(),
+            'raw',
+            'RGBA',
+            0,
+            1,
+        )
+        self._output.seek(0)
+        self._output.truncate(0)
+        image.convert('RGB').save(
+            self._output, format='jpeg', quality=self.quality
+        )
+        return self._output.getvalue()
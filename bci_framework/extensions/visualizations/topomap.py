@@ -0,0 +1,139 @@
+"""
+=======
+Topomap
+=======
+
+Topographic maps updated with a single matrix product.
+
+`mne.viz.plot_topomap` builds the head outline and the sensors, and
+triangulates the sensor positions to interpolate the values on a grid, each
+time is called. The interpolation of `mne` is linear in the values of the
+sensors, so it can be precomputed as a matrix from the channels to the
+pixels of the grid, with the interpolation of each channel alone. The head
+and the image are created once, and each update is a product of the matrix
+with the values and `set_data` on the existing image:
+
+    self.topomap = self.create_topomap(self.axis)
+    ...
+    self.topomap.update(eeg.mean(axis=1))
+    self.feed()
+
+For 16 channels and a grid of 64x64 pixels each update takes a few tens of
+microseconds.
+"""
+
+from typing import Optional, Tuple
+
+import mne
+import numpy as np
+import matplotlib
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+from matplotlib.collections import Collection
+
+
+########################################################################
+class Topomap:
+    """Topographic map with precomputed interpolation.
+
+    Parameters
+    ----------
+    axis
+        The axis where the map is drawn.
+    info
+        The `Info` of the channels, with montage.
+    res
+        Pixels of each side of the grid.
+    cmap
+        The matplotlib `cmap` to use.
+    vlim
+        Fixed limits of the colormap, by default are calculated on each
+        update as `plot_topomap` does.
+    kwargs
+        Other arguments of `mne.viz.plot_topomap`, e.g. `sensors`,
+        `outlines` or `extrapolate`.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self,
+        axis: matplotlib.axes.Axes,
+        info: mne.Info,
+        res: Optional[int] = 64,
+        cmap: Optional[str] = 'cool',
+        vlim: Optional[Tuple[float, float]] = None,
+        **kwargs,
+    ):
+        """"""
+        self.vlim = vlim
+        self.res = res
+        channels = len(info.ch_names)
+        kwargs = {
+            'res': res,
+            'cmap': cmap,
+            'contours': 0,
+            'show': False,
+            'outlines': 'head',
+            **kwargs,
+        }
+
+        # The head, the sensors and the image, clipped by the head
+        self.image, _ = mne.viz.plot_topomap(
+            np.zeros(channels), info, axes=axis, **kwargs
+        )
+        # The outlines and the sensors are drawn over the image
+        self.artists = [self.image] + sorted(
+            [
+                artist
+                for artist in axis.get_children()
+                if isinstance(artist, (Line2D, Collection))
+                and artist.get_zorder() > self.image.get_zorder()
+            ],
+            key=lambda artist: artist.get_zorder(),
+        )
+
+        # The interpolation of each channel alone, in a scratch figure
+        scratch = Figure().add_subplot()
+        kwargs['sensors'] = False
+        columns = []
+        for basis in np.eye(channels):
+            image, _ = mne.viz.plot_topomap(
+                basis, info, axes=scratch, **kwargs
+            )
+            columns.append(np.asarray(image.get_array(), dtype=float).ravel())
+            scratch.clear()
+
+        # Pixels outside the triangulation are NaN for every channel
+        self.matrix = np.stack(columns, axis=-1)
+
+    # ----------------------------------------------------------------------
+    def interpolate(self, values: np.ndarray) -> np.ndarray:
+        """Values on the grid, of shape (`res, res`)."""
+        return (self.matrix @ values).reshape(self.res, self.res)
+
+    # ----------------------------------------------------------------------
+    def update(self, values: np.ndarray) -> matplotlib.image.AxesImage:
+        """Draw new values.
+
+        Parameters
+        ----------
+        values
+            Array of shape (`channels`, ).
+
+        Returns
+        -------
+        image
+            The image updated.
+        """
+        values = np.asarray(values, dtype=float)
+        self.image.set_data(self.interpolate(values))
+
+        if self.vlim is not None:
+            vmin, vmax = self.vlim
+        elif values.min() >= 0:
+            vmin, vmax = 0, values.max()
+        else:
+            vmax = np.abs(values).max()
+            vmin = -vmax
+        self.image.set_clim(vmin, vmax)
+        return self.image
@@ -9,7 +9,6 @@ import sys
 import time
 import json
 import psutil
-import pickle
 import platform
 import subprocess
 from datetime import datetime
@@ -29,6 +28,7 @@ from .config_manager import ConfigManager
 from .configuration import ConfigurationFrame
 from .subprocess_handler import run_subprocess
 from .raspad import Raspad
+from ..extensions.data_analysis.codec import serializer, decode
 
 KafkaMessage = TypeVar('KafkaMessage')
 PathLike = TypeVar('PathLike')
@@ -97,7 +97,7 @@ class Kafka(QThread):
         topics = ['annotation', 'marker',
                   'command', 'eeg', 'aux', 'feedback']
         self.consumer = KafkaConsumer(bootstrap_servers=bootstrap_servers,
-                                      value_deserializer=pickle.loads,
+                                      value_deserializer=decode,
                                       auto_offset_reset='latest',
                                       )
 
@@ -116,8 +116,7 @@ class Kafka(QThread):
     def create_produser(self) -> None:
         """The produser is used for stream annotations and markers."""
         self.produser = KafkaProducer(bootstrap_servers=[f'{self.host}:9092'],
-                                      compression_type='gzip',
-                                      value_serializer=pickle.dumps,
+                                      value_serializer=serializer(),
                                       )
 
 
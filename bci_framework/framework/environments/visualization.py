@@ -17,6 +17,7 @@ from PySide6.QtWidgets import QTableWidgetItem
 from ..config_manager import ConfigManager
 from ..extensions_handler import ExtensionWidget
 from ..subprocess_handler import run_subprocess
+from ..widgets.latency import Latency
 
 
 ########################################################################
@@ -34,6 +35,10 @@ class Visualization:
         self.process_status_timer.timeout.connect(self.update_data_analysis)
         self.process_status_timer.setInterval(1000)
 
+        self.latency = Latency()
+        self.parent_frame.tabWidget_data_analysis.addTab(
+            self.latency, 'Latency')
+
         self.on_focus()
         self.add_subwindow()
         self.connect()
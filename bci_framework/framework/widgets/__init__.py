@@ -13,3 +13,4 @@ from .projects import Projects
 from .connection import Connection
 from .records import Records
 from .annotations import Annotations
+from .latency import Latency
@@ -0,0 +1,90 @@
+"""
+=======
+Latency
+=======
+
+Panel with the latency percentiles reported by the running extensions.
+"""
+
+import logging
+
+from PySide6.QtCore import QTimer, Qt
+from PySide6.QtWidgets import QTableWidget, QTableWidgetItem
+
+from ...extensions.data_analysis.instrumentation import (
+    STAGES,
+    PERCENTILES,
+    serve,
+    fetch,
+)
+
+
+########################################################################
+class Latency(QTableWidget):
+    """Table with a row for each extension and stage."""
+
+    # ----------------------------------------------------------------------
+    def __init__(self, *args, **kwargs):
+        """Constructor"""
+        super().__init__(*args, **kwargs)
+
+        self.columns = ['Extension', 'Stage', 'Packages'] + [
+            f'p{p} (ms)' for p in PERCENTILES
+        ] + ['Max (ms)']
+        self.setColumnCount(len(self.columns))
+        self.setHorizontalHeaderLabels(self.columns)
+        self.horizontalHeader().setStretchLastSection(True)
+        self.verticalHeader().setVisible(False)
+        self.setFocusPolicy(Qt.NoFocus)
+
+        try:
+            self.server = serve(block=False)
+        except OSError:
+            logging.warning('Instrumentation endpoint already running')
+            self.server = None
+
+        self.timer = QTimer()
+        self.timer.setInterval(1000)
+        self.timer.timeout.connect(self.update_latency)
+        self.timer.start()
+
+    # ----------------------------------------------------------------------
+    def update_latency(self) -> None:
+        """Read the summaries and update the table."""
+        if not self.isVisible():
+            return
+
+        if self.server is None:
+            summaries = fetch()
+        else:
+            summaries = list(self.server.summaries.values())
+
+        rows = []
+        for summary in sorted(summaries, key=lambda s: s['name']):
+            for stage in STAGES:
+                if values := summary['stages'].get(stage):
+                    if stage == 'render' and 'render' in summary:
+                        render = summary['render']
+                        if render.get('target_fps'):
+                            stage = (
+                                f"render ({render['fps']:.1f}"
+                                f"/{render['target_fps']:.1f} fps)"
+                            )
+                        else:
+                            stage = f"render ({render['fps']:.1f} fps)"
+                    rows.append(
+                        [summary['name'], stage, f"{values['count']}"]
+                        + [f"{values[f'p{p}']:.2f}" for p in PERCENTILES]
+                        + [f"{values['max']:.2f}"]
+                    )
+
+        self.setRowCount(len(rows))
+        for i, row in enumerate(rows):
+            for j, value in enumerate(row):
+                item = QTableWidgetItem(value)
+                item.setFlags(
+                    item.flags() & ~Qt.ItemIsEditable & ~Qt.ItemIsSelectable
+                )
+                if j > 1:
+                    item.setTextAlignment(Qt.AlignCenter)
+                self.setItem(i, j, item)
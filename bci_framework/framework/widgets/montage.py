@@ -23,11 +23,12 @@ from matplotlib.figure import Figure
 from matplotlib.colors import LinearSegmentedColormap
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 
-from openbci_stream.acquisition import OpenBCIConsumer
+from kafka import KafkaConsumer
 from gcpds.filters import frequency as filters
 
 from ...extensions import properties as prop
 from ...extensions.data_analysis.utils import thread_this
+from ...extensions.data_analysis.codec import decode
 
 
 from mne.channels.layout import _find_topomap_coords
@@ -809,8 +810,12 @@ class Montage:
 
             self.measuring_impedance = True
             V = []
-            with OpenBCIConsumer(host=prop.HOST, topics=['eeg']) as stream:
-
+            stream = KafkaConsumer(bootstrap_servers=[f'{prop.HOST}:9092'],
+                                   value_deserializer=decode,
+                                   auto_offset_reset='latest',
+                                   )
+            stream.subscribe(['eeg'])
+            try:
                 n = (1000 // prop.STREAMING_PACKAGE_SIZE)
                 frame = 0
                 for data in stream:
@@ -831,6 +836,8 @@ class Montage:
                         if not self.measuring_impedance:
                             self.core.connection.openbci.session_settings()
                             break
+            finally:
+                stream.close()
 
         else:
             self.measuring_impedance = False
@@ -302,18 +302,21 @@ class Records:
         self.parent_frame.tableWidget_records.selectRow(self.current_signal)
 
         if toggled:
-            QApplication.setOverrideCursor(QCursor(Qt.WaitCursor))
-            self.record_reader = HDF5Reader(
-                os.path.join(
-                    self.records_dir,
-                    f'{self.parent_frame.label_record_name.text()}.h5',
-                )
+            self.replay_subprocess = run_subprocess(
+                [
+                    sys.executable,
+                    '-m',
+                    'bci_framework.kafka_scripts.replay',
+                    os.path.join(
+                        self.records_dir,
+                        f'{self.parent_frame.label_record_name.text()}.h5',
+                    ),
+                    '--start',
+                    str(self.get_offset()),
+                ]
             )
-            self.record_reader.eeg  # cached
-            self.record_reader.aux  # cached
-            QApplication.restoreOverrideCursor()
 
-            self.start_streaming = 0
+            self.start_offset = self.get_offset()
             self.start_play = datetime.now()
             self.timer = QTimer()
             self.timer.setInterval(1000 / 4)
@@ -324,7 +327,7 @@ class Records:
             )
 
         else:
-            self.record_reader.close()
+            self.replay_subprocess.terminate()
             self.timer.stop()
             self.parent_frame.pushButton_play_signal.setIcon(
                 QIcon.fromTheme('media-playback-start')
@@ -332,58 +335,28 @@ class Records:
 
     # ----------------------------------------------------------------------
     def update_timer(self) -> None:
-        """Stream data into kafka."""
-        now = datetime.now()
-        delta = now - self.start_play + timedelta(seconds=self.get_offset())
+        """Move the slider with the replay."""
+        if self.replay_subprocess.poll() is not None:
+            self.parent_frame.pushButton_play_signal.setChecked(False)
+            self.stream_record(False)
+            return
 
         h, m, s = self.parent_frame.label_record_primary.text()[2:-1].split(
             ':'
         )
         seconds = int(h) * 60 * 60 + int(m) * 60 + int(s)
+        elapsed = (datetime.now() - self.start_play).total_seconds()
 
-        value = self.parent_frame.horizontalSlider_record.maximum() / (
-            (seconds / delta.total_seconds())
-        )
-        self.parent_frame.horizontalSlider_record.setValue(int(value))
-
-        end_streaming = int(
-            (
-                self.record_reader.eeg.shape[1]
-                * self.parent_frame.horizontalSlider_record.value()
-            )
-            / self.parent_frame.horizontalSlider_record.maximum()
+        # The replay runs on its own clock, the slider only follows it
+        slider = self.parent_frame.horizontalSlider_record
+        slider.blockSignals(True)
+        slider.setValue(
+            int(slider.maximum() * (self.start_offset + elapsed) / seconds)
         )
+        slider.blockSignals(False)
 
-        if samples := end_streaming - self.start_streaming:
-            if samples < 0:
-                samples = 4 * self.record_reader.eeg.shape[1] / 1000
-
-            # print(samples, [max([end_streaming - samples, 0]), end_streaming])
-            samples = int(samples)
-
-            context = {
-                'timestamp.binary': datetime.now().timestamp(),
-                'created': datetime.now().timestamp(),
-                'samples': samples,
-            }
-
-            data_ = {
-                'context': context,
-                'data': (
-                    self.record_reader.eeg[
-                        :, max([end_streaming - samples, 0]) : end_streaming
-                    ],
-                    self.record_reader.aux[
-                        :, max([end_streaming - samples, 0]) : end_streaming
-                    ],
-                ),
-            }
-            self.start_streaming = end_streaming
-
-            if produser := getattr(
-                self.core.thread_kafka, 'produser', False
-            ):
-                produser.send('eeg', data_)
+        offset = timedelta(seconds=int(self.start_offset + elapsed))
+        self.parent_frame.label_time_current.setText(str(offset))
 
     # ----------------------------------------------------------------------
     def update_timer_record(self) -> None:
@@ -0,0 +1,238 @@
+"""
+======
+Replay
+======
+
+Kafka producer to stream records in HDF5 format as if they were acquired
+right now.
+
+The record is streamed in packages of `STREAMING_PACKAGE_SIZE` samples on
+the `eeg` and `aux` topics, with the same context of the live packages, and
+the markers and annotations are streamed on their topics at the time they
+were registered. All the timestamps are moved to the time of the replay, so
+the extensions can not notice the difference with a live session.
+
+The record can be streamed in real time, N times faster or as fast as
+possible, the last mode is useful to test the performance of the
+extensions:
+
+    $ python -m bci_framework.kafka_scripts.replay record.h5 --speed 4
+    $ python -m bci_framework.kafka_scripts.replay record.h5 --speed max
+"""
+
+import json
+import time
+import heapq
+import argparse
+from datetime import datetime
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+from kafka import KafkaProducer
+from openbci_stream.utils import HDF5Reader
+
+from bci_framework.extensions import properties as prop
+from bci_framework.extensions.data_analysis.codec import serializer
+
+Event = Tuple[float, int, str, dict]
+
+
+# ----------------------------------------------------------------------
+def _to_timestamp(value) -> float:
+    """Timestamps in records can be numbers or formatted dates."""
+    if isinstance(value, str):
+        return datetime.fromisoformat(value).timestamp()
+    return float(value)
+
+
+########################################################################
+class Replay:
+    """Stream a record into Kafka.
+
+    Parameters
+    ----------
+    filename
+        Path of the HDF5 record.
+    speed
+        Speed factor, `1` for real time, `None` or `0` to stream as fast as
+        possible.
+    start
+        Seconds from the beginning of the record to start the replay.
+    host
+        Kafka host, by default `prop.HOST`.
+    """
+
+    # ----------------------------------------------------------------------
+    def __init__(
+        self,
+        filename: str,
+        speed: Optional[float] = 1,
+        start: Optional[float] = 0,
+        host: Optional[str] = None,
+    ):
+        """"""
+        self.reader = HDF5Reader(filename)
+        self.root = self.reader.f.root
+        self.speed = speed or None
+        self.start = start
+        self.host = host or prop.HOST
+
+        self.sample_rate = self.reader.header['sample_rate']
+        self.package_size = int(
+            self.reader.header.get(
+                'streaming_sample_rate', prop.STREAMING_PACKAGE_SIZE
+            )
+        )
+
+        # Only the first row is needed to locate the samples
+        self.timestamp = np.array(self.root.timestamp[0])
+        self.first = self.timestamp[0] + start
+        self.index = np.searchsorted(self.timestamp, self.first)
+
+        if hasattr(self.root, 'aux_data'):
+            self.aux_timestamp = np.array(self.root.aux_timestamp[0])
+        else:
+            self.aux_timestamp = None
+
+    # ----------------------------------------------------------------------
+    def _packages(self) -> Iterator[Event]:
+        """The `eeg` and `aux` packages with the time of acquisition."""
+        eeg = self.root.eeg_data
+        timestamp = self.root.timestamp
+        sample_id = getattr(self.root, 'sample_id', None)
+
+        if self.aux_timestamp is not None:
+            aux_start = np.searchsorted(self.aux_timestamp, self.first)
+
+        for start in range(self.index, eeg.shape[1], self.package_size):
+            stop = min(start + self.package_size, eeg.shape[1])
+
+            # The timestamps of the samples end one period before the
+            # binary timestamp
+            binary = timestamp[:, stop - 1] + 1 / self.sample_rate
+            context = {
+                'timestamp.binary': binary,
+                'samples': [stop - start],
+            }
+            if sample_id is not None and sample_id.shape[1] >= stop:
+                context['sample_ids'] = sample_id[:, start:stop]
+
+            acquired = binary.min()
+            aux_context = dict(context)
+            yield acquired, 0, 'eeg', {
+                'context': context,
+                'data': eeg[:, start:stop],
+            }
+
+            if self.aux_timestamp is not None:
+                aux_stop = np.searchsorted(
+                    self.aux_timestamp, self.timestamp[stop - 1], side='right'
+                )
+                yield acquired, 1, 'aux', {
+                    'context': aux_context,
+                    'data': self.root.aux_data[:, aux_start:aux_stop],
+                }
+                aux_start = aux_stop
+
+    # ----------------------------------------------------------------------
+    def _events(self) -> Iterator[Event]:
+        """The markers and annotations sorted by time."""
+        events = []
+
+        if hasattr(self.root, 'markers'):
+            for row in self.root.markers:
+                t, marker = json.loads(row)
+                events.append(
+                    (_to_timestamp(t), 2, 'marker', {'marker': marker})
+                )
+
+        if hasattr(self.root, 'annotations'):
+            for row in self.root.annotations:
+                onset, duration, description = json.loads(row)
+                events.append(
+                    (
+                        _to_timestamp(onset),
+                        2,
+                        'annotation',
+                        {'duration': duration, 'description': description},
+                    )
+                )
+
+        events.sort(key=lambda event: event[0])
+        return iter([event for event in events if event[0] >= self.first])
+
+    # ----------------------------------------------------------------------
+    def _retime(self, topic: str, value: dict, t: float) -> dict:
+        """Move the timestamps of a message to the replay clock."""
+        if topic in ['eeg', 'aux']:
+            binary = np.asarray(value['context']['timestamp.binary'])
+            # Consumers correct the clock offset of the acquisition system
+            value['context']['timestamp.binary'] = (
+                self._clock(binary) + (prop.OFFSET or 0)
+            ).tolist()
+        elif topic == 'marker':
+            value['datetime'] = float(self._clock(t))
+        elif topic == 'annotation':
+            value['onset'] = float(self._clock(t))
+        return value
+
+    # ----------------------------------------------------------------------
+    def _clock(self, t):
+        """Time of the record to time of the replay."""
+        return self.origin + (t - self.first) / (self.speed or 1)
+
+    # ----------------------------------------------------------------------
+    def run(self) -> dict:
+        """Stream the record, blocking until the end.
+
+        Returns
+        -------
+        dict
+            Number of messages by topic and the elapsed time.
+        """
+        producer = KafkaProducer(
+            bootstrap_servers=[f'{self.host}:9092'],
+            value_serializer=serializer(),
+        )
+
+        sent = {'eeg': 0, 'aux': 0, 'marker': 0, 'annotation': 0}
+        self.origin = time.time()
+
+        for t, _, topic, value in heapq.merge(
+            self._packages(), self._events(), key=lambda event: event[:2]
+        ):
+            if self.speed:
+                delay = self._clock(t) - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+            producer.send(topic, self._retime(topic, value, t))
+            sent[topic] += 1
+
+        producer.flush()
+        producer.close()
+        self.reader.close()
+
+        sent['elapsed'] = time.time() - self.origin
+        return sent
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Stream a HDF5 record.')
+    parser.add_argument('filename', help='Path of the record.')
+    parser.add_argument(
+        '--speed',
+        default='1',
+        help='Speed factor, or "max" to stream as fast as possible.',
+    )
+    parser.add_argument(
+        '--start', type=float, default=0, help='Start time in seconds.'
+    )
+    parser.add_argument('--host', default=None, help='Kafka host.')
+    args = parser.parse_args()
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    summary = Replay(args.filename, speed, args.start, args.host).run()
+
+    print(f"Replay finished in {summary.pop('elapsed'):.2f} s: {summary}")
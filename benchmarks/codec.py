@@ -0,0 +1,77 @@
+"""
+===============
+Codec benchmark
+===============
+
+Encode/decode throughput of the binary wire format against the previous
+`pickle` with `gzip` serialization.
+
+    $ python benchmarks/codec.py
+"""
+
+import gzip
+import pickle
+import timeit
+from datetime import datetime
+
+import numpy as np
+
+from bci_framework.extensions.data_analysis.codec import (
+    encode,
+    decode,
+    available_codecs,
+)
+
+CHANNELS = 16
+PACKAGE = 100
+REPEAT = 200
+
+
+# ----------------------------------------------------------------------
+def package() -> dict:
+    """A package like the ones streamed on the `eeg` topic."""
+    now = datetime.now().timestamp()
+    return {
+        'context': {
+            'timestamp.binary': [now],
+            'timestamp.binary.consume': [now + 0.1],
+            'timestamp.eeg': now + 0.2,
+            'sample_ids': np.arange(PACKAGE),
+            'samples': [PACKAGE],
+            'connection': 'wifi',
+            'daisy': [True],
+        },
+        'data': 100 * np.random.normal(0, 1, size=(CHANNELS, PACKAGE)),
+    }
+
+
+# ----------------------------------------------------------------------
+def measure(fn) -> float:
+    """Mean time of `fn` in microseconds."""
+    return min(timeit.repeat(fn, number=REPEAT, repeat=5)) / REPEAT * 1e6
+
+
+if __name__ == '__main__':
+
+    value = package()
+    print(f'{CHANNELS} channels, {PACKAGE} samples per package')
+    print(f'{"":>22} {"bytes":>8} {"encode µs":>10} {"decode µs":>10}')
+
+    message = gzip.compress(pickle.dumps(value))
+    print(
+        f'{"pickle+gzip":>22} {len(message):8d} '
+        f'{measure(lambda: gzip.compress(pickle.dumps(value))):10.2f} '
+        f'{measure(lambda: pickle.loads(gzip.decompress(message))):10.2f}'
+    )
+
+    for codec in available_codecs():
+        for dtype in ['float32', 'float64', 'int24']:
+            if codec == 'pickle' and dtype != 'float32':
+                continue
+            message = encode(value, codec=codec, dtype=dtype)
+            name = codec if codec == 'pickle' else f'{codec} {dtype}'
+            print(
+                f'{name:>22} {len(message):8d} '
+                f'{measure(lambda: encode(value, codec, dtype)):10.2f} '
+                f'{measure(lambda: decode(message)):10.2f}'
+            )
@@ -0,0 +1,62 @@
+"""
+====================
+Decimation benchmark
+====================
+
+Compare the render of the raw EEG lines with the whole buffer against the
+lines decimated to the width of the axis.
+
+    $ python benchmarks/decimation.py
+"""
+
+import timeit
+from io import BytesIO
+
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from bci_framework.extensions.visualizations.decimation import minmax
+
+CHANNELS = 16
+SAMPLE_RATE = 1000
+SECONDS = 30
+REPEAT = 5
+
+
+# ----------------------------------------------------------------------
+def run(fn):
+    """Time of a call in milliseconds."""
+    return min(timeit.repeat(fn, number=REPEAT, repeat=3)) / REPEAT * 1e3
+
+
+if __name__ == '__main__':
+
+    figure = Figure(figsize=(19.2, 10.8), dpi=100)
+    axis = figure.add_subplot(111)
+    canvas = FigureCanvasAgg(figure)
+
+    eeg = np.random.normal(size=(CHANNELS, SECONDS * SAMPLE_RATE))
+    eeg += np.arange(CHANNELS)[:, np.newaxis]
+    time = np.linspace(-SECONDS, 0, eeg.shape[1])
+    lines = [axis.plot(time, channel)[0] for channel in eeg]
+
+    def render(decimate):
+        t, data = time, eeg
+        if decimate:
+            t, data = minmax(time, eeg, int(np.ceil(axis.bbox.width)))
+        else:
+            t = np.broadcast_to(time, eeg.shape)
+        for i, line in enumerate(lines):
+            line.set_data(t[i], data[i])
+        canvas.print_figure(BytesIO(), format='jpeg')
+
+    columns = int(np.ceil(axis.bbox.width))
+    reduction = run(lambda: minmax(time, eeg, columns))
+    before = run(lambda: render(False))
+    after = run(lambda: render(True))
+    print(f'minmax ({columns} columns): {reduction:8.3f} ms')
+    print(
+        f'render: {before:8.3f} ms -> {after:8.3f} ms '
+        f'({before / after:6.1f}x)'
+    )
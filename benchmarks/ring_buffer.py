@@ -0,0 +1,120 @@
+"""
+=====================
+Ring buffer benchmark
+=====================
+
+Compare the circular buffer used by `DataAnalysis.update_buffer` against the
+previous implementation based on `np.roll`.
+
+    $ python benchmarks/ring_buffer.py
+"""
+
+import timeit
+
+import numpy as np
+
+from bci_framework.extensions.data_analysis.ring_buffer import RingBuffer
+
+CHANNELS = 16
+SAMPLE_RATE = 1000
+SECONDS = 30
+PACKAGE = 100
+AUX = 3
+REPEAT = 500
+
+
+########################################################################
+class RollBuffer:
+    """The previous `DataAnalysis.update_buffer` implementation."""
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """"""
+        time = SAMPLE_RATE * SECONDS
+        self.buffer_eeg_ = np.zeros((CHANNELS, time))
+        self.buffer_timestamp_ = np.zeros(time)
+        self.buffer_aux_ = np.zeros((AUX, time))
+        self.buffer_aux_timestamp_ = np.zeros(time)
+        self.buffer_eeg_split = np.zeros(time)
+        self.buffer_aux_split = np.zeros(time)
+
+    # ----------------------------------------------------------------------
+    def update_buffer(self, eeg, aux, timestamp):
+        """"""
+        c = eeg.shape[1]
+        self.buffer_eeg_ = np.roll(self.buffer_eeg_, -c, axis=1)
+        self.buffer_eeg_[:, -c:] = eeg
+        self.buffer_timestamp_ = np.roll(self.buffer_timestamp_, -c, axis=0)
+        self.buffer_timestamp_[-c:] = np.zeros(c)
+        self.buffer_timestamp_[-1] = timestamp
+        self.buffer_eeg_split = np.roll(self.buffer_eeg_split, -c)
+
+        d = aux.shape[1]
+        self.buffer_aux_ = np.roll(self.buffer_aux_, -d, axis=1)
+        self.buffer_aux_[:, -d:] = aux
+        self.buffer_aux_timestamp_ = np.roll(
+            self.buffer_aux_timestamp_, -d, axis=0
+        )
+        self.buffer_aux_timestamp_[-d:] = np.zeros(d)
+        self.buffer_aux_timestamp_[-1] = timestamp
+        self.buffer_aux_split = np.roll(self.buffer_aux_split, -d)
+
+
+########################################################################
+class CircularBuffer:
+    """The current `DataAnalysis.update_buffer` implementation."""
+
+    # ----------------------------------------------------------------------
+    def __init__(self):
+        """"""
+        time = SAMPLE_RATE * SECONDS
+        self.ring_eeg = RingBuffer((CHANNELS, time))
+        self.ring_timestamp = RingBuffer(time)
+        self.ring_aux = RingBuffer((AUX, time))
+        self.ring_aux_timestamp = RingBuffer(time)
+
+    # ----------------------------------------------------------------------
+    def update_buffer(self, eeg, aux, timestamp):
+        """"""
+        c = eeg.shape[1]
+        self.ring_eeg.write(eeg)
+        t = np.zeros(c)
+        t[-1] = timestamp
+        self.ring_timestamp.write(t)
+
+        d = aux.shape[1]
+        self.ring_aux.write(aux)
+        t = np.zeros(d)
+        t[-1] = timestamp
+        self.ring_aux_timestamp.write(t)
+
+
+# ----------------------------------------------------------------------
+def run(buffer, read=None):
+    """Time the update of one package and, optionally, one read."""
+    eeg = np.random.normal(size=(CHANNELS, PACKAGE))
+    aux = np.random.normal(size=(AUX, PACKAGE))
+
+    def step():
+        buffer.update_buffer(eeg, aux, 1.0)
+        if read:
+            read(buffer)
+
+    return min(timeit.repeat(step, number=REPEAT, repeat=5)) / REPEAT * 1e6
+
+
+if __name__ == '__main__':
+
+    print(
+        f'{CHANNELS} channels, {SECONDS} s at {SAMPLE_RATE} Hz, '
+        f'{PACKAGE} samples per package'
+    )
+
+    for name, buffer, read in [
+        ('np.roll update', RollBuffer(), None),
+        ('ring update', CircularBuffer(), None),
+        ('np.roll update + read', RollBuffer(), lambda b: b.buffer_eeg_[:, -1000:]),
+        ('ring update + view', CircularBuffer(), lambda b: b.ring_eeg.view(1000)),
+        ('ring update + full copy', CircularBuffer(), lambda b: b.ring_eeg.copy()),
+    ]:
+        print(f'{name:>24}: {run(buffer, read):10.2f} µs')
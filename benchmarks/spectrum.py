@@ -0,0 +1,84 @@
+"""
+==================
+Spectrum benchmark
+==================
+
+Compare the update of `StreamingWelch` with a new package against the
+previous recalculation of `scipy.signal.welch` over the whole buffer, and
+check that both estimations are the same while the ring fills and turns.
+
+    $ python benchmarks/spectrum.py
+"""
+
+import timeit
+
+import numpy as np
+from scipy import signal
+
+from bci_framework.extensions.data_analysis.spectrum import StreamingWelch
+
+CHANNELS = 16
+SAMPLE_RATE = 1000
+PACKAGE = 100
+REPEAT = 100
+
+
+# ----------------------------------------------------------------------
+def run(fn):
+    """Time of a call in milliseconds."""
+    return min(timeit.repeat(fn, number=REPEAT, repeat=5)) / REPEAT * 1e3
+
+
+# ----------------------------------------------------------------------
+def check(segments, package, nperseg, packages=30):
+    """Largest relative error against `scipy.signal.welch`."""
+    hop = nperseg // 2
+    welch = StreamingWelch(CHANNELS, SAMPLE_RATE, nperseg, segments=segments)
+    x = np.empty((CHANNELS, 0))
+    error = 0
+    for _ in range(packages):
+        new = np.random.normal(size=(CHANNELS, package))
+        x = np.concatenate([x, new], axis=1)
+        welch.update(new)
+
+        # The last `count` segments of all the data
+        completed = (x.shape[1] - nperseg) // hop + 1
+        start = (completed - welch.count) * hop
+        end = (completed - 1) * hop + nperseg
+        _, psd = signal.welch(x[:, start:end], SAMPLE_RATE, nperseg=nperseg)
+        error = max(error, np.abs(welch.psd - psd).max() / psd.max())
+    return error
+
+
+if __name__ == '__main__':
+
+    for segments, package, nperseg in [(4, 100, 100), (39, 100, 100)]:
+        error = check(segments, package, nperseg)
+        print(
+            f'segments={segments:>3}, package={package}: '
+            f'max error {error:.2e}'
+        )
+
+    for seconds, nperseg in [(2, 100), (15, 4000), (30, 1024)]:
+        buffer = np.random.normal(size=(CHANNELS, seconds * SAMPLE_RATE))
+        package = np.random.normal(size=(CHANNELS, PACKAGE))
+        noverlap = nperseg // 2
+        segments = (buffer.shape[1] - nperseg) // (nperseg - noverlap) + 1
+
+        welch = StreamingWelch(
+            CHANNELS, SAMPLE_RATE, nperseg=nperseg, segments=segments
+        )
+        welch.update(buffer)
+
+        def streaming():
+            welch.update(package)
+            return welch.psd
+
+        before = run(
+            lambda: signal.welch(buffer, SAMPLE_RATE, nperseg=nperseg)
+        )
+        after = run(streaming)
+        print(
+            f'{seconds:>3} s, nperseg={nperseg:>5}: {before:8.3f} ms -> '
+            f'{after:8.3f} ms ({before / after:6.1f}x)'
+        )
@@ -0,0 +1,61 @@
+"""
+=================
+Topomap benchmark
+=================
+
+Compare `mne.viz.plot_topomap` on each update against the precomputed
+interpolation of `Topomap`, and check that both images are the same.
+
+    $ python benchmarks/topomap.py
+"""
+
+import timeit
+
+import mne
+import numpy as np
+from matplotlib.figure import Figure
+
+from bci_framework.extensions.visualizations.topomap import Topomap
+
+CHANNELS = [
+    'Fp1', 'Fp2', 'F7', 'F3', 'Fz', 'F4', 'F8', 'T7',
+    'C3', 'Cz', 'C4', 'T8', 'P7', 'P3', 'P4', 'P8',
+]
+REPEAT = 20
+
+
+# ----------------------------------------------------------------------
+def run(fn, number=REPEAT):
+    """Time of a call in milliseconds."""
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1e3
+
+
+if __name__ == '__main__':
+
+    mne.set_log_level('ERROR')
+    info = mne.create_info(CHANNELS, sfreq=1000, ch_types='eeg')
+    info.set_montage('standard_1020')
+    values = np.random.normal(size=len(CHANNELS))
+
+    axis = Figure().add_subplot(111)
+
+    def plot():
+        axis.clear()
+        return mne.viz.plot_topomap(
+            values, info, axes=axis, show=False, cmap='cool', contours=0
+        )[0]
+
+    start = timeit.default_timer()
+    topomap = Topomap(Figure().add_subplot(111), info)
+    setup = (timeit.default_timer() - start) * 1e3
+
+    reference = np.asarray(plot().get_array(), dtype=float)
+    error = np.nanmax(np.abs(topomap.interpolate(values) - reference))
+
+    before = run(plot)
+    after = run(lambda: topomap.update(values), number=1000)
+    print(f'setup: {setup:8.3f} ms, max error: {error:.2e}')
+    print(
+        f'update: {before:8.3f} ms -> {after:8.3f} ms '
+        f'({before / after:6.1f}x)'
+    )
@@ -0,0 +1,123 @@
+"""
+======================
+Transformers benchmark
+======================
+
+Compare the vectorized transformers against the previous implementations,
+`Transformers.centralize` with `np.apply_along_axis` and the re-reference
+line by line of the `OpenBCI_Raw_EEG` extension.
+
+    $ python benchmarks/transformers.py
+"""
+
+import timeit
+
+import numpy as np
+from scipy import signal
+
+from bci_framework.extensions.data_analysis import transformers as tr
+
+CHANNELS = 16
+SAMPLES = 30 * 1000
+REPEAT = 20
+
+
+# ----------------------------------------------------------------------
+def centralize(x, normalize=1):
+    """The previous `Transformers.centralize`."""
+    cent = np.nan_to_num(np.apply_along_axis(lambda x_: x_ - x_.mean(), 1, x))
+    if normalize:
+        return np.nan_to_num(
+            np.apply_along_axis(
+                lambda x_: normalize * (x_ / (x_.max() - x_.min())), 1, cent
+            )
+        )
+    return cent
+
+
+# ----------------------------------------------------------------------
+def lines(x, substract):
+    """The previous re-reference of `OpenBCI_Raw_EEG`, one line each time."""
+    out = []
+    for i in range(x.shape[0]):
+        if substract == 'channel mean':
+            out.append(x[i] - np.mean(x[i]))
+        elif substract == 'global mean':
+            out.append(x[i] - np.mean(x))
+        elif substract == 'Cz':
+            out.append(x[i] - x[0])
+    return out
+
+
+# ----------------------------------------------------------------------
+def robust_zscore(x):
+    """Median and MAD standardization channel by channel."""
+    return np.apply_along_axis(
+        lambda x_: (x_ - np.median(x_))
+        / (1.4826 * np.median(np.abs(x_ - np.median(x_)))),
+        1,
+        x,
+    )
+
+
+# ----------------------------------------------------------------------
+def run(fn):
+    """Time of a call in milliseconds."""
+    return min(timeit.repeat(fn, number=REPEAT, repeat=5)) / REPEAT * 1e3
+
+
+if __name__ == '__main__':
+
+    x = np.random.normal(size=(CHANNELS, SAMPLES))
+    out = np.empty_like(x)
+
+    print(f'{CHANNELS} channels, {SAMPLES} samples')
+    for name, previous, vectorized in [
+        (
+            'center',
+            lambda: centralize(x, normalize=False),
+            lambda: tr.center(x, out=out),
+        ),
+        (
+            'center + normalize',
+            lambda: centralize(x),
+            lambda: tr.minmax(
+                tr.center(x, out=out), out=out, low=-0.5, high=0.5
+            ),
+        ),
+        (
+            'channel mean',
+            lambda: lines(x, 'channel mean'),
+            lambda: tr.center(x, out=out),
+        ),
+        (
+            'global mean',
+            lambda: lines(x, 'global mean'),
+            lambda: np.subtract(x, x.mean(), out=out),
+        ),
+        (
+            'Cz reference',
+            lambda: lines(x, 'Cz'),
+            lambda: tr.reference(x, [0], out=out),
+        ),
+        (
+            'detrend',
+            lambda: signal.detrend(x),
+            lambda: tr.detrend(x, out=out),
+        ),
+        (
+            'CAR (plain numpy)',
+            lambda: x - x.mean(axis=0),
+            lambda: tr.car(x, out=out),
+        ),
+        (
+            'robust z-score',
+            lambda: robust_zscore(x),
+            lambda: tr.robust_zscore(x, out=out),
+        ),
+    ]:
+        before, after = run(previous), run(vectorized)
+        print(
+            f'{name:>20}: {before:8.2f} ms -> {after:8.2f} ms '
+            f'({before / after:5.1f}x)'
+        )